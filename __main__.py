@@ -9,11 +9,28 @@ def main():
         prog='ai_wargame',
         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     parser.add_argument('--max_depth', type=int, help='maximum search depth')
+    parser.add_argument('--max_nodes', type=int, help='maximum number of nodes searched per move')
     parser.add_argument('--max_time', type=float, help='maximum search time')
     parser.add_argument('--max_turns', type=float, help='maximum number of turns to end the game')
     parser.add_argument('--game_type', type=str, default="manual", help='game type: auto|attacker|defender|manual')
     parser.add_argument('--broker', type=str, help='play via a game broker')
+    parser.add_argument('--broker_long_poll', type=float, help='long-poll the broker for up to this many seconds per request')
+    parser.add_argument('--book', type=str, help='opening book file (see book.py)')
+    parser.add_argument('--tablebase', type=str, help='endgame tablebase directory (see tablebase.py)')
+    parser.add_argument('--ponder', action='store_true', help="search ahead during the opponent's turn")
+    parser.add_argument('--workers', type=int, help='number of processes for root-parallel search')
+    parser.add_argument('--heuristic', type=str, help='heuristic: e0|e1|e2')
+    parser.add_argument('--pvs', action='store_true', help='principal variation search with aspiration windows')
+    parser.add_argument('--null_move', action='store_true', help='null-move pruning (with --pvs)')
+    parser.add_argument('--lmr', action='store_true', help='late-move reductions (with --pvs)')
+    parser.add_argument('--batch_eval', action='store_true', help='score search frontiers in batches with numpy')
+    parser.add_argument('--trace', type=str, help='game trace output: buffered|thread|null')
+    parser.add_argument('--record', type=str, help='write a binary game record (see record.py) to this file')
+    parser.add_argument('--async_loop', action='store_true',
+                        help='asyncio game loop: search, broker requests, input and trace output overlap')
     args = parser.parse_args()
+    if args.max_nodes is not None and args.workers is not None and args.workers > 1:
+        parser.error("--max_nodes is not supported with --workers > 1")
 
     # parse the game type
     if args.game_type == "attacker":
@@ -31,16 +48,46 @@ def main():
     # override class defaults via command line options
     if args.max_depth is not None:
         options.max_depth = args.max_depth
+    if args.max_nodes is not None:
+        options.max_nodes = args.max_nodes
     if args.max_time is not None:
         options.max_time = args.max_time
     if args.broker is not None:
         options.broker = args.broker
+    if args.broker_long_poll is not None:
+        options.broker_long_poll = args.broker_long_poll
     if args.max_turns is not None:
         options.max_turns = args.max_turns
+    if args.book is not None:
+        options.book = args.book
+    if args.tablebase is not None:
+        options.tablebase = args.tablebase
+    if args.workers is not None:
+        options.workers = args.workers
+    if args.heuristic is not None:
+        options.heuristic = args.heuristic
+    if args.ponder:
+        options.ponder = True
+    if args.pvs:
+        options.pvs = True
+    if args.null_move:
+        options.null_move = True
+    if args.lmr:
+        options.lmr = True
+    if args.batch_eval:
+        options.batch_eval = True
+    if args.trace is not None:
+        options.trace = args.trace
+    if args.record is not None:
+        options.record = args.record
 
     # create a new game
     game = Game(options=options)
-    game.start()
+    if args.async_loop:
+        import async_game  # imported here: only needed for the asyncio loop
+        async_game.run(game)
+    else:
+        game.start()
 
 
 ##############################################################################################################
@@ -1,56 +1,607 @@
 from __future__ import annotations
 from player import Player
-from dataclasses import field
 from unit import Unit
-from game import CoordPair
+from bitboard import FEATURE_HEALTH
+from game import Game, Options, Stats, IterationStats, MAX_HEURISTIC_SCORE, MIN_HEURISTIC_SCORE
+from transposition import (TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND, MATE_MARGIN, score_to_tt,
+                           score_from_tt)
 from typing import Iterable, Tuple
 from collections.abc import Callable
+from time import perf_counter
+from operator import mul
+import random
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+  import threading
+  from batch_eval import BatchEvaluator
+  from tablebase import Tablebase
+
+# fraction of Options.max_time the search may use (the rest covers returning, logging and printing the move)
+TIME_MARGIN = 0.9
+# depth cap when Options.max_depth is None
+MAX_SEARCH_DEPTH = 64
+# how many nodes between two deadline checks (must be a power of 2)
+CHECK_INTERVAL = 256
+# node budget of a search without Options.max_nodes
+UNLIMITED_NODES = 1 << 62
+# move ordering tiers (history scores stay below the killers)
+TT_MOVE_SCORE = 1 << 30
+ATTACK_SCORE = 1 << 20
+KILLER_SCORE = 1 << 19
+MAX_HISTORY_SCORE = KILLER_SCORE - 2
 
 ##############################################################################################################
 
-# Heuristics
-def e0(board: Board) -> int:
-  grid = board.grid
-  heuristic = 0
+# Heuristics (positive scores favour the attacker, who is the max player)
+
+# The heuristics are linear in the BitBoard.features (unit counts and health sums by unit code, engaged pairs),
+# which the board keeps up to date as units are placed, damaged and removed: a score is one dot product.
+
+def _signed(weights: tuple) -> tuple:
+  """Weights by UnitType value as weights by code-1: positive for the attacker, negative for the defender."""
+  return weights + tuple(-weight for weight in weights)
+
+# e0 weights by UnitType value
+E0_WEIGHTS = (9999, 3, 3, 3, 3)
+# ... as weights of the unit count features
+E0_FEATURE_WEIGHTS = _signed(E0_WEIGHTS)
+
+def e0(game: Game) -> int:
+  return sum(map(mul, E0_FEATURE_WEIGHTS, game.board.features))
+
+# e1 weights by UnitType value, multiplied by each unit's health
+E1_WEIGHTS = (1000, 30, 30, 10, 10)
+# ... as weights of the health sum features
+E1_FEATURE_WEIGHTS = (0,) * FEATURE_HEALTH + _signed(E1_WEIGHTS)
+
+def e1(game: Game) -> int:
+  """Health-weighted material: a damaged unit is worth proportionally less."""
+  return sum(map(mul, E1_FEATURE_WEIGHTS, game.board.features))
+
+# e2 bonus for every adjacent attacker/defender pair (the attacker has to engage to reach the defender AI)
+E2_ENGAGED_WEIGHT = 5
+E2_FEATURE_WEIGHTS = E1_FEATURE_WEIGHTS + (E2_ENGAGED_WEIGHT,)
 
-  # TODO: iterate on the units in the grid and add or substract depending on the heuristic
+def e2(game: Game) -> int:
+  """e1 plus a bonus for engagement between the two armies."""
+  return sum(map(mul, E2_FEATURE_WEIGHTS, game.board.features))
 
-  return heuristic
+def checked_heuristic(e: Callable[[Game], int]) -> Callable[[Game], int]:
+  """e, checking first that the incremental features match a full recompute (Options.check_features)."""
+  def checked(game: Game) -> int:
+    expected = game.board.compute_features()
+    if game.board.features != expected:
+      raise AssertionError(f"incremental features {game.board.features} != recomputed {expected}")
+    return e(game)
+  return checked
+
+HEURISTICS : dict[str, Callable[[Game], int]] = {"e0": e0, "e1": e1, "e2": e2}
 
 ##############################################################################################################
 
-class Board:
-  grid: list[list[Unit | None]] = field(default_factory=list)
+def terminal_score(winner: Player, depth: int) -> int:
+  """Score of a finished game, preferring quicker wins and slower losses."""
+  if winner == Player.Attacker:
+    return MAX_HEURISTIC_SCORE - depth
+  return MIN_HEURISTIC_SCORE + depth
+
+
+def tablebase_score(game: Game, depth: int, plies: int) -> int:
+  """Exact score of a tablebase result (plies to the end, positive if the side to move wins, 0 if no side can
+  force a win) with the turn limit applied: the attacker must win before it, otherwise the defender wins
+  (and, when the tablebase does not say how fast, the distance is taken to be the turn limit)."""
+  if plies == 0:
+    winner = None
+  else:
+    winner = game.next_player if plies > 0 else game.next_player.next()
+    plies = abs(plies)
+  max_turns = game.options.max_turns
+  if max_turns is not None:
+    remaining = max_turns - game.turns_played
+    if winner == Player.Defender:
+      return terminal_score(Player.Defender, depth + min(plies, remaining))
+    if winner is None or plies >= remaining:
+      return terminal_score(Player.Defender, depth + remaining)
+  if winner is None:
+    return 0
+  return terminal_score(winner, depth + plies)
+
+
+class SearchTimeout(Exception):
+  """Raised inside the recursion when the search deadline has passed."""
+
+
+class SearchContext:
+  """State shared by every node of one search: heuristic, stats, transposition table and deadline."""
+
+  def __init__(self, e: Callable[[Game], int], stats: Stats, tt: TranspositionTable | None = None,
+               deadline: float | None = None, batch: BatchEvaluator | None = None, timing: bool = False,
+               rng: random.Random | None = None, tablebase: Tablebase | None = None,
+               stop: threading.Event | None = None):
+    self.e = e
+    self.stats = stats
+    self.tt = tt
+    self.deadline = deadline
+    # the search is aborted like on a passed deadline once nodes exceeds this (see Options.max_nodes)
+    self.node_limit = UNLIMITED_NODES
+    # set from another thread to abort the search like a passed deadline (see ponder.py)
+    self.stop = stop
+    self.batch = batch
+    # shuffles the root moves (before ordering) so that ties between equal root scores are broken at random
+    self.rng = rng
+    # endgame tablebase probed (below the root) for exact scores
+    self.tablebase = tablebase
+    # time spent generating/ordering moves and evaluating leaves, only measured when timing is on
+    self.timing = timing
+    self.movegen_seconds = 0.0
+    self.eval_seconds = 0.0
+    if timing:
+      self.evaluate = self._timed_evaluate
+    self.nodes = 0
+    self.evals = 0
+    self.eval_depth_sum = 0
+    # move ordering: two killer moves per depth and a history score per move
+    self.killers : dict[int, list[int]] = {}
+    self.history : dict[int, int] = {}
+
+  def record_cutoff(self, game: Game, move: int, depth: int, remaining: int, first: bool):
+    """Count a beta cutoff and, for a quiet move, remember it as a killer and in the history table."""
+    stats = self.stats
+    stats.cutoffs += 1
+    if first:
+      stats.first_move_cutoffs += 1
+    board = game.board
+    if board.players[1 - game.next_player.value] >> move % board.masks.cells & 1:
+      # attacks are already ordered by damage
+      return
+    killers = self.killers.setdefault(depth, [-1, -1])
+    if killers[0] != move:
+      (killers[0], killers[1]) = (move, killers[0])
+    self.history[move] = min(self.history.get(move, 0) + remaining * remaining, MAX_HISTORY_SCORE)
+
+  def count_evaluation(self, depth: int):
+    """Count one leaf evaluation at depth."""
+    evaluations = self.stats.evaluations_per_depth
+    evaluations[depth] = evaluations.get(depth, 0) + 1
+    self.evals += 1
+    self.eval_depth_sum += depth
+
+  def out_of_time(self) -> bool:
+    """Has the deadline passed or has the search been stopped?"""
+    if self.stop is not None and self.stop.is_set():
+      return True
+    return self.deadline is not None and perf_counter() > self.deadline
+
+  def evaluate(self, game: Game, depth: int) -> int:
+    """Heuristic score of a leaf, counted per depth."""
+    self.count_evaluation(depth)
+    return self.e(game)
+
+  def _timed_evaluate(self, game: Game, depth: int) -> int:
+    """evaluate() that also accumulates eval_seconds."""
+    self.count_evaluation(depth)
+    start = perf_counter()
+    score = self.e(game)
+    self.eval_seconds += perf_counter() - start
+    return score
+
+
+def tt_key(game: Game, remaining: int, ctx: SearchContext) -> int:
+  """Transposition table key of a node searched remaining plies deep. When the turn limit falls within those
+  plies (or with a tablebase, whose scores depend on the turns left at any distance) the score depends on
+  how many turns are left, so that is part of the key and the entry is not reused with more turns to go."""
+  max_turns = game.options.max_turns
+  return game.hash_key(max_turns is not None and (max_turns - game.turns_played <= remaining
+                                                  or ctx.tablebase is not None))
+
+
+def minimax(game: Game, is_max: bool, depth: int, MAX_DEPTH: int, ctx: SearchContext,
+            alpha: int = MIN_HEURISTIC_SCORE, beta: int = MAX_HEURISTIC_SCORE) -> Tuple[int, int | None]:
+  """Minimax (alpha-beta when options.alpha_beta is set) over a single position, using make/unmake.
+
+  With a transposition table, positions already searched at least as deep are answered from it
+  and the stored best move is tried first. Raises SearchTimeout once ctx.deadline or ctx.node_limit has passed.
+  """
+  ctx.nodes += 1
+  if ctx.nodes > ctx.node_limit or (ctx.nodes & (CHECK_INTERVAL - 1) == 0 and ctx.out_of_time()):
+    raise SearchTimeout()
+
+  winner = game.has_winner()
+  if winner is not None:
+    ctx.evaluate(game, depth)
+    return (terminal_score(winner, depth), None)
+  if ctx.tablebase is not None and depth > 0:
+    plies = ctx.tablebase.probe(game)
+    if plies is not None:
+      ctx.stats.tablebase_hits += 1
+      ctx.count_evaluation(depth)
+      return (tablebase_score(game, depth, plies), None)
+  if depth == MAX_DEPTH:
+    return (ctx.evaluate(game, depth), None)
+
+  alpha_beta = game.options.alpha_beta
+  remaining = MAX_DEPTH - depth
+  tt = ctx.tt
+  tt_move = None
+  if tt is not None:
+    key = tt_key(game, remaining, ctx)
+    entry = tt.probe(key)
+    if entry is not None:
+      (_, tt_depth, tt_score, tt_bound, tt_move) = entry
+      # the root always searches so that it returns a move
+      if depth > 0 and tt_depth >= remaining:
+        tt_score = score_from_tt(tt_score, depth)
+        if tt_bound == EXACT:
+          return (tt_score, tt_move)
+        if alpha_beta:
+          if tt_bound == LOWER_BOUND and tt_score >= beta:
+            return (tt_score, tt_move)
+          if tt_bound == UPPER_BOUND and tt_score <= alpha:
+            return (tt_score, tt_move)
+  (alpha_orig, beta_orig) = (alpha, beta)
 
-  def move_candidates(self) -> Iterable[CoordPair]: 
-    return []
-  
-  def clone_and_move(self, move: CoordPair) -> Board:
-    # TODO: clone current board and perform the given move on that board
-    return None 
+  best_score = MIN_HEURISTIC_SCORE if is_max else MAX_HEURISTIC_SCORE
+  best_move = None
+  if ctx.batch is not None and remaining == 1:
+    (best_score, best_move) = _score_frontier(game, is_max, depth, ctx)
+  else:
+    if ctx.timing:
+      movegen_start = perf_counter()
+    moves = game.move_candidates()
+    if depth == 0 and ctx.rng is not None:
+      moves = list(moves)
+      ctx.rng.shuffle(moves)
+    if game.options.move_ordering:
+      moves = order_moves(game, moves, tt_move, depth, ctx)
+    elif tt_move is not None:
+      moves = [tt_move] + [move for move in moves if move != tt_move]
+    if ctx.timing:
+      moves = list(moves)
+      ctx.movegen_seconds += perf_counter() - movegen_start
+    searched = 0
+    for move in moves:
+      if not game.make_move(move):
+        continue
+      (score, _) = minimax(game, not is_max, depth + 1, MAX_DEPTH, ctx, alpha, beta)
+      game.unmake_move()
+      searched += 1
+
+      if is_max:
+        if best_move is None or score > best_score:
+          (best_score, best_move) = (score, move)
+        if score > alpha:
+          alpha = score
+      else:
+        if best_move is None or score < best_score:
+          (best_score, best_move) = (score, move)
+        if score < beta:
+          beta = score
+      if alpha_beta and alpha >= beta:
+        ctx.record_cutoff(game, move, depth, remaining, searched == 1)
+        break
+
+  if best_move is None:
+    # no legal action left for this player: score the position as it stands
+    return (ctx.evaluate(game, depth), None)
+
+  if tt is not None:
+    if not alpha_beta:
+      bound = EXACT
+    elif best_score <= alpha_orig:
+      bound = UPPER_BOUND
+    elif best_score >= beta_orig:
+      bound = LOWER_BOUND
+    else:
+      bound = EXACT
+    tt.store(key, remaining, score_to_tt(best_score, depth), bound, best_move)
+  return (best_score, best_move)
+
+
+def _tt_bound_for(sign: int, bound: int) -> int:
+  """A transposition table bound seen from the side to move (sign -1: the defender), or back."""
+  if sign < 0 and bound != EXACT:
+    return LOWER_BOUND if bound == UPPER_BOUND else UPPER_BOUND
+  return bound
+
+
+def pvs(game: Game, depth: int, MAX_DEPTH: int, ctx: SearchContext,
+        alpha: int = MIN_HEURISTIC_SCORE, beta: int = MAX_HEURISTIC_SCORE,
+        null_move: bool = True) -> Tuple[int, int | None]:
+  """Negamax principal variation search (options.pvs): scores are from the point of view of the side to move.
 
-def suggest_move():
-  return
+  The first move is searched with the full (alpha, beta) window and the others with a null window
+  (alpha, alpha+1) that only proves them worse; a move that fails high is searched again with the full
+  window. Transposition table entries are stored from the attacker's point of view, like minimax stores them.
 
+  Selective search: with options.null_move, a null-window node first lets the opponent move twice at
+  reduced depth and is cut off if that still fails high (never when the side to move is down to a lone
+  AI, which has no spare move to give away, nor twice in a row); with options.lmr, quiet moves late in
+  the ordering are searched one ply shallower and again at full depth if they beat alpha.
+  Raises SearchTimeout once ctx.deadline or ctx.node_limit has passed.
+  """
+  ctx.nodes += 1
+  if ctx.nodes > ctx.node_limit or (ctx.nodes & (CHECK_INTERVAL - 1) == 0 and ctx.out_of_time()):
+    raise SearchTimeout()
 
-def minimax(board: Board, is_max: bool, move: CoordPair, e: Callable[[Board], int], depth: int, MAX_DEPTH: int) -> Tuple[int, CoordPair | None, float]:
+  sign = 1 if game.next_player == Player.Attacker else -1
+  winner = game.has_winner()
+  if winner is not None:
+    ctx.evaluate(game, depth)
+    return (sign * terminal_score(winner, depth), None)
+  if ctx.tablebase is not None and depth > 0:
+    plies = ctx.tablebase.probe(game)
+    if plies is not None:
+      ctx.stats.tablebase_hits += 1
+      ctx.count_evaluation(depth)
+      return (sign * tablebase_score(game, depth, plies), None)
   if depth == MAX_DEPTH:
-    return (e(board), move, depth)
-  
-  total_depth = depth
+    return (sign * ctx.evaluate(game, depth), None)
 
-  # best move is a tuple/pair with:
-  # (score, move)
+  remaining = MAX_DEPTH - depth
+  tt = ctx.tt
+  tt_move = None
+  if tt is not None:
+    key = tt_key(game, remaining, ctx)
+    entry = tt.probe(key)
+    if entry is not None:
+      (_, tt_depth, tt_score, tt_bound, tt_move) = entry
+      # the root always searches so that it returns a move
+      if depth > 0 and tt_depth >= remaining:
+        tt_score = sign * score_from_tt(tt_score, depth)
+        tt_bound = _tt_bound_for(sign, tt_bound)
+        if (tt_bound == EXACT or (tt_bound == LOWER_BOUND and tt_score >= beta)
+            or (tt_bound == UPPER_BOUND and tt_score <= alpha)):
+          return (tt_score, tt_move)
+  alpha_orig = alpha
+
+  options = game.options
+  board = game.board
+  if (options.null_move and null_move and depth > 0 and beta - alpha == 1
+      and remaining > options.null_move_reduction and abs(beta) < MAX_HEURISTIC_SCORE - MATE_MARGIN
+      and board.players[game.next_player.value].bit_count() > 1 and sign * ctx.e(game) >= beta):
+    game.make_null_move()
+    score = -pvs(game, depth + 1, MAX_DEPTH - options.null_move_reduction, ctx, -beta, -beta + 1, False)[0]
+    game.unmake_move()
+    if score >= beta:
+      ctx.stats.null_move_cutoffs += 1
+      return (beta, None)
+
+  best_score = MIN_HEURISTIC_SCORE
   best_move = None
-  moves = board.move_candidates()
-  for c_move in moves:
-    c_board = board.clone_and_move(move)
-    (c_score, c_depth) = minimax(c_board, not is_max, c_move, e, depth + 1, MAX_DEPTH)
-    
-    # sum the depth of the children to eventually calculate avg depth (we might need to also keep track of the count. creating a separate observer object might be more useful)
-    total_depth += c_depth
-    
-    # Code that compares this move's score with the previous best_move, taking into account if is_max is true or not
-  
-  return (best_move[0], best_move[1], total_depth)
+  if ctx.batch is not None and remaining == 1:
+    (best_score, best_move) = _score_frontier(game, sign > 0, depth, ctx)
+    best_score *= sign
+  else:
+    if ctx.timing:
+      movegen_start = perf_counter()
+    moves = game.move_candidates()
+    if depth == 0 and ctx.rng is not None:
+      moves = list(moves)
+      ctx.rng.shuffle(moves)
+    if game.options.move_ordering:
+      moves = order_moves(game, moves, tt_move, depth, ctx)
+    elif tt_move is not None:
+      moves = [tt_move] + [move for move in moves if move != tt_move]
+    if ctx.timing:
+      moves = list(moves)
+      ctx.movegen_seconds += perf_counter() - movegen_start
+    reduce = options.lmr and remaining >= options.lmr_min_depth
+    cells = board.masks.cells
+    opponent = board.players[1 - game.next_player.value]
+    searched = 0
+    for move in moves:
+      # quiet: neither an attack nor a self-destruct
+      late_quiet = (reduce and searched >= options.lmr_after and not opponent >> move % cells & 1
+                    and move // cells != move % cells)
+      if not game.make_move(move):
+        continue
+      if searched == 0:
+        score = -pvs(game, depth + 1, MAX_DEPTH, ctx, -beta, -alpha)[0]
+      else:
+        score = alpha + 1
+        if late_quiet:
+          ctx.stats.lmr_reductions += 1
+          score = -pvs(game, depth + 1, MAX_DEPTH - 1, ctx, -alpha - 1, -alpha)[0]
+          if score > alpha:
+            ctx.stats.lmr_researches += 1
+        if score > alpha:
+          score = -pvs(game, depth + 1, MAX_DEPTH, ctx, -alpha - 1, -alpha)[0]
+        if alpha < score < beta:
+          ctx.stats.pvs_researches += 1
+          score = -pvs(game, depth + 1, MAX_DEPTH, ctx, -beta, -alpha)[0]
+      game.unmake_move()
+      searched += 1
+
+      if best_move is None or score > best_score:
+        (best_score, best_move) = (score, move)
+      if score > alpha:
+        alpha = score
+      if alpha >= beta:
+        ctx.record_cutoff(game, move, depth, remaining, searched == 1)
+        break
+
+  if best_move is None:
+    # no legal action left for this player: score the position as it stands
+    return (sign * ctx.evaluate(game, depth), None)
+
+  if tt is not None:
+    if best_score <= alpha_orig:
+      bound = UPPER_BOUND
+    elif best_score >= beta:
+      bound = LOWER_BOUND
+    else:
+      bound = EXACT
+    tt.store(key, remaining, score_to_tt(sign * best_score, depth), _tt_bound_for(sign, bound), best_move)
+  return (best_score, best_move)
+
+
+def aspiration_search(game: Game, depth: int, previous: int | None, ctx: SearchContext) -> Tuple[int, int | None]:
+  """One pvs iteration with a window of options.aspiration_window around the previous iteration's score
+  (attacker's point of view, None for a full window), widened fourfold on the failing side until the score
+  falls inside. Returns (score from the attacker's point of view, move)."""
+  sign = 1 if game.next_player == Player.Attacker else -1
+  window = game.options.aspiration_window
+  if previous is None or window is None or abs(previous) >= MAX_HEURISTIC_SCORE - MATE_MARGIN:
+    (score, move) = pvs(game, 0, depth, ctx)
+    return (sign * score, move)
+  (alpha, beta) = (sign * previous - window, sign * previous + window)
+  while True:
+    (score, move) = pvs(game, 0, depth, ctx, alpha, beta)
+    if score <= alpha and alpha > MIN_HEURISTIC_SCORE:
+      window = max(window, 1) * 4
+      alpha = max(score - window, MIN_HEURISTIC_SCORE)
+    elif score >= beta and beta < MAX_HEURISTIC_SCORE:
+      window = max(window, 1) * 4
+      beta = min(score + window, MAX_HEURISTIC_SCORE)
+    else:
+      return (sign * score, move)
+    ctx.stats.aspiration_researches += 1
+
+
+def order_moves(game: Game, moves: Iterable[int], tt_move: int | None, depth: int,
+                ctx: SearchContext) -> list[int]:
+  """Sort moves for alpha-beta: the transposition table move, then attacks by the damage they deal
+  (least damage taken first on ties), then this depth's killer moves, then by history score."""
+  board = game.board
+  cells = board.masks.cells
+  units = board.units
+  opponent = board.players[1 - game.next_player.value]
+  damage = Unit.damage_table
+  killers = ctx.killers.get(depth, ())
+  history = ctx.history
+  scored = []
+  for move in moves:
+    src = move // cells
+    dst = move % cells
+    if move == tt_move:
+      score = TT_MOVE_SCORE
+    elif opponent >> dst & 1:
+      src_type = (units[src] - 1) % 5
+      dst_type = (units[dst] - 1) % 5
+      score = ATTACK_SCORE + 16 * damage[src_type][dst_type] - damage[dst_type][src_type]
+    elif move in killers:
+      score = KILLER_SCORE - killers.index(move)
+    else:
+      score = history.get(move, 0)
+    scored.append((score, move))
+  scored.sort(key=lambda pair: pair[0], reverse=True)
+  return [move for (_, move) in scored]
+
+
+def _score_frontier(game: Game, is_max: bool, depth: int, ctx: SearchContext) -> Tuple[int, int | None]:
+  """Score every child of a node one ply above the horizon with a single batched evaluation (finished games
+  and tablebase positions are scored exactly, like minimax scores them)."""
+  children : list[Tuple[int, int | None]] = []
+  for move in game.move_candidates():
+    if not game.make_move(move):
+      continue
+    ctx.nodes += 1
+    ctx.count_evaluation(depth + 1)
+    winner = game.has_winner()
+    plies = None
+    if winner is None and ctx.tablebase is not None:
+      plies = ctx.tablebase.probe(game)
+    if winner is not None:
+      children.append((move, terminal_score(winner, depth + 1)))
+    elif plies is not None:
+      # exact, as in the unbatched leaf evaluation
+      ctx.stats.tablebase_hits += 1
+      children.append((move, tablebase_score(game, depth + 1, plies)))
+    else:
+      ctx.batch.add(game)
+      children.append((move, None))
+    game.unmake_move()
+
+  if ctx.timing:
+    eval_start = perf_counter()
+  scores = iter(ctx.batch.evaluate())
+  if ctx.timing:
+    ctx.eval_seconds += perf_counter() - eval_start
+  best_score = MIN_HEURISTIC_SCORE if is_max else MAX_HEURISTIC_SCORE
+  best_move = None
+  for (move, score) in children:
+    if score is None:
+      score = next(scores)
+    if best_move is None or (score > best_score if is_max else score < best_score):
+      (best_score, best_move) = (score, move)
+  return (best_score, best_move)
+
+
+def endgame_tablebase(options: Options) -> Tablebase | None:
+  """The tablebase of options.tablebase for this board dimension (None if not set)."""
+  if options.tablebase is None:
+    return None
+  from tablebase import open_tablebase
+  return open_tablebase(options.tablebase, options.dim)
+
+
+def batch_evaluator(options: Options) -> BatchEvaluator | None:
+  """The batched frontier evaluator for options.heuristic when options.batch_eval is set."""
+  if not options.batch_eval:
+    return None
+  from batch_eval import BatchEvaluator  # numpy is only needed in batch mode
+  return BatchEvaluator(options.heuristic, options.dim)
+
+
+def search(game: Game, e: Callable[[Game], int] | None = None,
+           stop: threading.Event | None = None) -> Tuple[int, int | None, float]:
+  """Iterative deepening driver around minimax (or pvs with aspiration windows when options.pvs is set).
+
+  Depths up to options.min_depth always complete (unless stop is set); deeper iterations are aborted when
+  options.max_time runs out or options.max_nodes nodes have been searched, and the move of the deepest
+  completed iteration is returned
+  as (score, move, average leaf depth). Per-iteration results are kept in stats.iterations.
+  """
+  options = game.options
+  stats = game.stats
+  if e is None:
+    e = HEURISTICS[options.heuristic]
+  if options.check_features:
+    e = checked_heuristic(e)
+  if game.transposition_table is None:
+    game.transposition_table = TranspositionTable(options.tt_size, stats)
+  start = perf_counter()
+  deadline = None if options.max_time is None else start + options.max_time * TIME_MARGIN
+  min_depth = options.min_depth if options.min_depth is not None else 1
+  max_depth = options.max_depth if options.max_depth is not None else MAX_SEARCH_DEPTH
+  ctx = SearchContext(e, stats, game.transposition_table, batch=batch_evaluator(options), timing=options.telemetry,
+                      rng=game.rng if options.randomize_moves else None, tablebase=endgame_tablebase(options),
+                      stop=stop)
+  is_max = game.next_player == Player.Attacker
+  root_undo = len(game._undo)
+
+  stats.iterations = []
+  (best_score, best_move) = (0, None)
+  for depth in range(1, max_depth + 1):
+    ctx.deadline = deadline if depth > min_depth else None
+    if options.max_nodes is not None and depth > min_depth:
+      ctx.node_limit = options.max_nodes
+    nodes_before = ctx.nodes
+    iteration_start = perf_counter()
+    try:
+      if options.pvs:
+        (score, move) = aspiration_search(game, depth, best_score if best_move is not None else None, ctx)
+      else:
+        (score, move) = minimax(game, is_max, 0, depth, ctx)
+    except SearchTimeout:
+      # unwind the partial iteration back to the root position
+      while len(game._undo) > root_undo:
+        game.unmake_move()
+      stats.iterations.append(IterationStats(depth, ctx.nodes - nodes_before, perf_counter() - iteration_start, False))
+      break
+    stats.iterations.append(IterationStats(depth, ctx.nodes - nodes_before, perf_counter() - iteration_start))
+    if move is not None:
+      (best_score, best_move) = (score, move)
+    # stop early on a forced result or when there is no time left for another iteration
+    if abs(score) >= MAX_HEURISTIC_SCORE - MATE_MARGIN or move is None:
+      break
+    if deadline is not None and perf_counter() >= deadline:
+      break
+    if options.max_nodes is not None and ctx.nodes >= options.max_nodes:
+      break
 
+  stats.nodes += ctx.nodes
+  stats.movegen_seconds += ctx.movegen_seconds
+  stats.eval_seconds += ctx.eval_seconds
+  avg_depth = ctx.eval_depth_sum / ctx.evals if ctx.evals > 0 else 0.0
+  return (best_score, best_move, avg_depth)
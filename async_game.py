@@ -0,0 +1,183 @@
+from __future__ import annotations
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from time import perf_counter
+from broker import AsyncBrokerClient, BrokerError
+from coord import CoordPair
+from game import Game
+from telemetry import format_turn
+
+# Asyncio variant of Game.start. The event loop thread only plays moves and awaits the rest: the search runs
+# in an executor thread, the broker is polled and moves are posted by the broker client's threads, keyboard
+# input is read by its own thread and the trace is flushed by a worker thread. After an engine move, the post to
+# the broker, the pondering (see ponder.py) and the wait for the opponent's move all proceed at once.
+
+
+@dataclass()
+class TurnLatency:
+    """One turn of the loop, timed from when the previous move was played."""
+    turn : int
+    player : str
+    # who chose the move: "engine", "human" or "broker"
+    source : str
+    # until the move was played
+    seconds : float = 0.0
+    search_seconds : float = 0.0
+    # engine moves sent to a broker: until the broker acknowledged the move
+    posted_seconds : float | None = None
+
+    @property
+    def end_to_end(self) -> float:
+        """Seconds until the move was played, and posted if it had to be."""
+        return self.seconds if self.posted_seconds is None else self.posted_seconds
+
+
+class AsyncGameLoop:
+    """Plays a game like Game.start, on an asyncio event loop (run it with asyncio.run(loop.run()))."""
+
+    def __init__(self, game: Game):
+        self.game = game
+        self.broker : AsyncBrokerClient | None = None
+        if game.options.broker is not None:
+            self.broker = AsyncBrokerClient(game.options.broker, long_poll=game.options.broker_long_poll,
+                                            dim=game.options.dim)
+        self.latencies : list[TurnLatency] = []
+        # engine moves being posted, and the trace flush in progress
+        self._posts : set[asyncio.Task] = set()
+        self._flushing : asyncio.Task | None = None
+        self._search = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search")
+        self._input = ThreadPoolExecutor(max_workers=1, thread_name_prefix="input")
+
+    async def run(self) -> list[TurnLatency]:
+        """Play the game to its end; returns the latency of every turn."""
+        game = self.game
+        game.open_trace()
+        game.open_record()
+        try:
+            while True:
+                print()
+                print(game)
+                winner = game.has_winner()
+                if winner is not None:
+                    print(f"{winner.name} wins!")
+                    game.logger.write_winner()
+                    break
+                start = perf_counter()
+                if not game.is_human_turn():
+                    await self.computer_turn(start)
+                elif self.broker is not None:
+                    await self.broker_turn(start)
+                else:
+                    await self.human_turn(start)
+                await self.flush()
+                if game.recorder is not None:
+                    game.recorder.flush()
+        finally:
+            await self.close()
+        self.print_latencies()
+        return self.latencies
+
+    async def computer_turn(self, start: float):
+        """Search in the executor, play the move, then start posting it and pondering (neither is awaited)."""
+        game = self.game
+        loop = asyncio.get_running_loop()
+        (move, record) = await loop.run_in_executor(self._search, game.search_move)
+        for line in format_turn(record, game.stats):
+            print(line)
+        mv = game.move_pair(move)
+        if mv is None:
+            print("Computer doesn't know what to do!!!")
+            exit(1)
+        latency = TurnLatency(game.turns_played + 1, game.next_player.name, "engine", search_seconds=record.seconds)
+        if not game.play_computer_move(mv):
+            return
+        latency.seconds = perf_counter() - start
+        self.latencies.append(latency)
+        if self.broker is not None:
+            task = asyncio.create_task(self._post(mv, game.turns_played, start, latency))
+            self._posts.add(task)
+            task.add_done_callback(self._posts.discard)
+        game.start_pondering()
+
+    async def _post(self, mv: CoordPair, turn: int, start: float, latency: TurnLatency):
+        try:
+            await self.broker.post_move(mv, turn)
+            latency.posted_seconds = perf_counter() - start
+        except BrokerError as error:
+            print(f"Broker error: {error}")
+
+    async def broker_turn(self, start: float):
+        """Wait for the opponent's move from the broker (the engine ponders meanwhile) and play it."""
+        game = self.game
+        print("Getting next move with auto-retry from game broker...")
+        while True:
+            mv = await self.broker.wait_for_move(game.turns_played + 1)
+            print(f"Got move from broker: {mv}")
+            latency = TurnLatency(game.turns_played + 1, game.next_player.name, "broker")
+            (success, result) = game.perform_move(mv)
+            print(f"Broker {game.next_player.name}: ", end='')
+            print(result)
+            if success:
+                game.next_turn()
+                latency.seconds = perf_counter() - start
+                self.latencies.append(latency)
+                break
+            # the broker keeps answering with the same invalid move until the opponent replaces it
+            await asyncio.sleep(self.broker.poll_interval)
+
+    async def human_turn(self, start: float):
+        """Read a move from the keyboard in the input thread and play it."""
+        game = self.game
+        loop = asyncio.get_running_loop()
+        while True:
+            s = await loop.run_in_executor(self._input, input, f'Player {game.next_player.name}, enter your move: ')
+            mv = game.parse_move(s)
+            if mv is None:
+                print('Invalid coordinates! Try again.')
+                continue
+            latency = TurnLatency(game.turns_played + 1, game.next_player.name, "human")
+            (success, result) = game.perform_move(mv)
+            if success:
+                print(f"Player {game.next_player.name}: ", end='')
+                print(result)
+                game.next_turn()
+                latency.seconds = perf_counter() - start
+                self.latencies.append(latency)
+                break
+            elif result is not None and result != "":
+                print(result)
+            else:
+                print("The move is not valid! Try again.")
+
+    async def flush(self):
+        """Start flushing this turn's trace lines, once the previous flush is done."""
+        if self._flushing is not None:
+            await self._flushing
+        self._flushing = asyncio.create_task(self.game.logger.flush_async())
+
+    async def close(self):
+        """Wait for the pending posts and trace flush, then close everything Game.finish closes."""
+        if len(self._posts) > 0:
+            await asyncio.gather(*self._posts)
+        if self._flushing is not None:
+            await self._flushing
+            self._flushing = None
+        if self.broker is not None:
+            await self.broker.close()
+        self.game.finish()
+        self._search.shutdown()
+        self._input.shutdown(wait=False)
+
+    def print_latencies(self):
+        """Median and worst end-to-end turn latency, by source of the moves."""
+        for source in ("engine", "broker", "human"):
+            seconds = sorted(latency.end_to_end for latency in self.latencies if latency.source == source)
+            if len(seconds) > 0:
+                print(f"Turn latency ({source}, {len(seconds)} turns): median {seconds[len(seconds) // 2]:0.3f}s, "
+                      f"max {seconds[-1]:0.3f}s")
+
+
+def run(game: Game) -> list[TurnLatency]:
+    """Play game with the asyncio loop (blocking until it ends)."""
+    return asyncio.run(AsyncGameLoop(game).run())
@@ -0,0 +1,111 @@
+from __future__ import annotations
+from game import Game
+import algorithms
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Vectorised versions of the algorithms.e0/e1/e2 heuristics over a batch of positions.
+# Positions are copied straight from BitBoard.units/health (unit code player*5+type+1, 0 = empty)
+# and turned into (N, dim, dim) unit type, owner and health arrays with lookup tables.
+
+
+def _code_table(value_of) -> list[int]:
+    """value_of(player, type) for every BitBoard.units code (0 = empty cell scores 0)."""
+    return [0] + [value_of(code // 5, code % 5) for code in range(10)]
+
+# owner by code: +1 attacker, -1 defender, 0 empty
+CODE_OWNER = _code_table(lambda player, utype: 1 - 2 * player)
+# UnitType value by code (-1 for empty)
+CODE_TYPE = [-1] + [code % 5 for code in range(10)]
+# signed per-unit weights by code
+CODE_E0 = _code_table(lambda player, utype: (1 - 2 * player) * algorithms.E0_WEIGHTS[utype])
+CODE_E1 = _code_table(lambda player, utype: (1 - 2 * player) * algorithms.E1_WEIGHTS[utype])
+
+
+class PositionBatch:
+    """A growing batch of positions of one board dimension, scored with a single vectorised call.
+
+    Positions are appended as raw bytes and only turned into (N, dim, dim) arrays when scored.
+    """
+
+    def __init__(self, dim: int):
+        if np is None:
+            raise ImportError("batched evaluation requires numpy")
+        self.dim = dim
+        self.size = 0
+        self._codes = bytearray()
+        self._health = bytearray()
+
+    def clear(self):
+        """Forget the positions."""
+        self.size = 0
+        self._codes.clear()
+        self._health.clear()
+
+    def add(self, game: Game):
+        """Append the current position of game."""
+        self._codes += game.board.units
+        self._health += game.board.health
+        self.size += 1
+
+    def codes(self):
+        """(N, dim, dim) BitBoard.units codes."""
+        return np.frombuffer(bytes(self._codes), dtype=np.uint8).reshape(self.size, self.dim, self.dim)
+
+    def types(self):
+        """(N, dim, dim) UnitType values, -1 for empty cells."""
+        return np.asarray(CODE_TYPE, dtype=np.int64)[self.codes()]
+
+    def owners(self):
+        """(N, dim, dim) owners: +1 attacker, -1 defender, 0 empty."""
+        return np.asarray(CODE_OWNER, dtype=np.int64)[self.codes()]
+
+    def healths(self):
+        """(N, dim, dim) unit health, 0 for empty cells."""
+        return np.frombuffer(bytes(self._health), dtype=np.uint8).reshape(self.size, self.dim, self.dim).astype(np.int64)
+
+
+def batch_e0(batch: PositionBatch):
+    """algorithms.e0 for every position of the batch."""
+    return np.asarray(CODE_E0, dtype=np.int64)[batch.codes()].sum(axis=(1, 2))
+
+def batch_e1(batch: PositionBatch):
+    """algorithms.e1 for every position of the batch."""
+    weights = np.asarray(CODE_E1, dtype=np.int64)[batch.codes()]
+    return (weights * batch.healths()).sum(axis=(1, 2))
+
+def batch_e2(batch: PositionBatch):
+    """algorithms.e2 for every position of the batch."""
+    owners = batch.owners()
+    # opposite owners multiply to -1 (empty cells give 0)
+    engaged_pairs = ((owners[:, :, :-1] * owners[:, :, 1:]) == -1).sum(axis=(1, 2))
+    engaged_pairs += ((owners[:, :-1, :] * owners[:, 1:, :]) == -1).sum(axis=(1, 2))
+    return batch_e1(batch) + algorithms.E2_ENGAGED_WEIGHT * engaged_pairs
+
+BATCH_HEURISTICS = {"e0": batch_e0, "e1": batch_e1, "e2": batch_e2}
+
+
+class BatchEvaluator:
+    """Scores the frontier children of a node in one vectorised call (see algorithms.minimax)."""
+
+    def __init__(self, heuristic: str, dim: int):
+        self.score = BATCH_HEURISTICS[heuristic]
+        self.batch = PositionBatch(dim)
+
+    def add(self, game: Game):
+        """Queue a position for the next evaluate()."""
+        self.batch.add(game)
+
+    def evaluate(self, games: list[Game] | None = None) -> list[int]:
+        """Score the positions added since the last call (plus games, if given) and clear the batch."""
+        if games is not None:
+            for game in games:
+                self.add(game)
+        if self.batch.size == 0:
+            return []
+        scores = self.score(self.batch).tolist()
+        self.batch.clear()
+        return scores
@@ -0,0 +1,466 @@
+from __future__ import annotations
+import argparse
+import json
+import platform
+import random
+import timeit
+import tracemalloc
+from time import perf_counter
+from coord import Coord, CoordPair, neighbourhood
+from bitboard import board_masks
+from game import Game, Options
+from gameType import GameType
+from player import Player
+from unit import Unit, UnitType
+
+
+def bench_neighbourhood(dims: list[int], number: int = 20) -> list[dict]:
+    """Time a full-board neighbourhood walk (adjacent cells, adjacency test, 3x3 area) with the Coord
+    iterators versus the precomputed per-dim tables."""
+    results = []
+    for dim in dims:
+        coords = [Coord(row, col) for row in range(dim) for col in range(dim)]
+        table = neighbourhood(dim)
+        adjacent_masks = board_masks(dim).adjacent
+
+        def with_iterators():
+            for src in coords:
+                for dst in src.iter_adjacent():
+                    if 0 <= dst.row < dim and 0 <= dst.col < dim:
+                        _ = dst in src.iter_adjacent()
+                for near in src.iter_range(1):
+                    _ = 0 <= near.row < dim and 0 <= near.col < dim
+
+        def with_tables():
+            for src in range(dim * dim):
+                for dst in table.adjacent[src]:
+                    _ = adjacent_masks[src] >> dst & 1
+                for near in table.area[src]:
+                    pass
+
+        iterators = min(timeit.repeat(with_iterators, number=number, repeat=3)) / number
+        tables = min(timeit.repeat(with_tables, number=number, repeat=3)) / number
+        results.append({
+            "benchmark": "neighbourhood",
+            "dim": dim,
+            "iterators_us": iterators * 1e6,
+            "tables_us": tables * 1e6,
+            "speedup": iterators / tables,
+        })
+    return results
+
+
+def bench_parallel(workers: list[int], depth: int) -> list[dict]:
+    """Time a fixed-depth search of the opening position, single-process versus root-parallel."""
+    import algorithms, parallel
+    results = []
+    options = Options(max_depth=depth, min_depth=depth, max_time=None, randomize_moves=False)
+    game = Game(options=options)
+    start = perf_counter()
+    (_, move, _) = algorithms.search(game)
+    single = perf_counter() - start
+    results.append({"benchmark": "parallel", "depth": depth, "workers": 1, "seconds": single,
+                    "nodes": game.stats.nodes, "move": str(game.move_pair(move)), "speedup": 1.0})
+    for count in workers:
+        game = Game(options=Options(max_depth=depth, min_depth=depth, max_time=None, randomize_moves=False, workers=count))
+        # start the pool (and its processes) outside of the timed search
+        parallel._pool(count)[0].submit(int).result()
+        start = perf_counter()
+        (_, move, _) = parallel.search(game)
+        seconds = perf_counter() - start
+        results.append({"benchmark": "parallel", "depth": depth, "workers": count, "seconds": seconds,
+                        "nodes": game.stats.nodes, "move": str(game.move_pair(move)), "speedup": single / seconds})
+    return results
+
+
+def sample_positions(count: int, seed: int = 0, dim: int = 5) -> list[Game]:
+    """Positions from random playouts, for evaluation benchmarks."""
+    rng = random.Random(seed)
+    positions = []
+    game = Game(options=Options(dim=dim))
+    while len(positions) < count:
+        moves = list(game.move_candidates())
+        if game.has_winner() is not None or len(moves) == 0:
+            game = Game(options=Options(dim=dim))
+            continue
+        game.make_move(rng.choice(moves))
+        positions.append(game.clone())
+    return positions
+
+
+def bench_evaluation(heuristics: list[str], count: int = 10000) -> list[dict]:
+    """Evaluations per second of the scalar heuristics versus the numpy batch versions (which must agree)."""
+    import algorithms, batch_eval
+    positions = sample_positions(count)
+    results = []
+    for name in heuristics:
+        e = algorithms.HEURISTICS[name]
+        start = perf_counter()
+        scalar = [e(game) for game in positions]
+        scalar_seconds = perf_counter() - start
+        row = {"benchmark": "evaluation", "heuristic": name, "positions": count,
+               "scalar_evals_per_s": count / scalar_seconds, "batch_evals_per_s": None}
+        if batch_eval.np is not None:
+            evaluator = batch_eval.BatchEvaluator(name, positions[0].options.dim)
+            start = perf_counter()
+            batched = evaluator.evaluate(positions)
+            batch_seconds = perf_counter() - start
+            if batched != scalar:
+                raise AssertionError(f"batched {name} does not match the scalar heuristic")
+            row["batch_evals_per_s"] = count / batch_seconds
+        results.append(row)
+    return results
+
+
+def bench_ordering(depth: int) -> list[dict]:
+    """Fixed-depth search of the opening position with and without move ordering."""
+    import algorithms
+    results = []
+    for ordering in (False, True):
+        game = Game(options=Options(max_depth=depth, min_depth=depth, max_time=None, randomize_moves=False,
+                                    move_ordering=ordering))
+        start = perf_counter()
+        (_, move, _) = algorithms.search(game)
+        stats = game.stats
+        results.append({"benchmark": "ordering", "depth": depth, "move_ordering": ordering,
+                        "seconds": perf_counter() - start, "nodes": stats.nodes,
+                        "evaluations_per_depth": dict(sorted(stats.evaluations_per_depth.items())),
+                        "first_move_cutoff_rate": stats.first_move_cutoffs / stats.cutoffs if stats.cutoffs else 0.0,
+                        "move": str(game.move_pair(move))})
+    return results
+
+
+# Reference positions: rows of "<player><type><health>" cells (e.g. dA9) or "." for an empty cell.
+REFERENCE_POSITIONS = {
+    "opening": None,
+    "midgame": ([
+        "dA9 dT7 .   .   .  ",
+        "dT9 dP5 aV6 .   .  ",
+        ".   dF4 aP9 .   .  ",
+        ".   .   aF9 .   aV9",
+        ".   .   .   aP7 aA8",
+    ], Player.Attacker, 20),
+    "endgame": ([
+        "dA6 .   .   .   .  ",
+        ".   .   aV3 .   .  ",
+        ".   dT2 .   .   .  ",
+        ".   .   .   .   .  ",
+        ".   .   .   .   aA5",
+    ], Player.Defender, 61),
+}
+
+# perft(depth) leaf counts of the reference positions, checked against the independent rules of selfcheck.py
+EXPECTED_PERFT = {
+    "opening": [1, 12, 133, 1519, 18871],
+    "midgame": [1, 15, 169, 2251, 24811],
+    "endgame": [1, 8, 57, 325, 1964],
+}
+
+
+def reference_position(name: str, options: Options | None = None) -> Game:
+    """Build one of the REFERENCE_POSITIONS."""
+    game = Game(options=options if options is not None else Options())
+    spec = REFERENCE_POSITIONS[name]
+    if spec is None:
+        return game
+    (rows, next_player, turns_played) = spec
+    for (row, line) in enumerate(rows):
+        for (col, cell) in enumerate(line.split()):
+            unit = None
+            if cell != ".":
+                unit = Unit(player=Player.Attacker if cell[0] == "a" else Player.Defender,
+                            type=next(t for t in UnitType if t.name[0] == cell[1]), health=int(cell[2]))
+            game.set(Coord(row, col), unit)
+    game.next_player = next_player
+    game.turns_played = turns_played
+    game._attacker_has_ai = game.board.types[UnitType.AI.value] & game.board.players[Player.Attacker.value] != 0
+    game._defender_has_ai = game.board.types[UnitType.AI.value] & game.board.players[Player.Defender.value] != 0
+    return game
+
+
+def perft(game: Game, depth: int) -> int:
+    """Number of leaf positions depth plies ahead (finished games count as leaves), using make/unmake."""
+    if depth == 0 or game.has_winner() is not None:
+        return 1
+    total = 0
+    for move in game.move_candidates():
+        game.make_move(move)
+        total += perft(game, depth - 1)
+        game.unmake_move()
+    return total
+
+
+def perft_reference(game: Game, depth: int) -> int:
+    """perft computed by the independent rules of selfcheck.ReferencePosition (no move generator, make/unmake
+    or Game._execute_move)."""
+    from selfcheck import ReferencePosition, reference_perft
+    return reference_perft(ReferencePosition.from_game(game), depth)
+
+
+def bench_perft(positions: list[str], depth: int) -> list[dict]:
+    """Move generation throughput (perft leaves per second), checked against EXPECTED_PERFT."""
+    results = []
+    for name in positions:
+        game = reference_position(name)
+        for d in range(1, depth + 1):
+            start = perf_counter()
+            leaves = perft(game, d)
+            seconds = perf_counter() - start
+            expected = EXPECTED_PERFT[name][d] if d < len(EXPECTED_PERFT[name]) else None
+            if expected is not None and leaves != expected:
+                raise AssertionError(f"perft({name}, {d}) = {leaves}, expected {expected}")
+            results.append({"benchmark": "perft", "position": name, "depth": d, "leaves": leaves,
+                            "checked": expected is not None, "seconds": seconds, "leaves_per_s": leaves / seconds})
+    return results
+
+
+def bench_search(positions: list[str], depth: int, heuristic: str = "e0") -> list[dict]:
+    """Timed fixed-depth search of the reference positions: nodes/s, evals/s and peak traced memory."""
+    import algorithms
+    results = []
+    for name in positions:
+        options = Options(max_depth=depth, min_depth=depth, max_time=None, randomize_moves=False, heuristic=heuristic)
+        game = reference_position(name, options)
+        start = perf_counter()
+        (score, move, avg_depth) = algorithms.search(game)
+        seconds = perf_counter() - start
+        evals = sum(game.stats.evaluations_per_depth.values())
+
+        # second run under tracemalloc (which slows it down) only for the memory figure
+        game = reference_position(name, options)
+        tracemalloc.start()
+        algorithms.search(game)
+        (_, peak) = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results.append({"benchmark": "search", "position": name, "depth": depth, "heuristic": heuristic,
+                        "move": str(game.move_pair(move)), "score": score, "seconds": seconds, "nodes": game.stats.nodes,
+                        "evals": evals, "nodes_per_s": game.stats.nodes / seconds, "evals_per_s": evals / seconds,
+                        "avg_depth": avg_depth, "peak_memory_bytes": peak})
+    return results
+
+
+def bench_broker(turns: int = 50, long_polls: tuple = (None, 1.0)) -> list[dict]:
+    """Two clients playing turns moves against each other through a local stand-in broker, polling with
+    backoff versus long polling: move latency (post to receipt) and requests per game."""
+    import threading
+    from broker import BrokerClient
+    from broker_server import BrokerServer
+    move = CoordPair(Coord(0, 0), Coord(0, 1))
+    results = []
+    for long_poll in long_polls:
+        server = BrokerServer().start()
+        clients = [BrokerClient(server.url, poll_interval=0.01, long_poll=long_poll) for _ in range(2)]
+        posted = [0.0] * (turns + 1)
+        received = [0.0] * (turns + 1)
+
+        def play(player: int):
+            client = clients[player]
+            for turn in range(1, turns + 1):
+                if turn % 2 == (1 if player == 0 else 0):
+                    posted[turn] = perf_counter()
+                    client.post_move_async(move, turn)
+                else:
+                    client.wait_for_move(turn)
+                    received[turn] = perf_counter()
+            client.close()
+
+        start = perf_counter()
+        threads = [threading.Thread(target=play, args=(player,)) for player in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = perf_counter() - start
+        server.stop()
+        latencies = sorted(received[turn] - posted[turn] for turn in range(1, turns + 1))
+        results.append({"benchmark": "broker", "turns": turns, "long_poll": long_poll, "seconds": seconds,
+                        "requests": sum(client.requests for client in clients),
+                        "server_gets": server.state.gets, "server_posts": server.state.posts,
+                        "latency_median_ms": latencies[len(latencies) // 2] * 1000,
+                        "latency_max_ms": latencies[-1] * 1000})
+    return results
+
+
+def bench_async_loop(turns: int = 40, depth: int = 4, long_polls: tuple = (None, 1.0)) -> list[dict]:
+    """Two engines playing a game of turns moves through a local stand-in broker, both with the blocking game
+    loop (Game.start) versus both with the asyncio loop (async_game.py): game time and reply latency (from a
+    move accepted by the broker to the reply accepted by it, so receiving, searching and posting)."""
+    import contextlib
+    import io
+    import os
+    import tempfile
+    import threading
+    import async_game
+    from broker_server import BrokerServer
+    results = []
+    for long_poll in long_polls:
+        for loop in ("sync", "async"):
+            server = BrokerServer().start()
+            with tempfile.TemporaryDirectory() as directory:
+                games = []
+                for (name, game_type) in (("attacker", GameType.CompVsDefender), ("defender", GameType.AttackerVsComp)):
+                    options = Options(game_type=game_type, broker=server.url, broker_long_poll=long_poll,
+                                      max_depth=depth, min_depth=depth, max_time=None, max_turns=turns,
+                                      randomize_moves=False, telemetry=False)
+                    game = Game(options=options)
+                    game.logger.path = os.path.join(directory, f"{name}.txt")
+                    games.append(game)
+                play = async_game.run if loop == "async" else Game.start
+                start = perf_counter()
+                # both games print their boards: keep them off the report
+                with contextlib.redirect_stdout(io.StringIO()):
+                    threads = [threading.Thread(target=play, args=(game,)) for game in games]
+                    for thread in threads:
+                        thread.start()
+                    for thread in threads:
+                        thread.join()
+                seconds = perf_counter() - start
+            server.stop()
+            posted = server.state.posted_at
+            replies = sorted(after - before for (before, after) in zip(posted, posted[1:]))
+            results.append({"benchmark": "async_loop", "loop": loop, "turns": turns, "depth": depth,
+                            "long_poll": long_poll, "seconds": seconds, "server_gets": server.state.gets,
+                            "reply_median_ms": replies[len(replies) // 2] * 1000,
+                            "reply_p90_ms": replies[len(replies) * 9 // 10] * 1000,
+                            "reply_max_ms": replies[-1] * 1000})
+    return results
+
+
+def bench_service(clients: int = 16, workers: int = 4, queue_size: int = 8) -> list[dict]:
+    """The load generator (loadgen.py) against a local engine service: turns per second, refused requests
+    and latency percentiles of the suggest requests, seen by the clients and by the service."""
+    import loadgen
+    report = loadgen.run(None, clients, 1, {"max_depth": 3, "max_turns": 40}, 1.0, workers, queue_size)
+    return [{"benchmark": "service", "clients": clients, "workers": workers, "queue": queue_size,
+             "turns": report["turns"], "seconds": report["seconds"], "turns_per_s": report["turns_per_s"],
+             "rejected": report["rejected"], "errors": len(report["errors"]),
+             "client_suggest": report["client_latency"].get("suggest"),
+             "service_suggest": report["service_latency"].get("suggest")}]
+
+
+def bench_pvs(positions: list[str], depth: int, heuristic: str = "e1") -> list[dict]:
+    """Fixed-depth search of the reference positions with plain alpha-beta minimax versus principal
+    variation search (full window, aspiration windows, then with null-move pruning and late-move
+    reductions): nodes, time and node reduction."""
+    import algorithms
+    configurations = [
+        dict(pvs=False),
+        dict(pvs=True, aspiration_window=None),
+        dict(pvs=True),
+        dict(pvs=True, null_move=True),
+        dict(pvs=True, lmr=True),
+        dict(pvs=True, null_move=True, lmr=True),
+    ]
+    results = []
+    for name in positions:
+        baseline = None
+        for configuration in configurations:
+            options = Options(max_depth=depth, min_depth=depth, max_time=None, randomize_moves=False,
+                              heuristic=heuristic, **configuration)
+            game = reference_position(name, options)
+            start = perf_counter()
+            (score, move, _) = algorithms.search(game)
+            seconds = perf_counter() - start
+            stats = game.stats
+            if baseline is None:
+                baseline = stats.nodes
+            results.append({"benchmark": "pvs", "position": name, "depth": depth, "heuristic": heuristic,
+                            "pvs": options.pvs, "aspiration_window": options.aspiration_window if options.pvs else None,
+                            "null_move": options.null_move, "lmr": options.lmr, "move": str(game.move_pair(move)),
+                            "score": score, "seconds": seconds, "nodes": stats.nodes,
+                            "node_reduction": 1 - stats.nodes / baseline, "pvs_researches": stats.pvs_researches,
+                            "aspiration_researches": stats.aspiration_researches,
+                            "null_move_cutoffs": stats.null_move_cutoffs, "lmr_reductions": stats.lmr_reductions,
+                            "lmr_researches": stats.lmr_researches})
+    return results
+
+
+def bench_allocations(positions: list[str], depth: int) -> list[dict]:
+    """Objects constructed per search node in a fixed-depth search of the reference positions: calls of
+    Python-level constructors (__init__/__new__ of Coord, CoordPair, Unit, ...) counted with a profile hook.
+
+    Builtin objects (ints, tuples, generators) are not counted: their allocations need a counting allocator
+    (e.g. an LD_PRELOAD malloc wrapper with PYTHONMALLOC=malloc).
+    """
+    import algorithms
+    import sys
+    results = []
+    for name in positions:
+        options = Options(max_depth=depth, min_depth=depth, max_time=None, randomize_moves=False)
+        game = reference_position(name, options)
+        constructed : dict[str, int] = {}
+
+        def count_constructors(frame, event, arg):
+            if event == "call" and frame.f_code.co_name in ("__init__", "__new__"):
+                if frame.f_code.co_name == "__new__":
+                    owner = frame.f_locals["cls"].__name__
+                else:
+                    owner = type(frame.f_locals["self"]).__name__
+                constructed[owner] = constructed.get(owner, 0) + 1
+
+        sys.setprofile(count_constructors)
+        try:
+            algorithms.search(game)
+        finally:
+            sys.setprofile(None)
+        nodes = game.stats.nodes
+        results.append({"benchmark": "allocations", "position": name, "depth": depth, "nodes": nodes,
+                        "objects_per_node": sum(constructed.values()) / nodes,
+                        "objects_by_class": dict(sorted(constructed.items()))})
+    return results
+
+
+SUITES = ["perft", "search", "ordering", "evaluation", "neighbourhood", "parallel", "broker", "async_loop", "service",
+          "allocations", "pvs"]
+
+def main():
+    parser = argparse.ArgumentParser(prog='benchmark', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--suites', type=str, nargs='+', default=["perft", "search", "ordering", "evaluation",
+                        "neighbourhood"], help='benchmarks to run: ' + '|'.join(SUITES))
+    parser.add_argument('--positions', type=str, nargs='+', default=list(REFERENCE_POSITIONS), help='reference positions')
+    parser.add_argument('--perft_depth', type=int, default=4, help='perft depth')
+    parser.add_argument('--depth', type=int, default=6, help='search depth')
+    parser.add_argument('--dims', type=int, nargs='+', default=[5, 8, 16], help='board dimensions')
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4], help='worker counts for the parallel search')
+    parser.add_argument('--heuristics', type=str, nargs='+', default=["e0", "e1", "e2"], help='heuristics to evaluate')
+    parser.add_argument('--output', type=str, help='write the JSON report to this file instead of stdout')
+    args = parser.parse_args()
+
+    results = []
+    for suite in args.suites:
+        if suite == "perft":
+            results += bench_perft(args.positions, args.perft_depth)
+        elif suite == "search":
+            results += bench_search(args.positions, args.depth)
+        elif suite == "ordering":
+            results += bench_ordering(args.depth)
+        elif suite == "evaluation":
+            results += bench_evaluation(args.heuristics)
+        elif suite == "neighbourhood":
+            results += bench_neighbourhood(args.dims)
+        elif suite == "parallel":
+            results += bench_parallel(args.workers, args.depth)
+        elif suite == "broker":
+            results += bench_broker()
+        elif suite == "async_loop":
+            results += bench_async_loop()
+        elif suite == "service":
+            results += bench_service(workers=args.workers[-1])
+        elif suite == "allocations":
+            results += bench_allocations(args.positions, args.depth)
+        elif suite == "pvs":
+            results += bench_pvs(args.positions, args.depth)
+        else:
+            parser.error(f"unknown suite {suite}")
+    report = json.dumps({"python": platform.python_version(), "machine": platform.machine(),
+                         "results": results}, indent=1)
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            output_file.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
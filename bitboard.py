@@ -0,0 +1,217 @@
+from __future__ import annotations
+from typing import Iterable
+import random
+from coord import neighbourhood
+
+
+class BoardMasks:
+    """Precomputed bit masks for a dim x dim board (one set per dim, shared by every BitBoard)."""
+    __slots__ = ('dim', 'cells', 'full', 'adjacent', 'area', 'forward', 'neighbours')
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.cells = dim * dim
+        self.full = (1 << self.cells) - 1
+        self.neighbours = neighbourhood(dim)
+        self.adjacent = [0] * self.cells
+        self.area = [0] * self.cells
+        # forward[player][cell]: cells a restricted unit of that player may move to (attacker: up/left, defender: down/right)
+        self.forward = [[0] * self.cells, [0] * self.cells]
+        for index in range(self.cells):
+            for adj in self.neighbours.adjacent[index]:
+                bit = 1 << adj
+                self.adjacent[index] |= bit
+                if adj < index:
+                    self.forward[0][index] |= bit
+                else:
+                    self.forward[1][index] |= bit
+            for near in self.neighbours.area[index]:
+                self.area[index] |= 1 << near
+
+
+_masks_by_dim: dict[int, BoardMasks] = {}
+
+def board_masks(dim: int) -> BoardMasks:
+    """Get (and build on first use) the precomputed masks for a board dimension."""
+    masks = _masks_by_dim.get(dim)
+    if masks is None:
+        masks = BoardMasks(dim)
+        _masks_by_dim[dim] = masks
+    return masks
+
+
+class ZobristKeys:
+    """Random 64-bit keys for Zobrist hashing of a dim x dim board.
+
+    unit[cell][code][health] where code is player*5+type+1 (as in BitBoard.units); side is
+    xor-ed in when the defender is to move, and turns times the number of turns left when that is part of
+    a search key (see Game.hash_key). Keys are seeded from dim so they are identical
+    across processes and runs (needed for persisted tables and parallel workers).
+    """
+    __slots__ = ('unit', 'side', 'turns')
+
+    def __init__(self, dim: int):
+        rng = random.Random(f"ai-wargame-zobrist-{dim}")
+        self.unit = [[[rng.getrandbits(64) for _ in range(10)] for _ in range(11)] for _ in range(dim * dim)]
+        self.side = rng.getrandbits(64)
+        self.turns = rng.getrandbits(64) | 1
+
+
+_zobrist_by_dim: dict[int, ZobristKeys] = {}
+
+def zobrist_keys(dim: int) -> ZobristKeys:
+    """Get (and build on first use) the Zobrist keys for a board dimension."""
+    keys = _zobrist_by_dim.get(dim)
+    if keys is None:
+        keys = ZobristKeys(dim)
+        _zobrist_by_dim[dim] = keys
+    return keys
+
+
+def iter_bits(mask: int) -> Iterable[int]:
+    """Iterates over the indices of the set bits of a mask, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+# BitBoard.features layout: unit count by code-1 (code = player*5+type+1), then health sum by code-1,
+# then the number of adjacent attacker/defender pairs
+FEATURE_HEALTH = 10
+FEATURE_ENGAGED = 20
+FEATURE_SIZE = 21
+
+
+class BitBoard:
+    """Bitboard representation of the game grid.
+
+    Cell (row, col) is bit row*dim+col. Occupancy is kept as one int mask per player and one per
+    unit type (indexed by Player.value and UnitType.value); health lives in a flat bytearray where
+    0 means the cell is empty, and units holds player*5+type+1 per cell for O(1) lookups.
+    The Zobrist hash of the units and the evaluation features are kept up to date by
+    place/clear/set_health.
+    """
+    __slots__ = ('dim', 'players', 'types', 'health', 'units', 'hash', 'features', 'masks', 'keys')
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.players = [0, 0]
+        self.types = [0, 0, 0, 0, 0]
+        self.health = bytearray(dim * dim)
+        self.units = bytearray(dim * dim)
+        self.hash = 0
+        self.features = [0] * FEATURE_SIZE
+        self.masks = board_masks(dim)
+        self.keys = zobrist_keys(dim).unit
+
+    def copy(self) -> BitBoard:
+        """Copy of this board (masks are immutable ints, so this is only a few small copies)."""
+        new = BitBoard.__new__(BitBoard)
+        new.dim = self.dim
+        new.players = self.players[:]
+        new.types = self.types[:]
+        new.health = self.health[:]
+        new.units = self.units[:]
+        new.hash = self.hash
+        new.features = self.features[:]
+        new.masks = self.masks
+        new.keys = self.keys
+        return new
+
+    def index(self, row: int, col: int) -> int:
+        """Flat cell index of (row, col)."""
+        return row * self.dim + col
+
+    def occupied(self) -> int:
+        """Mask of all occupied cells."""
+        return self.players[0] | self.players[1]
+
+    def player_at(self, index: int) -> int:
+        """Player value of the unit at index, or -1 if the cell is empty."""
+        code = self.units[index]
+        if code == 0:
+            return -1
+        return (code - 1) // 5
+
+    def type_at(self, index: int) -> int:
+        """UnitType value of the unit at index, or -1 if the cell is empty."""
+        code = self.units[index]
+        if code == 0:
+            return -1
+        return (code - 1) % 5
+
+    def place(self, index: int, player: int, utype: int, health: int):
+        """Put a unit on an empty cell."""
+        bit = 1 << index
+        code = player * 5 + utype + 1
+        features = self.features
+        features[code - 1] += 1
+        features[FEATURE_HEALTH + code - 1] += health
+        features[FEATURE_ENGAGED] += (self.masks.adjacent[index] & self.players[1 - player]).bit_count()
+        self.players[player] |= bit
+        self.types[utype] |= bit
+        self.health[index] = health
+        self.units[index] = code
+        self.hash ^= self.keys[index][code][health]
+
+    def clear(self, index: int):
+        """Remove whatever unit is on a cell."""
+        code = self.units[index]
+        if code == 0:
+            return
+        keep = ~(1 << index)
+        player = (code - 1) // 5
+        features = self.features
+        features[code - 1] -= 1
+        features[FEATURE_HEALTH + code - 1] -= self.health[index]
+        features[FEATURE_ENGAGED] -= (self.masks.adjacent[index] & self.players[1 - player]).bit_count()
+        self.players[player] &= keep
+        self.types[(code - 1) % 5] &= keep
+        self.hash ^= self.keys[index][code][self.health[index]]
+        self.health[index] = 0
+        self.units[index] = 0
+
+    def set_health(self, index: int, health: int):
+        """Change the health of the unit at index (1..9; use clear() to remove it)."""
+        code = self.units[index]
+        key = self.keys[index][code]
+        self.hash ^= key[self.health[index]] ^ key[health]
+        self.features[FEATURE_HEALTH + code - 1] += health - self.health[index]
+        self.health[index] = health
+
+    def compute_hash(self) -> int:
+        """Zobrist hash recomputed from scratch (for checking the incremental one)."""
+        value = 0
+        for index in iter_bits(self.players[0] | self.players[1]):
+            value ^= self.keys[index][self.units[index]][self.health[index]]
+        return value
+
+    def compute_features(self) -> list[int]:
+        """Evaluation features recomputed from scratch (for checking the incremental ones)."""
+        features = [0] * FEATURE_SIZE
+        for index in iter_bits(self.players[0] | self.players[1]):
+            code = self.units[index]
+            features[code - 1] += 1
+            features[FEATURE_HEALTH + code - 1] += self.health[index]
+        adjacent = self.masks.adjacent
+        defender = self.players[1]
+        for index in iter_bits(self.players[0]):
+            features[FEATURE_ENGAGED] += (adjacent[index] & defender).bit_count()
+        return features
+
+    def count(self, player: int, utype: int) -> int:
+        """Number of units of a type a player has."""
+        return self.features[player * 5 + utype]
+
+    def health_sum(self, player: int, utype: int) -> int:
+        """Total health of a player's units of a type (for the AI, the AI's health)."""
+        return self.features[FEATURE_HEALTH + player * 5 + utype]
+
+    def engaged_pairs(self) -> int:
+        """Number of adjacent attacker/defender unit pairs."""
+        return self.features[FEATURE_ENGAGED]
+
+    def is_engaged(self, index: int, player: int) -> bool:
+        """Is a unit of player at index adjacent to an opponent unit ?"""
+        return self.masks.adjacent[index] & self.players[1 - player] != 0
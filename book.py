@@ -0,0 +1,177 @@
+from __future__ import annotations
+import argparse
+import mmap
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from typing import Tuple
+from game import Game, Options
+
+# Opening book: a binary file of fixed-size records sorted by position key (Game.hash_key(), which is
+# the same in every process and run since the Zobrist keys are seeded per board dimension), looked up
+# by binary search over an mmap of the file. Each record holds the best move found by a deep search.
+
+# header: magic, board dimension, record count
+HEADER = struct.Struct("<8sHxxI")
+MAGIC = b"AIWBOOK1"
+# record: key, move source and destination cells (row*dim+col), search depth, score
+RECORD = struct.Struct("<QBBBxi")
+# the cells are bytes: boards up to 16x16
+MAX_DIM = 16
+
+
+class OpeningBook:
+    """Read-only view of a book file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as book_file:
+            self._map = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.dim, self.size) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or len(self._map) != HEADER.size + self.size * RECORD.size:
+            self._map.close()
+            raise ValueError(f"{path} is not an opening book")
+
+    def _record(self, index: int) -> Tuple[int, int, int, int, int]:
+        return RECORD.unpack_from(self._map, HEADER.size + index * RECORD.size)
+
+    def lookup(self, key: int) -> Tuple[int, int, int, int] | None:
+        """(src, dst, depth, score) stored for key, or None."""
+        (low, high) = (0, self.size)
+        while low < high:
+            middle = (low + high) // 2
+            record = self._record(middle)
+            if record[0] < key:
+                low = middle + 1
+            elif record[0] > key:
+                high = middle
+            else:
+                return record[1:]
+        return None
+
+    def probe(self, game: Game) -> Tuple[int, int] | None:
+        """(book move, score) for the current position of game, if the book has a legal one."""
+        if game.board.dim != self.dim:
+            return None
+        found = self.lookup(game.hash_key())
+        if found is None:
+            return None
+        (src, dst, _, score) = found
+        move = game.board.masks.neighbours.moves[src][dst]
+        # a key collision could point to a move that is not legal here
+        if not game.make_move(move):
+            return None
+        game.unmake_move()
+        return (move, score)
+
+    def entries(self) -> dict[int, Tuple[int, int, int, int]]:
+        """Every record as key -> (src, dst, depth, score)."""
+        return {record[0]: record[1:] for record in (self._record(index) for index in range(self.size))}
+
+    def close(self):
+        self._map.close()
+
+
+# open books by path (one mmap per process)
+_books : dict[str, OpeningBook | None] = {}
+
+def open_book(path: str) -> OpeningBook | None:
+    """The book at path, opened on first use (None if there is no such file)."""
+    if path not in _books:
+        _books[path] = OpeningBook(path) if os.path.exists(path) else None
+    return _books[path]
+
+
+def write_book(path: str, dim: int, entries: dict[int, Tuple[int, int, int, int]]):
+    """Write entries (key -> (src, dst, depth, score)) as a sorted book, replacing path atomically."""
+    if dim > MAX_DIM:
+        raise ValueError(f"books support boards up to {MAX_DIM}x{MAX_DIM}, not {dim}x{dim}")
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as book_file:
+        book_file.write(HEADER.pack(MAGIC, dim, len(entries)))
+        for key in sorted(entries):
+            book_file.write(RECORD.pack(key, *entries[key]))
+    os.replace(temporary, path)
+    _books.pop(path, None)
+
+
+def opening_positions(dim: int, plies: int) -> list[Game]:
+    """Every distinct position up to plies plies from the start (finished games excluded)."""
+    positions = []
+    seen = set()
+    frontier = [Game(options=Options(dim=dim))]
+    for ply in range(plies + 1):
+        next_frontier = []
+        for game in frontier:
+            key = game.hash_key()
+            if key in seen or game.has_winner() is not None:
+                continue
+            seen.add(key)
+            positions.append(game)
+            if ply == plies:
+                continue
+            for move in game.move_candidates():
+                child = game.clone()
+                if child.make_move(move):
+                    next_frontier.append(child)
+        frontier = next_frontier
+    return positions
+
+
+def _search_position(state: tuple, options: Options) -> Tuple[int, int, int, int, int] | None:
+    """Worker task: (key, src, dst, depth, score) of a fixed-depth search of the position."""
+    import algorithms
+    game = Game.from_state(state, options)
+    (score, move, _) = algorithms.search(game)
+    if move is None:
+        return None
+    cells = game.board.masks.cells
+    return (game.hash_key(), move // cells, move % cells, options.max_depth, score)
+
+
+def build(path: str, dim: int, plies: int, depth: int, heuristic: str = "e0", processes: int | None = None) -> dict:
+    """Add the positions up to plies plies from the start to the book at path, searched to depth in parallel.
+
+    Incremental: positions the book already has at depth or deeper are not searched again.
+    """
+    if dim > MAX_DIM:
+        raise ValueError(f"books support boards up to {MAX_DIM}x{MAX_DIM}, not {dim}x{dim}")
+    book = open_book(path)
+    entries = {}
+    if book is not None:
+        if book.dim != dim:
+            raise ValueError(f"{path} is a book for dim {book.dim}")
+        entries = book.entries()
+        book.close()
+        _books.pop(path, None)
+    options = Options(dim=dim, max_depth=depth, min_depth=depth, max_time=None, randomize_moves=False,
+                      heuristic=heuristic, telemetry=False, trace="null")
+    positions = [game for game in opening_positions(dim, plies)
+                 if game.hash_key() not in entries or entries[game.hash_key()][2] < depth]
+    start = perf_counter()
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        results = executor.map(_search_position, [game.to_state() for game in positions], [options] * len(positions),
+                               chunksize=max(1, len(positions) // 64))
+        for result in results:
+            if result is not None:
+                entries[result[0]] = result[1:]
+    write_book(path, dim, entries)
+    return {"searched": len(positions), "entries": len(entries), "seconds": perf_counter() - start}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='book', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('path', type=str, help='book file (created or extended)')
+    parser.add_argument('--dim', type=int, default=5, help='board dimension')
+    parser.add_argument('--plies', type=int, default=3, help='book positions up to this many plies from the start')
+    parser.add_argument('--depth', type=int, default=6, help='search depth of every book position')
+    parser.add_argument('--heuristic', type=str, default="e0", help='heuristic: e0|e1|e2')
+    parser.add_argument('--processes', type=int, help='worker processes (default: one per CPU)')
+    args = parser.parse_args()
+    result = build(args.path, args.dim, args.plies, args.depth, args.heuristic, args.processes)
+    print(f"Searched {result['searched']} positions in {result['seconds']:0.1f}s, book has {result['entries']} entries")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+from __future__ import annotations
+import asyncio
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep
+from typing import Tuple
+import requests
+from coord import Coord, CoordPair
+
+# Game broker protocol: GET returns {"success": bool, "data": move | null}, POST sends a move and gets
+# {"success": bool, "data": move} back, where a move is {"from": {"row", "col"}, "to": {"row", "col"}, "turn"}.
+# Brokers that support it (see broker_server.py) also accept GET ?turn=<n>&wait=<seconds> and hold the
+# request until the move of that turn is posted or the wait expires (long polling).
+
+
+def move_to_data(move: CoordPair, turn: int) -> dict:
+    """Broker JSON of a move."""
+    return {
+        "from": {"row": move.src.row, "col": move.src.col},
+        "to": {"row": move.dst.row, "col": move.dst.col},
+        "turn": turn
+    }
+
+def move_from_data(data: dict, dim: int | None = None) -> CoordPair:
+    """Move of a broker JSON move.
+
+    Raises KeyError or TypeError if a field is missing, ValueError if a coordinate is not an int (on a
+    dim x dim board when dim is given).
+    """
+    cells = (data['from']['row'], data['from']['col'], data['to']['row'], data['to']['col'])
+    for value in cells:
+        if type(value) is not int or value < 0 or (dim is not None and value >= dim):
+            raise ValueError(f"invalid coordinate {value!r}")
+    return CoordPair(Coord(cells[0], cells[1]), Coord(cells[2], cells[3]))
+
+
+def _move_of_turn(response: dict, turn: int, dim: int | None) -> CoordPair | None:
+    """The move in a GET answer if it is the move of turn. Raises BrokerError if the answer is malformed."""
+    try:
+        data = response['data']
+        if data is not None and data['turn'] == turn:
+            return move_from_data(data, dim)
+    except (KeyError, TypeError, ValueError) as error:
+        raise BrokerError(f"malformed move, response: {response}") from error
+    return None
+
+
+# an empty long-poll answer after this fraction of the wait means the broker held the request as asked
+LONG_POLL_HELD = 0.5
+
+def _held(long_poll: float | None, seconds: float) -> bool:
+    """Whether an empty answer after seconds was a long poll held by the broker (no pause needed before the next)."""
+    return long_poll is not None and seconds >= long_poll * LONG_POLL_HELD
+
+
+class BrokerError(Exception):
+    """The broker answered with an error (or not at all)."""
+
+
+class BrokerClient:
+    """Game broker client over one pooled, keep-alive HTTP session.
+
+    Moves are read with wait_for_move (exponential backoff between polls, or long polling if long_poll
+    is set) and posted by a background thread from a queue, so posting overlaps with the next search.
+    """
+
+    def __init__(self, url: str, poll_interval: float = 0.1, max_poll_interval: float = 1.0,
+                 long_poll: float | None = None, timeout: float = 10.0, dim: int | None = None):
+        self.url = url
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.long_poll = long_poll
+        self.timeout = timeout
+        # board dimension the moves read must fit (when known)
+        self.dim = dim
+        self.session = requests.Session()
+        self.session.headers['Accept'] = 'application/json'
+        # request count and round-trip seconds of every request made
+        self.requests = 0
+        self.latencies : list[float] = []
+        # errors of the queued posts
+        self.errors : list[str] = []
+        self._posts : queue.Queue[Tuple[dict, threading.Event] | None] = queue.Queue()
+        self._poster : threading.Thread | None = None
+
+    def _request(self, method: str, **kwargs) -> dict:
+        """One request, with the JSON response parsed once."""
+        start = perf_counter()
+        try:
+            r = self.session.request(method, self.url, timeout=self.timeout, **kwargs)
+            response = r.json()
+        except (requests.RequestException, ValueError) as error:
+            raise BrokerError(str(error)) from error
+        finally:
+            self.requests += 1
+            self.latencies.append(perf_counter() - start)
+        if r.status_code != 200 or not response.get('success'):
+            raise BrokerError(f"status code: {r.status_code}, response: {response}")
+        return response
+
+    def get_move(self, turn: int, wait: float | None = None) -> CoordPair | None:
+        """The move of the given turn if the broker has it (waiting up to wait seconds on brokers that support it)."""
+        params = None
+        if wait is not None:
+            params = {'turn': turn, 'wait': wait}
+        return _move_of_turn(self._request('GET', params=params), turn, self.dim)
+
+    def wait_for_move(self, turn: int, timeout: float | None = None) -> CoordPair | None:
+        """Poll until the move of the given turn is available (None if timeout seconds pass first).
+
+        Errors are reported and retried after a backoff pause, like empty answers (with long polling, only
+        those that came back early: the broker is not holding the requests).
+        """
+        deadline = None if timeout is None else perf_counter() + timeout
+        interval = self.poll_interval
+        while True:
+            start = perf_counter()
+            try:
+                move = self.get_move(turn, self.long_poll)
+                if move is not None:
+                    return move
+                held = _held(self.long_poll, perf_counter() - start)
+            except BrokerError as error:
+                print(f"Broker error: {error}")
+                held = False
+            if deadline is not None and perf_counter() >= deadline:
+                return None
+            if held:
+                interval = self.poll_interval
+            else:
+                sleep(interval)
+                interval = min(interval * 2, self.max_poll_interval)
+
+    def post_move(self, move: CoordPair, turn: int):
+        """Send a move and wait for the broker to acknowledge it."""
+        data = move_to_data(move, turn)
+        response = self._request('POST', json=data)
+        if response.get('data') != data:
+            raise BrokerError(f"move not acknowledged, response: {response}")
+
+    def post_move_async(self, move: CoordPair, turn: int) -> threading.Event:
+        """Queue a move for the posting thread; the returned event is set once it has been sent (or failed)."""
+        if self._poster is None:
+            self._poster = threading.Thread(target=self._post_queued, name="broker-poster", daemon=True)
+            self._poster.start()
+        sent = threading.Event()
+        self._posts.put((move_to_data(move, turn), sent))
+        return sent
+
+    def _post_queued(self):
+        while True:
+            item = self._posts.get()
+            if item is None:
+                break
+            (data, sent) = item
+            try:
+                response = self._request('POST', json=data)
+                if response.get('data') != data:
+                    raise BrokerError(f"move not acknowledged, response: {response}")
+            except BrokerError as error:
+                self.errors.append(str(error))
+                print(f"Broker error: {error}")
+            finally:
+                sent.set()
+                self._posts.task_done()
+
+    def drain(self):
+        """Wait until every queued move has been posted."""
+        if self._poster is not None:
+            self._posts.join()
+
+    def close(self):
+        """Post the queued moves, then stop the posting thread and close the session."""
+        if self._poster is not None:
+            self.drain()
+            self._posts.put(None)
+            self._poster.join()
+            self._poster = None
+        self.session.close()
+
+
+class AsyncBrokerClient:
+    """Game broker client for an asyncio event loop (see async_game.py), with the API of BrokerClient as coroutines.
+
+    Requests are made by a BrokerClient (its keep-alive requests session) in a small thread pool, so waiting
+    for the broker does not block the event loop and a move can be posted while a long poll is pending.
+    """
+
+    def __init__(self, url: str, poll_interval: float = 0.1, max_poll_interval: float = 1.0,
+                 long_poll: float | None = None, timeout: float = 10.0, dim: int | None = None):
+        self.client = BrokerClient(url, poll_interval, max_poll_interval, long_poll, timeout, dim)
+        self.url = url
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.long_poll = long_poll
+        # one thread for the pending poll, one for a post
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="broker")
+
+    @property
+    def requests(self) -> int:
+        return self.client.requests
+
+    @property
+    def latencies(self) -> list[float]:
+        return self.client.latencies
+
+    async def get_move(self, turn: int, wait: float | None = None) -> CoordPair | None:
+        """The move of the given turn if the broker has it (waiting up to wait seconds on brokers that support it)."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.client.get_move, turn, wait)
+
+    async def wait_for_move(self, turn: int, timeout: float | None = None) -> CoordPair | None:
+        """Poll until the move of the given turn is available (None if timeout seconds pass first).
+
+        Errors are reported and retried after a backoff pause, like empty answers (with long polling, only
+        those that came back early: the broker is not holding the requests).
+        """
+        deadline = None if timeout is None else perf_counter() + timeout
+        interval = self.poll_interval
+        while True:
+            start = perf_counter()
+            try:
+                move = await self.get_move(turn, self.long_poll)
+                if move is not None:
+                    return move
+                held = _held(self.long_poll, perf_counter() - start)
+            except BrokerError as error:
+                print(f"Broker error: {error}")
+                held = False
+            if deadline is not None and perf_counter() >= deadline:
+                return None
+            if held:
+                interval = self.poll_interval
+            else:
+                await asyncio.sleep(interval)
+                interval = min(interval * 2, self.max_poll_interval)
+
+    async def post_move(self, move: CoordPair, turn: int):
+        """Send a move and wait for the broker to acknowledge it."""
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.client.post_move, move, turn)
+
+    async def close(self):
+        """Wait for the requests in progress, then close the session."""
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+        self.client.close()
@@ -0,0 +1,137 @@
+from __future__ import annotations
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+from urllib.parse import urlparse, parse_qs
+
+# Local stand-in for the game broker (see broker.py for the protocol), for measuring and testing broker
+# play without the network. It keeps the last posted move, and GET ?turn=<n>&wait=<seconds> waits for
+# the move of turn n (long polling).
+
+# longest wait a long-poll request may ask for
+MAX_WAIT = 30.0
+
+
+class BrokerState:
+    """Last posted move, request counters and post times, shared by the handler threads."""
+
+    def __init__(self):
+        self.data : dict | None = None
+        self.gets = 0
+        self.posts = 0
+        # perf_counter() of every accepted move
+        self.posted_at : list[float] = []
+        self.changed = threading.Condition()
+
+    def wait_for_turn(self, turn: int, wait: float) -> dict | None:
+        with self.changed:
+            self.changed.wait_for(lambda: self.data is not None and self.data['turn'] >= turn, min(wait, MAX_WAIT))
+            return self.data
+
+    def post(self, data: dict):
+        with self.changed:
+            self.data = data
+            self.posted_at.append(perf_counter())
+            self.changed.notify_all()
+
+
+def _is_move(data) -> bool:
+    try:
+        return (isinstance(data['turn'], int) and all(isinstance(data[end][axis], int)
+                for end in ('from', 'to') for axis in ('row', 'col')))
+    except (KeyError, TypeError):
+        return False
+
+
+class BrokerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # buffer the response so headers and body leave in one segment (avoids delayed-ACK stalls on keep-alive)
+    wbufsize = 1 << 16
+    server : BrokerServer
+
+    def _reply(self, status: int, response: dict):
+        body = json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        state = self.server.state
+        with state.changed:
+            state.gets += 1
+        query = parse_qs(urlparse(self.path).query)
+        try:
+            if 'wait' in query and 'turn' in query:
+                data = state.wait_for_turn(int(query['turn'][0]), float(query['wait'][0]))
+            else:
+                data = state.data
+        except ValueError:
+            self._reply(400, {'success': False, 'error': 'invalid turn or wait'})
+            return
+        self._reply(200, {'success': True, 'data': data})
+
+    def do_POST(self):
+        state = self.server.state
+        with state.changed:
+            state.posts += 1
+        try:
+            data = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        except ValueError:
+            data = None
+        if not _is_move(data):
+            self._reply(400, {'success': False, 'error': 'invalid move'})
+            return
+        state.post(data)
+        self._reply(200, {'success': True, 'data': data})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class BrokerServer(ThreadingHTTPServer):
+    """The stand-in broker; start() serves it from a background thread."""
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), BrokerHandler)
+        self.state = BrokerState()
+        self._thread : threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        (host, port) = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> BrokerServer:
+        self._thread = threading.Thread(target=self.serve_forever, name="broker-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='broker_server', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--host', type=str, default="127.0.0.1", help='address to listen on')
+    parser.add_argument('--port', type=int, default=8001, help='port to listen on')
+    args = parser.parse_args()
+    server = BrokerServer(args.host, args.port)
+    print(f"Broker listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+if __name__ == '__main__':
+    main()
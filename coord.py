@@ -1,28 +1,62 @@
 
 from __future__ import annotations
-from dataclasses import dataclass, field
 from typing import Tuple, TypeVar, Type, Iterable, ClassVar
-import copy
 
 
-@dataclass()
+# row and column labels, and their values
+ROW_LABELS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+COL_LABELS = "0123456789abcdef"
+_ROW_VALUES = {label: row for (row, label) in enumerate(ROW_LABELS)} | {label.lower(): row for (row, label) in enumerate(ROW_LABELS)}
+_COL_VALUES = {label: col for (col, label) in enumerate(COL_LABELS)} | {label.upper(): col for (col, label) in enumerate(COL_LABELS)}
+# separators dropped when parsing
+_SEPARATORS = str.maketrans("", "", " ,.:;-_")
+
+
 class Coord:
-    """Representation of a game cell coordinate (row, col)."""
-    row : int = 0
-    col : int = 0
+    """Representation of a game cell coordinate (row, col).
+
+    Coords are immutable. The cells that have labels (rows A-Z, columns 0-f) are interned: Coord(row, col)
+    always returns the same object for them. Any other (row, col), e.g. off the board, gets a new object
+    that is not kept, so values arriving from outside cannot grow the table.
+    """
+    __slots__ = ('row', 'col')
+    _interned : ClassVar[dict[Tuple[int, int], Coord]] = {}
+
+    def __new__(cls, row: int = 0, col: int = 0) -> Coord:
+        coord = cls._interned.get((row, col))
+        if coord is None:
+            coord = object.__new__(cls)
+            object.__setattr__(coord, 'row', row)
+            object.__setattr__(coord, 'col', col)
+        return coord
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Coord is immutable")
+
+    def __reduce__(self):
+        return (Coord, (self.row, self.col))
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Coord) and self.row == other.row and self.col == other.col
+
+    def __hash__(self) -> int:
+        return hash((self.row, self.col))
+
+    def __repr__(self) -> str:
+        return f"Coord(row={self.row}, col={self.col})"
 
     def col_string(self) -> str:
         """Text representation of this Coord's column."""
         coord_char = '?'
-        if self.col < 16:
-                coord_char = "0123456789abcdef"[self.col]
+        if 0 <= self.col < 16:
+                coord_char = COL_LABELS[self.col]
         return str(coord_char)
 
     def row_string(self) -> str:
         """Text representation of this Coord's row."""
         coord_char = '?'
-        if self.row < 26:
-                coord_char = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"[self.row]
+        if 0 <= self.row < 26:
+                coord_char = ROW_LABELS[self.row]
         return str(coord_char)
 
     def to_string(self) -> str:
@@ -34,8 +68,8 @@ class Coord:
         return self.to_string()
     
     def clone(self) -> Coord:
-        """Clone a Coord."""
-        return copy.copy(self)
+        """Clone a Coord (Coords are immutable, so this is the Coord itself)."""
+        return self
 
     def iter_range(self, dist: int) -> Iterable[Coord]:
         """Iterates over Coords inside a rectangle centered on our Coord."""
@@ -53,24 +87,53 @@ class Coord:
     @classmethod
     def from_string(cls, s : str) -> Coord | None:
         """Create a Coord from a string. ex: D2."""
-        s = s.strip()
-        for sep in " ,.:;-_":
-                s = s.replace(sep, "")
+        s = s.strip().translate(_SEPARATORS)
         if (len(s) == 2):
-            coord = Coord()
-            coord.row = "ABCDEFGHIJKLMNOPQRSTUVWXYZ".find(s[0:1].upper())
-            coord.col = "0123456789abcdef".find(s[1:2].lower())
-            return coord
+            return Coord(_ROW_VALUES.get(s[0], -1), _COL_VALUES.get(s[1], -1))
         else:
             return None
 
+Coord._interned.update({(row, col): Coord(row, col) for row in range(len(ROW_LABELS)) for col in range(len(COL_LABELS))})
+
+def _is_interned(coord: Coord) -> bool:
+    return Coord._interned.get((coord.row, coord.col)) is coord
+
 ##############################################################################################################
 
-@dataclass()
 class CoordPair:
-    """Representation of a game move or a rectangular area via 2 Coords."""
-    src : Coord = field(default_factory=Coord)
-    dst : Coord = field(default_factory=Coord)
+    """Representation of a game move or a rectangular area via 2 Coords.
+
+    Like Coords, CoordPairs are immutable, and interned when both Coords are. Inside the search a move is
+    an int instead, src_index * cells + dst_index with cell index row * dim + col (see Neighbourhood.pair
+    and move).
+    """
+    __slots__ = ('src', 'dst')
+    _interned : ClassVar[dict[Tuple[Coord, Coord], CoordPair]] = {}
+
+    def __new__(cls, src: Coord = Coord(), dst: Coord = Coord()) -> CoordPair:
+        pair = cls._interned.get((src, dst))
+        if pair is None:
+            pair = object.__new__(cls)
+            object.__setattr__(pair, 'src', src)
+            object.__setattr__(pair, 'dst', dst)
+            if _is_interned(src) and _is_interned(dst):
+                cls._interned[(src, dst)] = pair
+        return pair
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CoordPair is immutable")
+
+    def __reduce__(self):
+        return (CoordPair, (self.src, self.dst))
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, CoordPair) and self.src == other.src and self.dst == other.dst
+
+    def __hash__(self) -> int:
+        return hash((self.src, self.dst))
+
+    def __repr__(self) -> str:
+        return f"CoordPair(src={self.src!r}, dst={self.dst!r})"
 
     def to_string(self) -> str:
         """Text representation of a CoordPair."""
@@ -81,8 +144,8 @@ class CoordPair:
         return self.to_string()
 
     def clone(self) -> CoordPair:
-        """Clones a CoordPair."""
-        return copy.copy(self)
+        """Clones a CoordPair (CoordPairs are immutable, so this is the CoordPair itself)."""
+        return self
 
     def iter_rectangle(self) -> Iterable[Coord]:
         """Iterates over cells of a rectangular area."""
@@ -103,15 +166,58 @@ class CoordPair:
     @classmethod
     def from_string(cls, s : str) -> CoordPair | None:
         """Create a CoordPair from a string. ex: A3 B2"""
-        s = s.strip()
-        for sep in " ,.:;-_":
-                s = s.replace(sep, "")
+        s = s.strip().translate(_SEPARATORS)
         if (len(s) == 4):
-            coords = CoordPair()
-            coords.src.row = "ABCDEFGHIJKLMNOPQRSTUVWXYZ".find(s[0:1].upper())
-            coords.src.col = "0123456789abcdef".find(s[1:2].lower())
-            coords.dst.row = "ABCDEFGHIJKLMNOPQRSTUVWXYZ".find(s[2:3].upper())
-            coords.dst.col = "0123456789abcdef".find(s[3:4].lower())
-            return coords
+            return CoordPair(Coord(_ROW_VALUES.get(s[0], -1), _COL_VALUES.get(s[1], -1)),
+                             Coord(_ROW_VALUES.get(s[2], -1), _COL_VALUES.get(s[3], -1)))
         else:
-            return None
\ No newline at end of file
+            return None
+
+##############################################################################################################
+
+class Neighbourhood:
+    """Precomputed neighbour tables of a dim x dim board, indexed by flat cell id (row*dim+col).
+
+    coords[i] is the Coord of cell i, adjacent[i] the in-bounds cells of Coord.iter_adjacent() and
+    area[i] the in-bounds cells of Coord.iter_range(1), in iterator order. moves[src][dst] is the int
+    move src * cells + dst (shared int objects, so generating moves does not allocate), pair() and
+    move() convert between int moves and CoordPairs.
+    """
+    __slots__ = ('dim', 'cells', 'coords', 'adjacent', 'area', 'moves', '_pairs')
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.cells = dim * dim
+        self.coords = [Coord(index // dim, index % dim) for index in range(dim * dim)]
+        self.moves = [[src * self.cells + dst for dst in range(self.cells)] for src in range(self.cells)]
+        self._pairs : list[CoordPair | None] = [None] * (self.cells * self.cells)
+        self.adjacent = [self._clip(coord.iter_adjacent()) for coord in self.coords]
+        self.area = [self._clip(coord.iter_range(1)) for coord in self.coords]
+
+    def pair(self, move: int) -> CoordPair:
+        """CoordPair of an int move."""
+        pair = self._pairs[move]
+        if pair is None:
+            pair = CoordPair(self.coords[move // self.cells], self.coords[move % self.cells])
+            self._pairs[move] = pair
+        return pair
+
+    def move(self, pair: CoordPair) -> int:
+        """Int move of a CoordPair (both cells must be on the board)."""
+        return self.moves[pair.src.row * self.dim + pair.src.col][pair.dst.row * self.dim + pair.dst.col]
+
+    def _clip(self, coords: Iterable[Coord]) -> tuple[int, ...]:
+        """Flat ids of the coords that are inside the board."""
+        dim = self.dim
+        return tuple(c.row * dim + c.col for c in coords if 0 <= c.row < dim and 0 <= c.col < dim)
+
+
+_neighbourhoods: dict[int, Neighbourhood] = {}
+
+def neighbourhood(dim: int) -> Neighbourhood:
+    """Get (and build on first use) the neighbour tables for a board dimension."""
+    table = _neighbourhoods.get(dim)
+    if table is None:
+        table = Neighbourhood(dim)
+        _neighbourhoods[dim] = table
+    return table
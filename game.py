@@ -3,40 +3,163 @@ import logger
 from enum import Enum
 import copy
 from datetime import datetime
-from dataclasses import dataclass, field
 from time import sleep
+from dataclasses import dataclass, field, fields
 from typing import Tuple, TypeVar, Type, Iterable, ClassVar
 import random
-import requests
+import threading
 from player import Player
 from coord import CoordPair, Coord
 from unit import Unit, UnitType
 from gameType import GameType
+from bitboard import BitBoard, iter_bits, zobrist_keys
+import rules
+from telemetry import Telemetry, TurnRecord, format_turn
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from transposition import TranspositionTable
+    from broker import BrokerClient
+    from ponder import Ponderer
+    from record import RecordWriter
 
 # maximum and minimum values for our heuristic scores (usually represents an end of game condition)
 MAX_HEURISTIC_SCORE = 2000000000
 MIN_HEURISTIC_SCORE = -2000000000
 
+# enum members by value, to turn bitboard ints back into Player/UnitType
+PLAYERS = tuple(Player)
+UNIT_TYPES = tuple(UnitType)
+
+# BitBoard.units codes of the two AIs
+UNIT_CODE_ATTACKER_AI = Player.Attacker.value * 5 + UnitType.AI.value + 1
+UNIT_CODE_DEFENDER_AI = Player.Defender.value * 5 + UnitType.AI.value + 1
+
 @dataclass()
 class Options:
     """Representation of the game options."""
     dim: int = 5
     max_depth : int | None = 4
+    # node budget per search, like max_time not applied to depths up to min_depth (not supported with workers > 1)
+    max_nodes : int | None = None
     min_depth : int | None = 2
     max_time : float | None = 5.0
     game_type : GameType = GameType.AttackerVsDefender
     alpha_beta : bool = True
+    pvs : bool = False
+    aspiration_window : int | None = 100
+    null_move : bool = False
+    null_move_reduction : int = 2
+    lmr : bool = False
+    lmr_min_depth : int = 3
+    lmr_after : int = 3
     max_turns : int | None = 100
     randomize_moves : bool = True
+    seed : int | None = None
+    book : str | None = None
+    tablebase : str | None = None
+    ponder : bool = False
+    check_features : bool = False
     broker : str | None = None
+    broker_long_poll : float | None = None
+    tt_size : int = 1 << 16
+    workers : int = 1
+    heuristic : str = "e0"
+    batch_eval : bool = False
+    move_ordering : bool = True
+    telemetry : bool = True
+    trace : str = "buffered"
+    record : str | None = None
+
+# Options field annotations as sets of type names (annotations are strings here, e.g. "int | None")
+OPTION_TYPES = {f.name: {name.strip() for name in str(f.type).split("|")} for f in fields(Options)}
+
+# smallest values of numeric Options fields: below them the search does not terminate (a zero aspiration
+# window never widens, lmr_min_depth < 2 reduces 1-ply nodes past max_depth) or the setting is meaningless
+OPTION_MINIMUMS = {"aspiration_window": 1, "null_move_reduction": 1, "lmr_min_depth": 2, "lmr_after": 0}
+
+# text accepted for bool Options fields
+TRUE_TEXT = ("1", "true", "yes", "on")
+FALSE_TEXT = ("0", "false", "no", "off")
+
+def option_value(name: str, value):
+    """A value for the Options field name, checked against its annotation and OPTION_MINIMUMS.
+
+    Text given for a field that is not a string (command-line overrides) is converted: "none" to None,
+    TRUE_TEXT and FALSE_TEXT to True and False, otherwise int or float. Raises ValueError if the value does
+    not fit.
+    """
+    value = _typed_option_value(name, value)
+    minimum = OPTION_MINIMUMS.get(name)
+    if minimum is not None and value is not None and value < minimum:
+        raise ValueError(f"option {name} must be at least {minimum}, not {value!r}")
+    return value
+
+def _typed_option_value(name: str, value):
+    """option_value() without the range check."""
+    types = OPTION_TYPES[name]
+    if isinstance(value, str) and value.lower() == "none" and "None" in types:
+        return None
+    if isinstance(value, str) and "str" not in types:
+        try:
+            if "bool" in types:
+                if value.lower() in TRUE_TEXT:
+                    return True
+                if value.lower() in FALSE_TEXT:
+                    return False
+            if "int" in types:
+                return int(value)
+            if "float" in types:
+                return float(value)
+        except ValueError:
+            pass
+    elif value is None:
+        if "None" in types:
+            return value
+    elif isinstance(value, bool):
+        if "bool" in types:
+            return value
+    elif isinstance(value, int):
+        if "int" in types or "float" in types:
+            return value
+    elif isinstance(value, float):
+        if "float" in types:
+            return value
+    elif isinstance(value, str):
+        return value
+    raise ValueError(f"option {name} must be {Options.__dataclass_fields__[name].type}, not {value!r}")
 
 ##############################################################################################################
 
+@dataclass()
+class IterationStats:
+    """One iteration of the iterative deepening search."""
+    depth : int = 0
+    nodes : int = 0
+    seconds : float = 0.0
+    completed : bool = True
+
 @dataclass()
 class Stats:
     """Representation of the global game statistics."""
     evaluations_per_depth : dict[int,int] = field(default_factory=dict)
     total_seconds: float = 0.0
+    nodes : int = 0
+    iterations : list[IterationStats] = field(default_factory=list)
+    tt_probes : int = 0
+    tt_hits : int = 0
+    tt_stores : int = 0
+    tt_collisions : int = 0
+    cutoffs : int = 0
+    first_move_cutoffs : int = 0
+    movegen_seconds : float = 0.0
+    eval_seconds : float = 0.0
+    tablebase_hits : int = 0
+    ponder_seconds : float = 0.0
+    pvs_researches : int = 0
+    aspiration_researches : int = 0
+    null_move_cutoffs : int = 0
+    lmr_reductions : int = 0
+    lmr_researches : int = 0
 
 
 ##############################################################################################################
@@ -44,18 +167,27 @@ class Stats:
 @dataclass()
 class Game:
     """Representation of the game state."""
-    board: list[list[Unit | None]] = field(default_factory=list)
+    board: BitBoard = field(init=False, repr=False)
     next_player: Player = Player.Attacker
     turns_played : int = 0
     options: Options = field(default_factory=Options)
     stats: Stats = field(default_factory=Stats)
     _attacker_has_ai : bool = True
     _defender_has_ai : bool = True
+    _undo : list[tuple] = field(default_factory=list, repr=False)
+    transposition_table : TranspositionTable | None = field(default=None, repr=False)
+    telemetry : Telemetry | None = field(default=None, repr=False)
+    broker_client : BrokerClient | None = field(default=None, repr=False)
+    rng : random.Random = field(init=False, repr=False)
+    ponderer : Ponderer | None = field(default=None, repr=False)
+    recorder : RecordWriter | None = field(default=None, repr=False)
 
     def __post_init__(self):
         """Automatically called after class init to set up the default board state."""
         dim = self.options.dim
-        self.board = [[None for _ in range(dim)] for _ in range(dim)]
+        self.board = BitBoard(dim)
+        # breaks ties between equally good root moves when options.randomize_moves is set
+        self.rng = random.Random(self.options.seed)
         md = dim-1
         self.set(Coord(0,0),Unit(player=Player.Defender,type=UnitType.AI))
         self.set(Coord(1,0),Unit(player=Player.Defender,type=UnitType.Tech))
@@ -70,7 +202,9 @@ class Game:
         self.set(Coord(md,md-2),Unit(player=Player.Attacker,type=UnitType.Program))
         self.set(Coord(md-1,md-1),Unit(player=Player.Attacker,type=UnitType.Firewall))
 
+        # no trace or telemetry file until the game is actually played (see open_trace)
         self.logger = logger.Logger(self)
+        self.telemetry = Telemetry(enabled=self.options.telemetry)
 
 
     def clone(self) -> Game:
@@ -79,10 +213,30 @@ class Game:
         Shallow copy of everything except the board (options and stats are shared).
         """
         new = copy.copy(self)
-        new.board = copy.deepcopy(self.board)
+        new.board = self.board.copy()
+        new._undo = []
         return new
     
+    def open_trace(self):
+        """Start writing the game trace (and search telemetry) files, unless options.trace is "null"."""
+        if self.options.trace == "null":
+            return
+        self.logger.open(self.options.trace)
+        self.telemetry.path = self.logger.telemetry_path()
+
+    def open_record(self, side_options: list[Options] | None = None):
+        """Start writing the binary game record (see record.py), if options.record is set.
+
+        side_options are the attacker's and the defender's Options, if they differ from the game's.
+        """
+        if self.options.record is None:
+            return
+        from record import RecordWriter  # imported here: record depends on game
+        self.recorder = RecordWriter(self.options.record, self, side_options=side_options)
+
     def start(self):
+        self.open_trace()
+        self.open_record()
             # the main game loop
         while True:
             print()
@@ -91,12 +245,9 @@ class Game:
             if winner is not None:
                 print(f"{winner.name} wins!")
                 self.logger.write_winner()
+                self.finish()
                 break
-            if self.options.game_type == GameType.AttackerVsDefender:
-                self.human_turn()
-            elif self.options.game_type == GameType.AttackerVsComp and self.next_player == Player.Attacker:
-                self.human_turn()
-            elif self.options.game_type == GameType.CompVsDefender and self.next_player == Player.Defender:
+            if self.is_human_turn():
                 self.human_turn()
             else:
                 player = self.next_player
@@ -106,40 +257,93 @@ class Game:
                 else:
                     print("Computer doesn't know what to do!!!")
                     exit(1)
+            self.logger.flush()
+            if self.recorder is not None:
+                self.recorder.flush()
+
+    def finish(self):
+        """Close the trace, telemetry, record and broker, and stop pondering (the game is over)."""
+        self.logger.close()
+        self.telemetry.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.broker_client is not None:
+            self.broker_client.close()
+        self.stop_pondering()
+
+    def is_human_turn(self) -> bool:
+        """Whether the next move comes from a human (or from the broker, when playing via one)."""
+        game_type = self.options.game_type
+        return (game_type == GameType.AttackerVsDefender
+                or (game_type == GameType.AttackerVsComp and self.next_player == Player.Attacker)
+                or (game_type == GameType.CompVsDefender and self.next_player == Player.Defender))
     
     def is_empty(self, coord : Coord) -> bool:
         """Check if contents of a board cell of the game at Coord is empty (must be valid coord)."""
-        return self.board[coord.row][coord.col] is None
+        return self.board.health[coord.row * self.options.dim + coord.col] == 0
 
     def get(self, coord : Coord) -> Unit | None:
-        """Get contents of a board cell of the game at Coord."""
+        """Get contents of a board cell of the game at Coord.
+
+        The Unit is a detached view of the bitboard: use set() or mod_health() to change the board.
+        """
         if self.is_valid_coord(coord):
-            return self.board[coord.row][coord.col]
+            board = self.board
+            index = coord.row * board.dim + coord.col
+            health = board.health[index]
+            if health == 0:
+                return None
+            return Unit(player=PLAYERS[board.player_at(index)],type=UNIT_TYPES[board.type_at(index)],health=health)
         else:
             return None
 
     def set(self, coord : Coord, unit : Unit | None):
         """Set contents of a board cell of the game at Coord."""
         if self.is_valid_coord(coord):
-            self.board[coord.row][coord.col] = unit
+            index = coord.row * self.board.dim + coord.col
+            self.board.clear(index)
+            if unit is not None and unit.is_alive():
+                self.board.place(index, unit.player.value, unit.type.value, unit.health)
 
     def remove_dead(self, coord: Coord):
         """Remove unit at Coord if dead."""
-        unit = self.get(coord)
-        if unit is not None and not unit.is_alive():
-            self.set(coord,None)
-            if unit.type == UnitType.AI:
-                if unit.player == Player.Attacker:
-                    self._attacker_has_ai = False
-                else:
-                    self._defender_has_ai = False
+        if self.is_valid_coord(coord):
+            index = coord.row * self.board.dim + coord.col
+            if self.board.units[index] != 0 and self.board.health[index] == 0:
+                self._kill_index(index)
+
+    def _kill_index(self, index: int):
+        """Remove the unit at a flat cell index, keeping track of lost AIs."""
+        board = self.board
+        if board.units[index] == UNIT_CODE_ATTACKER_AI:
+            self._attacker_has_ai = False
+        elif board.units[index] == UNIT_CODE_DEFENDER_AI:
+            self._defender_has_ai = False
+        board.clear(index)
 
     def mod_health(self, coord : Coord, health_delta : int):
         """Modify health of unit at Coord (positive or negative delta)."""
-        target = self.get(coord)
-        if target is not None:
-            target.mod_health(health_delta)
-            self.remove_dead(coord)
+        if self.is_valid_coord(coord):
+            self._mod_health_index(coord.row * self.board.dim + coord.col, health_delta)
+
+    def _set_health_index(self, index: int, health: int):
+        """Set the health of the unit at a flat cell index, removing it at 0."""
+        if health == 0:
+            self._kill_index(index)
+        elif health != self.board.health[index]:
+            self.board.set_health(index, health)
+
+    def _mod_health_index(self, index: int, health_delta: int):
+        """Modify health of the unit at a flat cell index, removing it if it dies."""
+        board = self.board
+        health = board.health[index]
+        if health == 0:
+            return
+        health += health_delta
+        if health <= 0:
+            self._kill_index(index)
+        else:
+            board.set_health(index, min(health, 9))
 
     def is_valid_move(self, coords : CoordPair) -> bool:
         """Check that coords are within board dimensions"""
@@ -147,131 +351,201 @@ class Game:
             return False
 
         """Check that source coords are not empty and unit belongs to current player"""
-        unit = self.get(coords.src)
-        if unit is None or unit.player != self.next_player:
+        board = self.board
+        src = coords.src.row * board.dim + coords.src.col
+        if not board.players[self.next_player.value] & (1 << src):
             return False
 
-        # Begin Tristan code
         """Check that destination cell is source (self-destruct), up, right, down or left"""
-        if coords.dst != coords.src and coords.dst not in coords.src.iter_adjacent():
-            return False
-
-        """If destination coords is empty, this is a move action"""
-        # if self.get(coords.dst) is None:
-        #     """If unit is an AI, Firewall or Program, it cannot move while engaged"""
-        #     if unit.type in [UnitType.AI, UnitType.Firewall, UnitType.Program]:
-        #         neighborhood = coords.src.iter_adjacent()
-        #         """Check if unit is egnaged"""
-        #         for n in neighborhood:
-        #             n_unit = self.get(n)
-        #             if n_unit is not None and n_unit.player != self.next_player:
-        #                 print("This unit cannot move while engaged")
-        #                 return False
-        #End Tristan code
-
-        return True
+        dst = coords.dst.row * board.dim + coords.dst.col
+        return dst == src or board.masks.adjacent[src] & (1 << dst) != 0
 
     def perform_move(self, coords : CoordPair) -> Tuple[bool,str]:
         """Validate and perform a move expressed as a CoordPair"""
-        unit = self.get(coords.src)
         if self.is_valid_move(coords):
             self.logger.log_action(coords)
-            """If destination is empty, this is a move action"""
-            if self.get(coords.dst) is None:
-                """Check whether unit can move while engaged"""
-                unit = self.get(coords.src)
-                if unit.type in [UnitType.AI, UnitType.Firewall, UnitType.Program]:
-                    """If not, check whether engaged"""
-                    neighborhood = coords.src.iter_adjacent()
-                    for n in neighborhood:
-                        n_unit = self.get(n)
-                        if n_unit is not None and n_unit.player != self.next_player:
-                            return (False, "This unit cannot move while engaged")
-
-                # Check if unit is AI, Firewall or tech; their movement is restricted
-                if unit.type in [UnitType.AI, UnitType.Firewall, UnitType.Program]:
-                    if unit.player == Player.Attacker:
-                        if coords.dst.row == coords.src.row and coords.dst.col == coords.src.col + 1:
-                            return (False, "This unit can't move right")
-                        elif coords.dst.row == coords.src.row + 1 and coords.dst.col == coords.src.col:
-                            return (False, "This unit can't move down")
-                    else:
-                        if coords.dst.row == coords.src.row and coords.dst.col == coords.src.col - 1:
-                            return (False, "This unit can't move left")
-                        elif coords.dst.row == coords.src.row - 1 and coords.dst.col == coords.src.col:
-                            return (False, "This unit can't move up")
-
-
-                self.set(coords.dst,self.get(coords.src))
-                self.set(coords.src,None)
-
-                return (True, f"Moved {unit.type.name} unit from {coords.src} to {coords.dst}")
-
-            else:
-                # TODO: implement attack/repair/self-destruct logic here
-                src_unit = self.get(coords.src)
-                target_unit = self.get(coords.dst)
-
-                """Self-destruct mode"""
-                """Check if the target is same as the source """
-                if src_unit == target_unit:
-                    src_unit.health = 0
-                    self.remove_dead(coords.src)
-                    neighborhood = coords.src.iter_range(1)
-                    total_damage = 0
-                    for n in neighborhood:
-                        n_unit = self.get(n)
-                        if n_unit is not None:
-                            n_unit.mod_health(-2)
-                            total_damage += 2
-                            if n_unit is not n_unit.is_alive():
-                                self.remove_dead(n)
-                    return True, f"{unit.type.name} Self-destructed at {coords.src} for {total_damage} total damage"
-
-                """Repair-mode"""
-                """Check if the target unit is friendly"""
-                if src_unit.player.name == target_unit.player.name:
-                    total_repair = 0
-                    if src_unit.type in [UnitType.AI, UnitType.Tech]:
-                        """Check the repair move if valid, throw error if the target unit health is above 9"""
-                        if target_unit.health != 9:
-                            amt = src_unit.repair_amount(target_unit)
-                            if src_unit.type in [UnitType.AI] and target_unit.type in [UnitType.Virus, UnitType.Tech]:
-                                target_unit.mod_health(amt)
-                                total_repair += amt
-                            elif src_unit.type in [UnitType.Tech] and target_unit.type in [UnitType.Firewall,
-                                                                                           UnitType.AI,
-                                                                                           UnitType.Program]:
-                                target_unit.mod_health(amt)
-                                total_repair += amt
-                            else:
-                                return False, f"Invalid move! {target_unit.type.name} can not be repaired by {src_unit.type}"
-                        else:
-                            return False, "Invalid move! Can not be repaired when health is full"
-                    else:
-                        return False, f"Invalid move! {src_unit.type.name} can not repair"
+            (success, result) = self._execute_move(coords)
+            if success and self.recorder is not None:
+                self.recorder.append(self, self.board.masks.neighbours.move(coords))
+            return (success, result)
+        else:
+            return False,"Invalid move!"
 
-                    return True, (f"{src_unit.type.name} Repaired from {coords.src} to {coords.dst} repaired {total_repair}"
-                                  f" health points")
+    def _execute_move(self, coords : CoordPair) -> Tuple[bool,str]:
+        """Perform a move that passed is_valid_move; the board is only modified if the action is legal."""
+        board = self.board
+        src = coords.src.row * board.dim + coords.src.col
+        dst = coords.dst.row * board.dim + coords.dst.col
+        error = rules.action_error(board, self.next_player.value, src, dst)
+        if error is not None:
+            return (False, error)
+        unit = self.get(coords.src)
 
-                else:
-                    """Attack mode"""
-                    trgt_damage_amt = src_unit.damage_amount(target_unit)
-                    src_damage_amt = target_unit.damage_amount(src_unit)
+        """Self-destruct mode"""
+        if src == dst:
+            self._kill_index(src)
+            total_damage = 0
+            for n in board.masks.neighbours.area[src]:
+                if board.units[n] == 0:
+                    continue
+                self._mod_health_index(n, -2)
+                total_damage += 2
+            return True, f"{unit.type.name} Self-destructed at {coords.src} for {total_damage} total damage"
+
+        """If destination is empty, this is a move action"""
+        if board.units[dst] == 0:
+            board.clear(src)
+            board.place(dst, unit.player.value, unit.type.value, unit.health)
+            return (True, f"Moved {unit.type.name} unit from {coords.src} to {coords.dst}")
+
+        target_unit = self.get(coords.dst)
+
+        """Repair mode: the target unit is friendly"""
+        if target_unit.player == unit.player:
+            amt = unit.repair_amount(target_unit)
+            self._mod_health_index(dst, amt)
+            return True, (f"{unit.type.name} Repaired from {coords.src} to {coords.dst} repaired {amt}"
+                          f" health points")
+
+        """Attack mode"""
+        trgt_damage_amt = unit.damage_amount(target_unit)
+        src_damage_amt = target_unit.damage_amount(unit)
+        self._mod_health_index(src, -src_damage_amt)
+        self._mod_health_index(dst, -trgt_damage_amt)
+        return True, (f"{unit.type.name} Attacked from {coords.src} to {coords.dst} \n"
+                      f"Combat Damage: to source = {src_damage_amt}, to target = {trgt_damage_amt} ")
+
+    def _apply_action(self, src: int, dst: int):
+        """Perform a legal action between flat cell indices (what _execute_move does, resolved with the
+        precomputed rules.OUTCOMES tables instead of Units and messages)."""
+        board = self.board
+        units = board.units
+        health = board.health
+
+        # self-destruct
+        if src == dst:
+            self._kill_index(src)
+            for n in board.masks.neighbours.area[src]:
+                if units[n] != 0:
+                    self._set_health_index(n, rules.SELF_DESTRUCT_HEALTH[health[n]])
+            return
 
-                    src_unit.mod_health(-src_damage_amt)
-                    target_unit.mod_health(-trgt_damage_amt)
-                    if src_unit is not src_unit.is_alive():
-                        self.remove_dead(coords.src)
+        code = units[src]
+        # move
+        if units[dst] == 0:
+            src_health = health[src]
+            board.clear(src)
+            board.place(dst, (code - 1) // 5, (code - 1) % 5, src_health)
+            return
 
-                    if target_unit is not target_unit.is_alive():
-                        self.remove_dead(coords.dst)
+        # attack or repair
+        (src_health, dst_health) = rules.OUTCOMES[code][units[dst]][health[src] * 10 + health[dst]]
+        self._set_health_index(src, src_health)
+        self._set_health_index(dst, dst_health)
 
-                    return True, (f"{unit.type.name} Attacked from {coords.src} to {coords.dst} \n"
-                                  f"Combat Damage: to source = {src_damage_amt}, to target = {trgt_damage_amt} ")
+    def make_move(self, move : int) -> bool:
+        """Perform a move (src * cells + dst, see move_candidates) in place for search (no logging) and advance the turn.
 
+        Pushes an undo record so that unmake_move() can restore the exact previous position.
+        Returns False and leaves the game untouched if the move is not legal.
+        """
+        board = self.board
+        cells = board.masks.cells
+        src = move // cells
+        dst = move % cells
+        player = self.next_player.value
+        if not board.players[player] >> src & 1 or (dst != src and not board.masks.adjacent[src] >> dst & 1):
+            return False
+        if rules.action_error(board, player, src, dst) is not None:
+            return False
+        if src == dst:
+            touched = tuple((n, board.units[n], board.health[n]) for n in iter_bits(board.masks.area[src] & board.occupied()))
         else:
-            return False,"Invalid move!"
+            touched = ((src, board.units[src], board.health[src]), (dst, board.units[dst], board.health[dst]))
+        undo = (tuple(board.players), tuple(board.types), board.hash, tuple(board.features), touched,
+                self._attacker_has_ai, self._defender_has_ai, self.next_player, self.turns_played)
+        self._apply_action(src, dst)
+        self._undo.append(undo)
+        self.next_turn()
+        return True
+
+    def make_null_move(self):
+        """Pass the turn without acting (null-move pruning); taken back with unmake_move() like a move."""
+        board = self.board
+        self._undo.append((tuple(board.players), tuple(board.types), board.hash, tuple(board.features), (),
+                           self._attacker_has_ai, self._defender_has_ai, self.next_player, self.turns_played))
+        self.next_turn()
+
+    def unmake_move(self):
+        """Take back the last move done with make_move()."""
+        (players, types, hash, features, touched, attacker_has_ai, defender_has_ai, next_player, turns_played) = self._undo.pop()
+        board = self.board
+        board.players[:] = players
+        board.types[:] = types
+        board.hash = hash
+        board.features[:] = features
+        for (index, code, health) in touched:
+            board.units[index] = code
+            board.health[index] = health
+        self._attacker_has_ai = attacker_has_ai
+        self._defender_has_ai = defender_has_ai
+        self.next_player = next_player
+        self.turns_played = turns_played
+
+    def snapshot(self) -> tuple:
+        """Exact, comparable copy of the full position (board, side to move, turn and AI flags)."""
+        board = self.board
+        return (tuple(board.players), tuple(board.types), bytes(board.health), bytes(board.units), board.hash,
+                tuple(board.features), self._attacker_has_ai, self._defender_has_ai, self.next_player, self.turns_played)
+
+    def to_state(self) -> tuple:
+        """Compact picklable position (no logger, stats or search tables), for shipping to other processes."""
+        board = self.board
+        return (board.dim, tuple(board.players), tuple(board.types), bytes(board.health), bytes(board.units),
+                board.hash, self.next_player.value, self.turns_played, self._attacker_has_ai, self._defender_has_ai)
+
+    @classmethod
+    def from_state(cls, state: tuple, options: Options) -> Game:
+        """Rebuild a game from to_state() output.
+
+        The result has no logger (it is meant to be searched with make/unmake, not played) and fresh stats.
+        """
+        (dim, players, types, health, units, hash, next_player, turns_played, attacker_has_ai, defender_has_ai) = state
+        board = BitBoard(dim)
+        board.players[:] = players
+        board.types[:] = types
+        board.health[:] = health
+        board.units[:] = units
+        board.hash = hash
+        board.features[:] = board.compute_features()
+        game = cls.__new__(cls)
+        game.board = board
+        game.next_player = PLAYERS[next_player]
+        game.turns_played = turns_played
+        game.options = options
+        game.stats = Stats()
+        game.rng = random.Random(options.seed)
+        game._attacker_has_ai = attacker_has_ai
+        game._defender_has_ai = defender_has_ai
+        game._undo = []
+        game.transposition_table = None
+        game.telemetry = None
+        game.logger = None
+        game.broker_client = None
+        game.ponderer = None
+        game.recorder = None
+        return game
+
+    def hash_key(self, turns_left: bool = False) -> int:
+        """Zobrist key of the position: units and health, plus the side to move (and, with turns_left, the
+        number of turns left before options.max_turns)."""
+        keys = zobrist_keys(self.board.dim)
+        key = self.board.hash
+        if self.next_player == Player.Defender:
+            key ^= keys.side
+        if turns_left and self.options.max_turns is not None:
+            key ^= keys.turns * (self.options.max_turns - self.turns_played) & 0xFFFFFFFFFFFFFFFF
+        return key
 
     def next_turn(self):
         """Transitions game to the next turn."""
@@ -286,27 +560,7 @@ class Game:
         return output + self.board_to_string()
     
     def board_to_string(self) -> str:
-        dim = self.options.dim
-        coord = Coord()
-        output = "\n   "
-        for col in range(dim):
-            coord.col = col
-            label = coord.col_string()
-            output += f"{label:^3} "
-        output += "\n"
-        for row in range(dim):
-            coord.row = row
-            label = coord.row_string()
-            output += f"{label}: "
-            for col in range(dim):
-                coord.col = col
-                unit = self.get(coord)
-                if unit is None:
-                    output += " .  "
-                else:
-                    output += f"{str(unit):^3} "
-            output += "\n"
-        return output
+        return logger.render_board(self.options.dim, self.board.units, self.board.health)
 
     def __str__(self) -> str:
         """Default string representation of a game."""
@@ -322,12 +576,18 @@ class Game:
     def read_move(self) -> CoordPair:
         """Read a move from keyboard and return as a CoordPair."""
         while True:
-            s = input(F'Player {self.next_player.name}, enter your move: ')
-            coords = CoordPair.from_string(s)
-            if coords is not None and self.is_valid_coord(coords.src) and self.is_valid_coord(coords.dst):
+            coords = self.parse_move(input(F'Player {self.next_player.name}, enter your move: '))
+            if coords is not None:
                 return coords
             else:
                 print('Invalid coordinates! Try again.')
+
+    def parse_move(self, s: str) -> CoordPair | None:
+        """Move typed as e.g. "A3 B2", or None if it is not two coordinates on the board."""
+        coords = CoordPair.from_string(s)
+        if coords is not None and self.is_valid_coord(coords.src) and self.is_valid_coord(coords.dst):
+            return coords
+        return None
     
     def human_turn(self):
         """Human player plays a move (or get via broker)."""
@@ -336,13 +596,15 @@ class Game:
             while True:
                 mv = self.get_move_from_broker()
                 if mv is not None:
+                    print(f"Got move from broker: {mv}")
                     (success,result) = self.perform_move(mv)
                     print(f"Broker {self.next_player.name}: ",end='')
                     print(result)
                     if success:
                         self.next_turn()
                         break
-                sleep(0.1)
+                    # the broker keeps answering with the same invalid move until the opponent replaces it
+                    sleep(self.broker().poll_interval)
         else:
             while True:
                 mv = self.read_move()
@@ -361,21 +623,41 @@ class Game:
     def computer_turn(self) -> CoordPair | None:
         """Computer plays a move."""
         mv = self.suggest_move()
-        if mv is not None:
-            (success,result) = self.perform_move(mv)
-            #TODO Log additional information (3.1 and 3.2)
-            if success:
-                print(f"Computer {self.next_player.name}: ",end='')
-                print(result)
-                self.next_turn()
+        if mv is not None and self.play_computer_move(mv):
+            self.start_pondering()
         return mv
 
+    def play_computer_move(self, mv: CoordPair) -> bool:
+        """Perform the move the last search_move() chose, with its console output and trace lines."""
+        (success,result) = self.perform_move(mv)
+        if success:
+            print(f"Computer {self.next_player.name}: ",end='')
+            print(result)
+            record = self.telemetry.records[-1]
+            self.logger.log_search(lambda: format_turn(record, self.stats))
+            self.next_turn()
+        return success
+
+    def start_pondering(self):
+        """Search ahead in the background while the opponent (human or broker) is to move, if options.ponder is set."""
+        if self.options.ponder and self.options.game_type != GameType.CompVsComp and self.has_winner() is None:
+            from ponder import Ponderer  # imported here: ponder depends on game
+            self.ponderer = Ponderer(self)
+
+    def stop_pondering(self) -> Ponderer | None:
+        """Stop the background search of the opponent's turn, if any, and return it."""
+        ponderer = self.ponderer
+        if ponderer is not None:
+            self.ponderer = None
+            ponderer.stop()
+        return ponderer
+
     def player_units(self, player: Player) -> Iterable[Tuple[Coord,Unit]]:
-        """Iterates over all units belonging to a player."""
-        for coord in CoordPair.from_dim(self.options.dim).iter_rectangle():
-            unit = self.get(coord)
-            if unit is not None and unit.player == player:
-                yield (coord,unit)
+        """Iterates over all units belonging to a player (the player's occupancy mask is the unit index)."""
+        coords = self.board.masks.neighbours.coords
+        for index in iter_bits(self.board.players[player.value]):
+            coord = coords[index]
+            yield (coord,self.get(coord))
 
     def is_finished(self) -> bool:
         """Check if the game is over."""
@@ -390,93 +672,110 @@ class Game:
                 return None
             else:
                 return Player.Attacker    
-        elif self._defender_has_ai:
+        else:
+            # the attacker only wins if its AI survives the defender's
             return Player.Defender
 
-    def move_candidates(self) -> Iterable[CoordPair]:
-        """Generate valid move candidates for the next player."""
-        move = CoordPair()
-        for (src,_) in self.player_units(self.next_player):
-            move.src = src
-            for dst in src.iter_adjacent():
-                move.dst = dst
-                if self.is_valid_move(move):
-                    yield move.clone()
-            move.dst = src
-            yield move.clone()
+    def move_candidates(self) -> Iterable[int]:
+        """Generate the legal moves of the next player (without modifying the game).
+
+        Moves are ints src * cells + dst of the flat cell indices; move_pair() turns one into a CoordPair.
+        """
+        board = self.board
+        player = self.next_player.value
+        moves = board.masks.neighbours.moves
+        for src in iter_bits(board.players[player]):
+            src_moves = moves[src]
+            for dst in iter_bits(rules.legal_targets(board, player, src)):
+                yield src_moves[dst]
+            yield src_moves[src]
+
+    def move_pair(self, move: int | None) -> CoordPair | None:
+        """CoordPair of an int move (for display, the logger and the broker)."""
+        if move is None:
+            return None
+        return self.board.masks.neighbours.pair(move)
 
     def random_move(self) -> Tuple[int, CoordPair | None, float]:
         """Returns a random move."""
         move_candidates = list(self.move_candidates())
         random.shuffle(move_candidates)
         if len(move_candidates) > 0:
-            return (0, move_candidates[0], 1)
+            return (0, self.move_pair(move_candidates[0]), 1)
         else:
             return (0, None, 0)
 
     def suggest_move(self) -> CoordPair | None:
-        """Suggest the next move using minimax alpha beta. TODO: REPLACE RANDOM_MOVE WITH PROPER GAME LOGIC!!!"""
+        """Suggest the next move using iterative deepening minimax alpha beta."""
+        (move, record) = self.search_move()
+        for line in format_turn(record, self.stats):
+            print(line)
+        return self.move_pair(move)
+
+    def search_move(self, stop: threading.Event | None = None) -> Tuple[int | None, TurnRecord]:
+        """Search the next move without any console output; returns it with the turn's telemetry record.
+
+        Setting stop aborts the search (see algorithms.search); the root-parallel search does not support it.
+        """
+        import algorithms, parallel  # imported here: both depend on game
+        if self.telemetry is None:
+            self.telemetry = Telemetry(enabled=False)
+        ponderer = self.stop_pondering()
+        self.telemetry.begin_turn(self.stats)
         start_time = datetime.now()
-        (score, move, avg_depth) = self.random_move()
+        # searching done while the opponent was thinking that this turn reuses (none on a missed prediction)
+        (ponder, ponder_seconds) = ("", 0.0)
+        if ponderer is not None:
+            ponder = ponderer.outcome(self)
+            if ponder != "miss":
+                ponder_seconds = ponderer.seconds
+            self.stats.ponder_seconds += ponder_seconds
+        if self.options.book is not None:
+            from book import open_book
+            book = open_book(self.options.book)
+            found = None if book is None else book.probe(self)
+            if found is not None:
+                (move, score) = found
+                self.stats.iterations = []
+                elapsed_seconds = (datetime.now() - start_time).total_seconds()
+                self.stats.total_seconds += elapsed_seconds
+                return (move, self.telemetry.end_turn(self, move, score, 0.0, elapsed_seconds, book=True))
+        max_depth = self.options.max_depth
+        if (ponder == "hit" and ponderer.result is not None and ponderer.result[1] is not None
+                and max_depth is not None and ponderer.depth() >= max_depth):
+            # the background search already went as deep as this one would
+            (score, move, avg_depth) = ponderer.result
+            self.stats.iterations = ponderer.game.stats.iterations
+        elif self.options.workers > 1:
+            (score, move, avg_depth) = parallel.search(self)
+        else:
+            (score, move, avg_depth) = algorithms.search(self, stop=stop)
         elapsed_seconds = (datetime.now() - start_time).total_seconds()
         self.stats.total_seconds += elapsed_seconds
-        print(f"Heuristic score: {score}")
-        print(f"Average recursive depth: {avg_depth:0.1f}")
-        print(f"Evals per depth: ",end='')
-        for k in sorted(self.stats.evaluations_per_depth.keys()):
-            print(f"{k}:{self.stats.evaluations_per_depth[k]} ",end='')
-        print()
-        total_evals = sum(self.stats.evaluations_per_depth.values())
-        if self.stats.total_seconds > 0:
-            print(f"Eval perf.: {total_evals/self.stats.total_seconds/1000:0.1f}k/s")
-        print(f"Elapsed time: {elapsed_seconds:0.1f}s")
-        return move
+        record = self.telemetry.end_turn(self, move, score, avg_depth, elapsed_seconds, ponder=ponder,
+                                         ponder_seconds=ponder_seconds)
+        return (move, record)
 
-    def post_move_to_broker(self, move: CoordPair):
-        """Send a move to the game broker."""
+    def broker(self) -> BrokerClient | None:
+        """The game broker client (created on first use), if playing via a broker."""
         if self.options.broker is None:
+            return None
+        if self.broker_client is None:
+            from broker import BrokerClient
+            self.broker_client = BrokerClient(self.options.broker, long_poll=self.options.broker_long_poll,
+                                              dim=self.options.dim)
+        return self.broker_client
+
+    def post_move_to_broker(self, move: CoordPair):
+        """Queue a move for the game broker (it is posted in the background, while the game goes on)."""
+        broker = self.broker()
+        if broker is None:
             return
-        data = {
-            "from": {"row": move.src.row, "col": move.src.col},
-            "to": {"row": move.dst.row, "col": move.dst.col},
-            "turn": self.turns_played
-        }
-        try:
-            r = requests.post(self.options.broker, json=data)
-            if r.status_code == 200 and r.json()['success'] and r.json()['data'] == data:
-                # print(f"Sent move to broker: {move}")
-                pass
-            else:
-                print(f"Broker error: status code: {r.status_code}, response: {r.json()}")
-        except Exception as error:
-            print(f"Broker error: {error}")
+        broker.post_move_async(move, self.turns_played)
 
     def get_move_from_broker(self) -> CoordPair | None:
-        """Get a move from the game broker."""
-        if self.options.broker is None:
+        """Wait for the next move from the game broker."""
+        broker = self.broker()
+        if broker is None:
             return None
-        headers = {'Accept': 'application/json'}
-        try:
-            r = requests.get(self.options.broker, headers=headers)
-            if r.status_code == 200 and r.json()['success']:
-                data = r.json()['data']
-                if data is not None:
-                    if data['turn'] == self.turns_played+1:
-                        move = CoordPair(
-                            Coord(data['from']['row'],data['from']['col']),
-                            Coord(data['to']['row'],data['to']['col'])
-                        )
-                        print(f"Got move from broker: {move}")
-                        return move
-                    else:
-                        # print("Got broker data for wrong turn.")
-                        # print(f"Wanted {self.turns_played+1}, got {data['turn']}")
-                        pass
-                else:
-                    # print("Got no data from broker")
-                    pass
-            else:
-                print(f"Broker error: status code: {r.status_code}, response: {r.json()}")
-        except Exception as error:
-            print(f"Broker error: {error}")
-        return None
+        return broker.wait_for_move(self.turns_played+1)
@@ -0,0 +1,107 @@
+from __future__ import annotations
+import argparse
+import json
+import random
+import threading
+from time import perf_counter, sleep
+import requests
+from service import EngineService, percentiles
+
+# Load generator for the engine service (service.py): clients play whole games concurrently, each turn
+# being one suggest request that plays the suggested move. Refused requests (503) are retried after a
+# jittered backoff. Without --url, a local service is started in this process for the run.
+
+
+class Client:
+    """One simulated client: plays games one after the other over a keep-alive session."""
+
+    def __init__(self, url: str, options: dict, max_time: float | None, seed: int):
+        self.url = url.rstrip("/")
+        self.options = options
+        self.max_time = max_time
+        self.session = requests.Session()
+        self.rng = random.Random(seed)
+        # client-side latencies by kind of request, and counts of refused and failed requests
+        self.latencies : dict[str, list[float]] = {}
+        self.rejected = 0
+        self.errors : list[str] = []
+        self.turns = 0
+
+    def _request(self, kind: str, method: str, path: str, body: dict | None = None) -> dict | None:
+        """Data of a successful request (retrying while the service is busy), None if it failed."""
+        backoff = 0.05
+        while True:
+            start = perf_counter()
+            r = self.session.request(method, self.url + path, json=body, timeout=60)
+            self.latencies.setdefault(kind, []).append(perf_counter() - start)
+            if r.status_code == 503:
+                self.rejected += 1
+                sleep(backoff * (0.5 + self.rng.random()))
+                backoff = min(backoff * 2, 1.0)
+                continue
+            response = r.json()
+            if r.status_code != 200 or not response.get('success'):
+                self.errors.append(f"{kind}: {r.status_code} {response.get('error')}")
+                return None
+            return response['data']
+
+    def play(self, games: int):
+        for _ in range(games):
+            game = self._request("new", "POST", "/games", {"options": self.options})
+            if game is None:
+                continue
+            path = f"/games/{game['game']}"
+            while game is not None and game['winner'] is None:
+                game = self._request("suggest", "POST", path + "/suggest", {"max_time": self.max_time, "play": True})
+                self.turns += 1
+            self._request("end", "DELETE", path)
+        self.session.close()
+
+
+def run(url: str | None, clients: int, games: int, options: dict, max_time: float | None = None,
+        workers: int = 4, queue_size: int = 8) -> dict:
+    """Play clients x games games against the service at url (or a local one); returns the report."""
+    server = None
+    if url is None:
+        server = EngineService(workers=workers, queue_size=queue_size).start()
+        url = server.url
+    players = [Client(url, options, max_time, seed) for seed in range(clients)]
+    start = perf_counter()
+    threads = [threading.Thread(target=client.play, args=(games,)) for client in players]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = perf_counter() - start
+    service_stats = requests.get(url.rstrip("/") + "/stats", timeout=60).json()['data']
+    if server is not None:
+        server.stop()
+    kinds = sorted({kind for client in players for kind in client.latencies})
+    turns = sum(client.turns for client in players)
+    return {"clients": clients, "games": clients * games, "turns": turns, "seconds": seconds,
+            "turns_per_s": turns / seconds, "rejected": sum(client.rejected for client in players),
+            "errors": [error for client in players for error in client.errors],
+            "client_latency": {kind: percentiles(latency for client in players for latency in client.latencies.get(kind, []))
+                               for kind in kinds},
+            "service_latency": service_stats["latency"], "service_rejected": service_stats["rejected"],
+            "service_timeouts": service_stats["timeouts"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='loadgen', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--url', type=str, help='engine service to load (default: start a local one)')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients')
+    parser.add_argument('--games', type=int, default=2, help='games played by each client')
+    parser.add_argument('--max_depth', type=int, default=3, help='maximum search depth of the games')
+    parser.add_argument('--max_time', type=float, default=1.0, help='search time limit of each suggest request')
+    parser.add_argument('--max_turns', type=int, default=50, help='maximum number of turns of a game')
+    parser.add_argument('--workers', type=int, default=4, help='search worker processes of the local service')
+    parser.add_argument('--queue', type=int, default=8, help='search queue size of the local service')
+    args = parser.parse_args()
+    options = {"max_depth": args.max_depth, "max_turns": args.max_turns}
+    report = run(args.url, args.clients, args.games, options, args.max_time, args.workers, args.queue)
+    print(json.dumps(report, indent=1))
+
+
+if __name__ == '__main__':
+    main()
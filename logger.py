@@ -1,29 +1,189 @@
-from io import TextIOWrapper
-from coord import CoordPair
+from __future__ import annotations
+import asyncio
+import queue
+import threading
+from typing import Callable, TextIO
+from coord import Coord, CoordPair
 from player import Player
+from unit import UnitType
 from gameType import GameType
 
+# Trace lines are either strings or zero-argument callables rendered only when a sink actually writes
+# them (e.g. boards, from a copy of the position taken when the line was logged).
+Line = str | Callable[[], str]
+
+# unit label by BitBoard.units code (health is appended when rendered)
+UNIT_LABELS = [""] + [f"{Player(code // 5).name.lower()[0]}{UnitType(code % 5).name[0]}" for code in range(10)]
+
+
+def render_board(dim: int, units: bytes, health: bytes) -> str:
+    """Text board (as in Game.board_to_string) from BitBoard.units/health contents."""
+    output = "\n   "
+    for col in range(dim):
+        output += f"{Coord(0, col).col_string():^3} "
+    output += "\n"
+    for row in range(dim):
+        output += f"{Coord(row, 0).row_string()}: "
+        for index in range(row * dim, (row + 1) * dim):
+            code = units[index]
+            if code == 0:
+                output += " .  "
+            else:
+                output += f"{UNIT_LABELS[code] + str(health[index]):^3} "
+        output += "\n"
+    return output
+
+
+def _render(line: Line) -> str:
+    return line if isinstance(line, str) else line()
+
+
+class NullSink:
+    """Discards the trace (headless play, tools)."""
+    active = False
+
+    def write(self, line: Line):
+        pass
+
+    def flush(self):
+        pass
+
+    async def flush_async(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class BufferedFileSink:
+    """Collects lines in memory and writes them to path in one call per flush (the game flushes once per turn).
+
+    The file is only created by the first flush.
+    """
+    active = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lines : list[Line] = []
+        self._file : TextIO | None = None
+
+    def write(self, line: Line):
+        self._lines.append(line)
+
+    def flush(self):
+        if len(self._lines) == 0:
+            return
+        (lines, self._lines) = (self._lines, [])
+        self._write(lines)
+
+    async def flush_async(self):
+        """flush() for an asyncio event loop: the lines are rendered and written by a worker thread.
+
+        Flushes must not overlap (await one before starting the next).
+        """
+        if len(self._lines) == 0:
+            return
+        (lines, self._lines) = (self._lines, [])
+        await asyncio.to_thread(self._write, lines)
+
+    def _write(self, lines: list[Line]):
+        if self._file is None:
+            self._file = open(self.path, "w")
+        self._file.write("".join(_render(line) + "\n" for line in lines))
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ThreadedFileSink(BufferedFileSink):
+    """BufferedFileSink whose flushes (rendering included) are done by a background writer thread."""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._queue : queue.Queue[list[Line] | None] = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+        self._thread.start()
+
+    def flush(self):
+        if len(self._lines) == 0:
+            return
+        (lines, self._lines) = (self._lines, [])
+        self._queue.put(lines)
+
+    async def flush_async(self):
+        self.flush()
+
+    def _run(self):
+        while True:
+            lines = self._queue.get()
+            if lines is None:
+                break
+            self._write(lines)
+
+    def close(self):
+        if self._thread.is_alive():
+            self.flush()
+            self._queue.put(None)
+            self._thread.join()
+        super().close()
+
+
+SINKS = {"buffered": BufferedFileSink, "thread": ThreadedFileSink}
+
+def make_sink(mode: str, path: str) -> NullSink | BufferedFileSink:
+    """Trace sink for Options.trace: buffered|thread|null."""
+    if mode == "null":
+        return NullSink()
+    return SINKS[mode](path)
+
 
 class Logger:
-    output_file: TextIOWrapper
+    """Game trace. Starts with a NullSink: nothing is written (nor any file opened) until open() is called."""
+    sink: NullSink | BufferedFileSink
 
     def __init__(self, game):
         self.game = game
-        self.setup_output_file()
-        self.log_game_parameters()
+        self.sink = NullSink()
+        self.path = self.trace_path()
+
+    def __del__(self):
+        self.close()
+
+    def open(self, mode: str = "buffered", heuristics: tuple[str, str] | None = None):
+        """Start writing the trace with a sink of the given mode, beginning with the parameters and initial board.
+
+        heuristics are the attacker's and the defender's, when the sides play with different ones.
+        """
+        self.sink.close()
+        self.sink = make_sink(mode, self.path)
+        self.log_game_parameters(heuristics)
 
         self.log_nl()
         self.log_nl()
         self.log_nl("INITIAL CONFIGURATION")
-        self.log_nl(game.board_to_string())
+        self.log_board()
         self.log_nl()
-        
-    
-    def __del__(self):
-        self.output_file.close()
+        self.flush()
+
+    def flush(self):
+        self.sink.flush()
+
+    async def flush_async(self):
+        """flush() without blocking the event loop on rendering and file I/O (see BufferedFileSink.flush_async)."""
+        await self.sink.flush_async()
 
-    def log_game_parameters(self):
+    def close(self):
+        self.sink.close()
+        self.sink = NullSink()
+
+    def log_game_parameters(self, heuristics: tuple[str, str] | None = None):
         options = self.game.options
+        if heuristics is None:
+            heuristics = (options.heuristic, options.heuristic)
         is_alpha_beta = str(options.alpha_beta).lower()
         max_time = str(options.max_time)
         max_turns = str(options.max_turns)
@@ -32,38 +192,55 @@ class Logger:
         self.log_nl(f'Timeout Value: {max_time} seconds')
         if options.alpha_beta:
             self.log_nl(f' (alpha-beta={is_alpha_beta})')
-            
-        #TODO Real heuristic values
+
         if options.game_type == GameType.AttackerVsComp or options.game_type == GameType.AttackerVsDefender:
             self.log_nl("Player 1 is a Human")
         else:
-            heuristic = "e0"
-            self.log_nl(f'Player 1 is an AI with heuristic {heuristic}')
+            self.log_nl(f'Player 1 is an AI with heuristic {heuristics[0]}')
 
         if options.game_type == GameType.AttackerVsDefender or options.game_type == GameType.CompVsDefender:
             self.log_nl("Player 2 is a Human")
         else:
-            heuristic = "e0"
-            self.log_nl(f'Player 2 is an AI with heuristic {heuristic}')
+            self.log_nl(f'Player 2 is an AI with heuristic {heuristics[1]}')
 
-    def setup_output_file(self):
+    def trace_path(self) -> str:
         options = self.game.options
         is_alpha_beta = str(options.alpha_beta).lower()
         max_time = str(options.max_time)
         max_turns = str(options.max_turns)
-        
-        self.output_file = open(f'GameModuleTrace-{is_alpha_beta}-{max_time}-{max_turns}.txt', "w")
 
-    def log_nl(self, str: str = ""):
-        self.output_file.write(f'{str}\n')
+        return f'GameModuleTrace-{is_alpha_beta}-{max_time}-{max_turns}.txt'
+
+    def telemetry_path(self) -> str:
+        """Per-turn search telemetry (JSONL) goes next to the trace file."""
+        return self.path[:-len(".txt")] + ".telemetry.jsonl"
+
+    def log_nl(self, str: Line = ""):
+        self.sink.write(str)
+
+    def log_board(self):
+        """The current board, rendered only when the sink writes it."""
+        if not self.sink.active:
+            return
+        board = self.game.board
+        (dim, units, health) = (board.dim, bytes(board.units), bytes(board.health))
+        self.log_nl(lambda: render_board(dim, units, health))
 
     def log_action(self, move: CoordPair):
+        if not self.sink.active:
+            return
         self.log_nl()
         self.log_nl(f'Turn # {self.game.turns_played + 1}')
         self.log_nl(f'Current Player: {self.game.next_player}')
         self.log_nl(f'Moved from {move.src} to {move.dst}')
-        self.log_nl(self.game.board_to_string())
-    
+        self.log_board()
+
+    def log_search(self, lines: Callable[[], list[str]]):
+        """Search information of a computer turn (after its action); lines is only called if the sink is active."""
+        if not self.sink.active:
+            return
+        for line in lines():
+            self.log_nl(line)
+
     def write_winner(self):
         self.log_nl(f'{self.game.has_winner()} wins in {self.game.turns_played} turns')
-
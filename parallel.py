@@ -0,0 +1,195 @@
+from __future__ import annotations
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+from typing import Tuple
+from collections.abc import Callable
+from player import Player
+from game import Game, Options, Stats, IterationStats, MAX_HEURISTIC_SCORE, MIN_HEURISTIC_SCORE
+from transposition import TranspositionTable, MATE_MARGIN
+import algorithms
+
+# Root-split parallel search: every root move is searched in a worker process, starting from a compact
+# Game.to_state() copy of the position. Workers share the best root score found so far (always stored
+# from the root player's point of view, so larger is better) and use it as their alpha bound.
+
+# worker process globals (set by _init_worker / kept between tasks so the table survives across iterations)
+_shared_bound = None
+_worker_tt : TranspositionTable | None = None
+
+# executor and shared bound per worker count, created on first use
+_pools : dict[int, Tuple[ProcessPoolExecutor, object]] = {}
+
+
+def _pool(workers: int) -> Tuple[ProcessPoolExecutor, object]:
+    """Get (and start on first use) the process pool for a worker count, with its shared bound."""
+    pool = _pools.get(workers)
+    if pool is None:
+        shared_bound = multiprocessing.Value('q', MIN_HEURISTIC_SCORE)
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shared_bound,))
+        pool = (executor, shared_bound)
+        _pools[workers] = pool
+    return pool
+
+
+def _init_worker(shared_bound):
+    global _shared_bound
+    _shared_bound = shared_bound
+
+
+def _raise_bound(shared_bound, value: int):
+    """Raise the shared best root score if value is better."""
+    with shared_bound.get_lock():
+        if value > shared_bound.value:
+            shared_bound.value = value
+
+
+def _search_root_move(state: tuple, options: Options, move: int, depth: int, deadline: float | None,
+                      e: Callable[[Game], int]) -> Tuple[int | None, bool, dict]:
+    """Worker task: search one root move to depth.
+
+    Returns (score or None if the deadline passed, whether the score is exact rather than a fail-low
+    bound, stats counters to merge).
+    """
+    global _worker_tt
+    game = Game.from_state(state, options)
+    if options.check_features:
+        e = algorithms.checked_heuristic(e)
+    stats = game.stats
+    if _worker_tt is None or _worker_tt.size != options.tt_size:
+        _worker_tt = TranspositionTable(options.tt_size, stats)
+    else:
+        _worker_tt.stats = stats
+    local_deadline = None if deadline is None else perf_counter() + (deadline - time.time())
+    ctx = algorithms.SearchContext(e, stats, _worker_tt, local_deadline, algorithms.batch_evaluator(options),
+                                   options.telemetry, tablebase=algorithms.endgame_tablebase(options))
+    if local_deadline is not None and perf_counter() > local_deadline:
+        return (None, False, _counters(stats, ctx))
+
+    is_max = game.next_player == Player.Attacker
+    bound = _shared_bound.value
+    if is_max:
+        (alpha, beta) = (bound, MAX_HEURISTIC_SCORE)
+    else:
+        (alpha, beta) = (MIN_HEURISTIC_SCORE, -bound)
+    game.make_move(move)
+    try:
+        (score, _) = algorithms.minimax(game, not is_max, 1, depth, ctx, alpha, beta)
+    except algorithms.SearchTimeout:
+        return (None, False, _counters(stats, ctx))
+    oriented = score if is_max else -score
+    exact = bound == MIN_HEURISTIC_SCORE or oriented > bound
+    if exact:
+        _raise_bound(_shared_bound, oriented)
+    return (score, exact, _counters(stats, ctx))
+
+
+def _counters(stats: Stats, ctx: algorithms.SearchContext) -> dict:
+    """Picklable summary of a worker's stats for merging."""
+    return {
+        "nodes": ctx.nodes,
+        "evals": ctx.evals,
+        "eval_depth_sum": ctx.eval_depth_sum,
+        "evaluations_per_depth": stats.evaluations_per_depth,
+        "tt_probes": stats.tt_probes,
+        "tt_hits": stats.tt_hits,
+        "tt_stores": stats.tt_stores,
+        "tt_collisions": stats.tt_collisions,
+        "cutoffs": stats.cutoffs,
+        "first_move_cutoffs": stats.first_move_cutoffs,
+        "tablebase_hits": stats.tablebase_hits,
+        "movegen_seconds": ctx.movegen_seconds,
+        "eval_seconds": ctx.eval_seconds,
+    }
+
+
+def _merge(stats: Stats, counters: dict):
+    """Add a worker's counters to the game stats."""
+    for depth, count in counters["evaluations_per_depth"].items():
+        stats.evaluations_per_depth[depth] = stats.evaluations_per_depth.get(depth, 0) + count
+    stats.nodes += counters["nodes"]
+    stats.tt_probes += counters["tt_probes"]
+    stats.tt_hits += counters["tt_hits"]
+    stats.tt_stores += counters["tt_stores"]
+    stats.tt_collisions += counters["tt_collisions"]
+    stats.cutoffs += counters["cutoffs"]
+    stats.first_move_cutoffs += counters["first_move_cutoffs"]
+    stats.tablebase_hits += counters["tablebase_hits"]
+    stats.movegen_seconds += counters["movegen_seconds"]
+    stats.eval_seconds += counters["eval_seconds"]
+
+
+def search(game: Game, e: Callable[[Game], int] | None = None) -> Tuple[int, int | None, float]:
+    """Iterative deepening with each iteration's root moves split across options.workers processes.
+
+    Same contract as algorithms.search: min_depth always completes, an iteration cut by the
+    deadline is discarded, and (score, move, average leaf depth) of the deepest completed
+    iteration is returned.
+    """
+    options = game.options
+    stats = game.stats
+    if options.max_nodes is not None:
+        # the workers count their nodes separately: there is no shared budget to stop them at
+        raise ValueError("max_nodes is not supported by the root-parallel search (workers > 1)")
+    if e is None:
+        e = algorithms.HEURISTICS[options.heuristic]
+    (executor, shared_bound) = _pool(options.workers)
+    deadline = None if options.max_time is None else time.time() + options.max_time * algorithms.TIME_MARGIN
+    min_depth = options.min_depth if options.min_depth is not None else 1
+    max_depth = options.max_depth if options.max_depth is not None else algorithms.MAX_SEARCH_DEPTH
+    is_max = game.next_player == Player.Attacker
+    state = game.to_state()
+
+    stats.iterations = []
+    moves = list(game.move_candidates())
+    if options.randomize_moves:
+        game.rng.shuffle(moves)
+    if len(moves) == 0:
+        return (0, None, 0.0)
+    (best_score, best_move) = (0, moves[0])
+    (evals, eval_depth_sum) = (0, 0)
+    for depth in range(1, max_depth + 1):
+        iteration_start = perf_counter()
+        shared_bound.value = MIN_HEURISTIC_SCORE
+        iteration_deadline = deadline if depth > min_depth else None
+        futures = {executor.submit(_search_root_move, state, options, move, depth, iteration_deadline, e): move
+                   for move in moves}
+        scores : dict[int, int] = {}
+        (nodes, completed) = (0, True)
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            (score, exact, counters) = future.result()
+            _merge(stats, counters)
+            nodes += counters["nodes"]
+            evals += counters["evals"]
+            eval_depth_sum += counters["eval_depth_sum"]
+            if score is None:
+                completed = False
+                for pending in futures:
+                    pending.cancel()
+            elif exact:
+                scores[futures[future]] = score
+                _raise_bound(shared_bound, score if is_max else -score)
+        stats.iterations.append(IterationStats(depth, nodes, perf_counter() - iteration_start, completed))
+        if not completed:
+            break
+
+        # best exact score, ties going to the earlier (previous best first) move
+        iteration_best = None
+        for move in moves:
+            score = scores.get(move)
+            if score is None:
+                continue
+            if iteration_best is None or (score > iteration_best[0] if is_max else score < iteration_best[0]):
+                iteration_best = (score, move)
+        (best_score, best_move) = iteration_best
+        moves = [best_move] + [move for move in moves if move != best_move]
+        if abs(best_score) >= MAX_HEURISTIC_SCORE - MATE_MARGIN:
+            break
+        if deadline is not None and time.time() >= deadline:
+            break
+
+    avg_depth = eval_depth_sum / evals if evals > 0 else 0.0
+    return (best_score, best_move, avg_depth)
@@ -0,0 +1,61 @@
+from __future__ import annotations
+import dataclasses
+import threading
+from time import perf_counter
+from typing import Tuple
+from game import Game, Stats
+from transposition import TranspositionTable
+import algorithms
+
+# Pondering: after the engine has moved, a background thread keeps searching while the opponent (a human at
+# the keyboard or a remote player through the broker) is thinking. The main thread is then blocked on I/O,
+# so the search gets the CPU. It searches the position after the predicted reply (the transposition table
+# move of the current position) if there is one, otherwise the current position itself, which covers every
+# reply. Either way the results go to the game's transposition table, which the next search starts from.
+
+
+class Ponderer:
+    """One background search, started on the opponent's turn and stopped when the engine has to move."""
+
+    def __init__(self, game: Game):
+        if game.transposition_table is None:
+            game.transposition_table = TranspositionTable(game.options.tt_size, game.stats)
+        ponder_game = game.clone()
+        ponder_game.stats = Stats()
+        # search until stopped (deterministically: the game's random generator stays with the main thread)
+        ponder_game.options = dataclasses.replace(game.options, max_time=None, max_depth=None, min_depth=None,
+                                                  randomize_moves=False)
+        entry = game.transposition_table.probe(game.hash_key())
+        self.predicted : int | None = None
+        if entry is not None and entry[4] is not None and ponder_game.make_move(entry[4]):
+            self.predicted = entry[4]
+            ponder_game._undo.clear()
+        self.game = ponder_game
+        self.key = ponder_game.hash_key()
+        self.result : Tuple[int, int | None, float] | None = None
+        self.seconds = 0.0
+        self._stop = threading.Event()
+        self._start = perf_counter()
+        self._thread = threading.Thread(target=self._run, name="ponder", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        self.result = algorithms.search(self.game, stop=self._stop)
+
+    def stop(self):
+        """Abort the search and wait for the thread (the search unwinds to its root and returns its best move)."""
+        self._stop.set()
+        self._thread.join()
+        self.seconds = perf_counter() - self._start
+
+    def depth(self) -> int:
+        """Depth of the deepest iteration the background search completed."""
+        completed = [iteration.depth for iteration in self.game.stats.iterations if iteration.completed]
+        return completed[-1] if len(completed) > 0 else 0
+
+    def outcome(self, game: Game) -> str:
+        """How the pondering relates to the position game is now in: "hit" (the predicted reply was played),
+        "miss" (another one was) or "all" (every reply was searched)."""
+        if self.predicted is None:
+            return "all"
+        return "hit" if self.key == game.hash_key() else "miss"
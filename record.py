@@ -0,0 +1,210 @@
+from __future__ import annotations
+import argparse
+import dataclasses
+import json
+import struct
+from array import array
+from collections import Counter
+from time import perf_counter
+from typing import Iterable, Iterator, Sequence
+from bitboard import BitBoard
+from game import Game, Options, PLAYERS, UNIT_CODE_ATTACKER_AI, UNIT_CODE_DEFENDER_AI
+from gameType import GameType
+
+# Binary game record: a header (with each side's Options as JSON), then blocks of one position snapshot
+# followed by the moves of the next `interval` turns. Every block but the last has the same size, so the
+# position at any turn is one snapshot read plus fewer than `interval` moves replayed.
+#
+# A snapshot is the turn number then one byte per cell, unit code (BitBoard.units) << 4 | health; the side
+# to move and the AI flags follow from it. A move is Game.move_candidates' src * cells + dst as uint16.
+
+# header: magic, board dimension, snapshot interval, length of the options JSON that follows (a list of the
+# attacker's and the defender's Options)
+HEADER = struct.Struct("<8sHHI")
+MAGIC = b"AIWREC02"
+SNAPSHOT_TURN = struct.Struct("<H")
+MOVE = struct.Struct("<H")
+DEFAULT_INTERVAL = 16
+# largest board whose moves fit in MOVE (src * cells + dst < 2**16)
+MAX_DIM = 16
+
+
+def options_to_json(side_options: Sequence[Options]) -> bytes:
+    sides = []
+    for options in side_options:
+        fields = dataclasses.asdict(options)
+        fields["game_type"] = options.game_type.name
+        sides.append(fields)
+    return json.dumps(sides, separators=(",", ":")).encode()
+
+def options_from_json(data: bytes) -> tuple[Options, Options]:
+    """The attacker's and the defender's Options of a record (fields this version does not know are dropped)."""
+    known = {field.name for field in dataclasses.fields(Options)}
+    sides = []
+    for fields in json.loads(data):
+        fields["game_type"] = GameType[fields["game_type"]]
+        sides.append(Options(**{name: value for (name, value) in fields.items() if name in known}))
+    return (sides[0], sides[1])
+
+
+def snapshot_of(game: Game, turn: int) -> bytes:
+    board = game.board
+    return SNAPSHOT_TURN.pack(turn) + bytes(code << 4 | health for (code, health) in zip(board.units, board.health))
+
+
+class RecordWriter:
+    """Appends the moves of a game being played to a record file (see Game.perform_move).
+
+    side_options are the attacker's and the defender's Options when the sides play with different engines
+    (default: game.options for both).
+    """
+
+    def __init__(self, path: str, game: Game, interval: int = DEFAULT_INTERVAL,
+                 side_options: Sequence[Options] | None = None):
+        dim = game.board.dim
+        if dim > MAX_DIM:
+            raise ValueError(f"records support boards up to {MAX_DIM}x{MAX_DIM}, not {dim}x{dim}")
+        self.path = path
+        self.interval = interval
+        self.turn = game.turns_played
+        self._moves = 0
+        options = options_to_json(side_options if side_options is not None else (game.options, game.options))
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, dim, interval, len(options)) + options)
+        self._file.write(snapshot_of(game, self.turn))
+
+    def append(self, game: Game, move: int):
+        """Record a move; game is the position after it."""
+        self._file.write(MOVE.pack(move))
+        self.turn += 1
+        self._moves += 1
+        if self._moves % self.interval == 0:
+            self._file.write(snapshot_of(game, self.turn))
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class GameRecord:
+    """A parsed record: options, every move and the snapshots, with random access to the positions."""
+
+    def __init__(self, data: bytes, path: str | None = None):
+        self.path = path
+        (magic, self.dim, self.interval, options_size) = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a game record")
+        start = HEADER.size + options_size
+        self.side_options = options_from_json(data[HEADER.size:start])
+        # the game's options (the attacker's, if the sides differ)
+        self.options = self.side_options[0]
+        cells = self.dim * self.dim
+        snapshot_size = SNAPSHOT_TURN.size + cells
+        block_size = snapshot_size + self.interval * MOVE.size
+        # snapshots[i] is the position after interval * i moves
+        self.snapshots : list[bytes] = []
+        self.moves = array("H")
+        for offset in range(start, len(data), block_size):
+            self.snapshots.append(data[offset:offset + snapshot_size])
+            self.moves.frombytes(data[offset + snapshot_size:offset + block_size])
+        self.first_turn = SNAPSHOT_TURN.unpack_from(self.snapshots[0])[0]
+
+    @property
+    def turns(self) -> int:
+        """Number of moves in the record."""
+        return len(self.moves)
+
+    def position(self, move_count: int) -> Game:
+        """The game after the first move_count moves of the record (a searchable game, without trace)."""
+        if not 0 <= move_count <= len(self.moves):
+            raise IndexError(f"record has {len(self.moves)} moves")
+        block = move_count // self.interval
+        game = self._restore(self.snapshots[block])
+        for move in self.moves[block * self.interval:move_count]:
+            game.make_move(move)
+        game._undo.clear()
+        return game
+
+    def positions(self) -> Iterator[Game]:
+        """The start position then the position after every move, as one game played forward in place."""
+        game = self._restore(self.snapshots[0])
+        yield game
+        for move in self.moves:
+            game.make_move(move)
+            game._undo.clear()
+            yield game
+
+    def winner(self):
+        """Winner of the final position (None if the record ends before the game does)."""
+        return self.position(len(self.moves)).has_winner()
+
+    def _restore(self, snapshot: bytes) -> Game:
+        options = dataclasses.replace(self.options, trace="null", telemetry=False, record=None)
+        game = Game(options=options)
+        board = BitBoard(self.dim)
+        for (index, cell) in enumerate(snapshot[SNAPSHOT_TURN.size:]):
+            if cell != 0:
+                code = cell >> 4
+                board.place(index, (code - 1) // 5, (code - 1) % 5, cell & 15)
+        game.board = board
+        game.turns_played = SNAPSHOT_TURN.unpack_from(snapshot)[0]
+        game.next_player = PLAYERS[game.turns_played % 2]
+        game._attacker_has_ai = UNIT_CODE_ATTACKER_AI in board.units
+        game._defender_has_ai = UNIT_CODE_DEFENDER_AI in board.units
+        return game
+
+
+def load_record(path: str) -> GameRecord:
+    with open(path, "rb") as record_file:
+        return GameRecord(record_file.read(), path)
+
+def load_records(paths: Iterable[str]) -> list[GameRecord]:
+    """Parse many records (one read per file, moves decoded in bulk)."""
+    return [load_record(path) for path in paths]
+
+
+def write_trace(record: GameRecord, path: str):
+    """Render the text trace (as Logger writes it, without the search lines) of a record."""
+    game = record.position(0)
+    game.options = dataclasses.replace(game.options, trace="buffered")
+    game.logger.path = path
+    game.logger.open("buffered", heuristics=tuple(options.heuristic for options in record.side_options))
+    for move in record.moves:
+        game.perform_move(game.move_pair(move))
+        game.next_turn()
+        game.logger.flush()
+    if game.has_winner() is not None:
+        game.logger.write_winner()
+    game.logger.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='record', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    trace_parser = subparsers.add_parser('trace', help='render the text trace of a record')
+    trace_parser.add_argument('path', type=str, help='record file')
+    trace_parser.add_argument('--output', type=str, help='trace file (default: the record path with .txt)')
+    stats_parser = subparsers.add_parser('stats', help='load records in bulk and summarize them')
+    stats_parser.add_argument('paths', type=str, nargs='+', help='record files')
+    args = parser.parse_args()
+
+    if args.command == 'trace':
+        output = args.output if args.output is not None else args.path.rsplit(".", 1)[0] + ".txt"
+        write_trace(load_record(args.path), output)
+        print(f"Wrote {output}")
+    else:
+        start = perf_counter()
+        records = load_records(args.paths)
+        seconds = perf_counter() - start
+        turns = sum(record.turns for record in records)
+        print(f"Loaded {len(records)} records ({turns} moves) in {seconds:0.2f}s")
+        winners = Counter(str(record.winner()) for record in records)
+        for (winner, count) in winners.most_common():
+            print(f"{winner}: {count}")
+
+
+if __name__ == '__main__':
+    main()
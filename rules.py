@@ -0,0 +1,103 @@
+from __future__ import annotations
+from bitboard import BitBoard
+from unit import Unit, UnitType
+
+# The rules table shared by Game.perform_move (to validate and explain) and move generation (to enumerate).
+# All entries are indexed by UnitType value.
+
+# AI, Firewall and Program only move towards the opponent (attacker: up/left, defender: down/right)
+# and cannot move while engaged; Tech and Virus move freely
+RESTRICTED_TYPES = (True, False, False, True, True)
+# REPAIRS[src][target]: can a src unit repair a friendly target unit (from Unit.repair_table)
+REPAIRS = tuple(tuple(amount > 0 for amount in row) for row in Unit.repair_table)
+# CAN_REPAIR[src]: can this unit type repair anything at all
+CAN_REPAIR = tuple(any(row) for row in REPAIRS)
+# REPAIRABLE_TYPES[src]: UnitType values a src unit can repair
+REPAIRABLE_TYPES = tuple(tuple(target for target, ok in enumerate(row) if ok) for row in REPAIRS)
+
+
+def _outcomes(src_type: int, dst_type: int, friends: bool) -> tuple[tuple[int, int], ...]:
+    """(src, dst) healths after a src unit repairs (friends) or attacks a dst unit, for every health pair."""
+    outcomes = []
+    for src_health in range(10):
+        for dst_health in range(10):
+            src = Unit(type=UnitType(src_type), health=src_health)
+            dst = Unit(type=UnitType(dst_type), health=dst_health)
+            if friends:
+                outcomes.append((src_health, dst_health + src.repair_amount(dst)))
+            else:
+                outcomes.append((src_health - dst.damage_amount(src), dst_health - src.damage_amount(dst)))
+    return tuple(outcomes)
+
+_REPAIR_OUTCOMES = [[_outcomes(src, dst, True) for dst in range(5)] for src in range(5)]
+_ATTACK_OUTCOMES = [[_outcomes(src, dst, False) for dst in range(5)] for src in range(5)]
+# OUTCOMES[src][dst][src health * 10 + dst health]: the (src, dst) healths after an attack or repair, indexed
+# by BitBoard.units codes (player * 5 + type + 1), so the search resolves an action with a single lookup
+OUTCOMES = tuple(tuple(((_REPAIR_OUTCOMES if (src - 1) // 5 == (dst - 1) // 5 else _ATTACK_OUTCOMES)
+                        [(src - 1) % 5][(dst - 1) % 5] if src and dst else ()) for dst in range(11))
+                 for src in range(11))
+# SELF_DESTRUCT_HEALTH[health]: health of a unit caught in a self-destruct
+SELF_DESTRUCT_HEALTH = tuple(max(health - 2, 0) for health in range(10))
+
+
+def action_error(board: BitBoard, player: int, src: int, dst: int) -> str | None:
+    """Why the action from cell src to cell dst is illegal for player, or None if it is legal.
+
+    The caller has already checked that src holds one of player's units and that dst is src
+    or one of its adjacent cells (see Game.is_valid_move).
+    """
+    if src == dst:
+        # self-destruct is always possible
+        return None
+    utype = board.type_at(src)
+    if board.units[dst] == 0:
+        if RESTRICTED_TYPES[utype]:
+            if board.is_engaged(src, player):
+                return "This unit cannot move while engaged"
+            if not board.masks.forward[player][src] & (1 << dst):
+                if player == 0:
+                    return "This unit can't move right" if dst == src + 1 else "This unit can't move down"
+                return "This unit can't move left" if dst == src - 1 else "This unit can't move up"
+        return None
+    if board.players[player] & (1 << dst):
+        if not CAN_REPAIR[utype]:
+            return f"Invalid move! {UnitType(utype).name} can not repair"
+        if board.health[dst] == 9:
+            return "Invalid move! Can not be repaired when health is full"
+        target_type = board.type_at(dst)
+        if not REPAIRS[utype][target_type]:
+            return f"Invalid move! {UnitType(target_type).name} can not be repaired by {UnitType(utype)}"
+        return None
+    # attacks on adjacent opponent units are always possible
+    return None
+
+
+def legal_targets(board: BitBoard, player: int, src: int) -> int:
+    """Mask of the adjacent cells the unit of player at src can legally act on (self-destruct not included)."""
+    masks = board.masks
+    adjacent = masks.adjacent[src]
+    opponent = board.players[1 - player]
+    friends = board.players[player]
+    utype = board.type_at(src)
+
+    # attacks
+    targets = adjacent & opponent
+    # moves
+    empty = adjacent & ~(opponent | friends)
+    if RESTRICTED_TYPES[utype]:
+        if not targets:
+            targets |= empty & masks.forward[player][src]
+    else:
+        targets |= empty
+    # repairs
+    if CAN_REPAIR[utype]:
+        repairable = 0
+        for target_type in REPAIRABLE_TYPES[utype]:
+            repairable |= board.types[target_type]
+        candidates = adjacent & friends & repairable
+        while candidates:
+            low = candidates & -candidates
+            if board.health[low.bit_length() - 1] < 9:
+                targets |= low
+            candidates ^= low
+    return targets
@@ -0,0 +1,214 @@
+from __future__ import annotations
+import argparse
+import random
+from game import Game, Options
+from coord import Coord, CoordPair
+from player import Player
+
+# Damage and repair tables of the original Unit rules, indexed [source type][target type] in the UnitType order
+# AI, Tech, Virus, Program, Firewall.
+DAMAGE_TABLE = [
+    [3,3,3,3,1], # AI
+    [1,1,6,1,1], # Tech
+    [9,6,1,6,1], # Virus
+    [3,3,3,3,1], # Program
+    [1,1,1,1,1], # Firewall
+]
+REPAIR_TABLE = [
+    [0,1,1,0,0], # AI
+    [3,0,0,3,3], # Tech
+    [0,0,0,0,0], # Virus
+    [0,0,0,0,0], # Program
+    [0,0,0,0,0], # Firewall
+]
+AI, TECH, VIRUS, PROGRAM, FIREWALL = range(5)
+
+
+class ReferencePosition:
+    """Plain reimplementation of the game rules, written after the original Coord/Unit code: units are
+    [player, type, health] lists in a dict keyed by (row, col). It shares nothing with the bitboards, the move
+    generator or Game._execute_move, so the checks below catch a regression in any of them."""
+
+    def __init__(self, dim: int, cells: dict[tuple[int, int], list], next_player: Player, turns_played: int,
+                 max_turns: int | None, attacker_has_ai: bool = True, defender_has_ai: bool = True):
+        self.dim = dim
+        self.cells = cells
+        self.next_player = next_player
+        self.turns_played = turns_played
+        self.max_turns = max_turns
+        self.attacker_has_ai = attacker_has_ai
+        self.defender_has_ai = defender_has_ai
+
+    @classmethod
+    def from_game(cls, game: Game) -> ReferencePosition:
+        cells = {}
+        for row in range(game.options.dim):
+            for col in range(game.options.dim):
+                unit = game.get(Coord(row, col))
+                if unit is not None:
+                    cells[(row, col)] = [unit.player, unit.type.value, unit.health]
+        return cls(game.options.dim, cells, game.next_player, game.turns_played, game.options.max_turns,
+                   game._attacker_has_ai, game._defender_has_ai)
+
+    def copy(self) -> ReferencePosition:
+        return ReferencePosition(self.dim, {cell: list(unit) for (cell, unit) in self.cells.items()}, self.next_player,
+                                 self.turns_played, self.max_turns, self.attacker_has_ai, self.defender_has_ai)
+
+    def state(self) -> tuple:
+        """Comparable copy of the position."""
+        return (tuple(sorted((cell, tuple(unit)) for (cell, unit) in self.cells.items())), self.attacker_has_ai,
+                self.defender_has_ai, self.next_player, self.turns_played)
+
+    def winner(self) -> Player | None:
+        if self.max_turns is not None and self.turns_played >= self.max_turns:
+            return Player.Defender
+        if not self.attacker_has_ai:
+            return Player.Defender
+        if not self.defender_has_ai:
+            return Player.Attacker
+        return None
+
+    def moves(self) -> list[tuple[tuple[int, int], tuple[int, int]]]:
+        """Every move of the next player's units to their own cell or an adjacent one (legal or not)."""
+        moves = []
+        for ((row, col), unit) in sorted(self.cells.items()):
+            if unit[0] != self.next_player:
+                continue
+            for dst in [(row, col), (row - 1, col), (row, col - 1), (row + 1, col), (row, col + 1)]:
+                if 0 <= dst[0] < self.dim and 0 <= dst[1] < self.dim:
+                    moves.append(((row, col), dst))
+        return moves
+
+    def _damage(self, cell: tuple[int, int], amount: int):
+        unit = self.cells[cell]
+        unit[2] = max(0, unit[2] - amount)
+        if unit[2] == 0:
+            del self.cells[cell]
+            if unit[1] == AI:
+                if unit[0] == Player.Attacker:
+                    self.attacker_has_ai = False
+                else:
+                    self.defender_has_ai = False
+
+    def play(self, src: tuple[int, int], dst: tuple[int, int]) -> bool:
+        """Apply one of moves() and pass the turn if it is legal; False (position untouched) otherwise."""
+        unit = self.cells[src]
+        target = self.cells.get(dst)
+        if target is None:
+            # move: AI, Firewall and Program cannot leave an engaged cell, nor move away from the enemy side
+            if unit[1] in (AI, FIREWALL, PROGRAM):
+                (row, col) = src
+                for cell in [(row - 1, col), (row, col - 1), (row + 1, col), (row, col + 1)]:
+                    if cell in self.cells and self.cells[cell][0] != unit[0]:
+                        return False
+                forward = (-1, 0, 0, -1) if unit[0] == Player.Attacker else (1, 0, 0, 1)
+                if (dst[0] - row, dst[1] - col) not in ((forward[0], forward[1]), (forward[2], forward[3])):
+                    return False
+            self.cells[dst] = self.cells.pop(src)
+        elif src == dst:
+            # self-destruct: 2 damage to every unit of the surrounding 3x3 area, friend or foe
+            self._damage(src, unit[2])
+            for row in range(src[0] - 1, src[0] + 2):
+                for col in range(src[1] - 1, src[1] + 2):
+                    if (row, col) in self.cells:
+                        self._damage((row, col), 2)
+        elif target[0] == unit[0]:
+            # repair: AI repairs Virus and Tech, Tech repairs AI, Firewall and Program
+            if target[2] == 9 or REPAIR_TABLE[unit[1]][target[1]] == 0:
+                return False
+            target[2] = min(9, target[2] + REPAIR_TABLE[unit[1]][target[1]])
+        else:
+            # attack: both units damage each other at once
+            to_target = min(DAMAGE_TABLE[unit[1]][target[1]], target[2])
+            to_source = min(DAMAGE_TABLE[target[1]][unit[1]], unit[2])
+            self._damage(dst, to_target)
+            self._damage(src, to_source)
+        self.next_player = self.next_player.next()
+        self.turns_played += 1
+        return True
+
+
+def reference_perft(position: ReferencePosition, depth: int) -> int:
+    """perft of a ReferencePosition (finished games count as leaves)."""
+    if depth == 0 or position.winner() is not None:
+        return 1
+    total = 0
+    for (src, dst) in position.moves():
+        child = position.copy()
+        if child.play(src, dst):
+            total += reference_perft(child, depth - 1)
+    return total
+
+
+def check_make_unmake(games: int = 100, seed: int = 0, dim: int = 5) -> int:
+    """Randomized property check: for every position reached in random playouts and every move of an own unit
+    to itself or an adjacent cell, move_candidates yields exactly the moves the ReferencePosition accepts,
+    make_move reaches the same position and winner as the reference, the incremental Zobrist hash and
+    evaluation features match a full recompute and unmake_move restores the position bit-for-bit.
+
+    Returns the number of (position, move) pairs checked; raises AssertionError on the first mismatch.
+    """
+    rng = random.Random(seed)
+    checked = 0
+    for _ in range(games):
+        game = Game(options=Options(dim=dim))
+        while game.has_winner() is None:
+            before = game.snapshot()
+            position = ReferencePosition.from_game(game)
+            legal = []
+            candidates = set(game.move_candidates())
+            for (src, dst) in position.moves():
+                move = CoordPair(Coord(*src), Coord(*dst))
+                key = game.board.masks.neighbours.move(move)
+                reference = position.copy()
+                success = reference.play(src, dst)
+                assert (key in candidates) == success, f"move_candidates disagrees with the reference rules on {move}"
+                assert game.make_move(key) == success, f"legality mismatch for {move}"
+                if success:
+                    assert ReferencePosition.from_game(game).state() == reference.state(), \
+                        f"make_move differs from the reference rules for {move}"
+                    assert game.has_winner() == reference.winner(), f"wrong winner after {move}"
+                    assert game.board.hash == game.board.compute_hash(), f"incremental hash is wrong after {move}"
+                    assert game.board.features == game.board.compute_features(), f"incremental features are wrong after {move}"
+                    game.unmake_move()
+                    legal.append(key)
+                assert game.snapshot() == before, f"unmake_move did not restore the position after {move}"
+                checked += 1
+            assert len(candidates) == len(legal), "move_candidates yields moves the reference rules do not allow"
+            if len(legal) == 0:
+                break
+            game.make_move(rng.choice(legal))
+    return checked
+
+
+def check_perft(depth: int = 4) -> int:
+    """Check the EXPECTED_PERFT counts of the benchmark's reference positions against reference_perft.
+
+    Returns the number of counts checked; raises AssertionError on the first mismatch.
+    """
+    from benchmark import EXPECTED_PERFT, reference_position
+    checked = 0
+    for (name, counts) in EXPECTED_PERFT.items():
+        position = ReferencePosition.from_game(reference_position(name))
+        for d in range(min(depth + 1, len(counts))):
+            leaves = reference_perft(position, d)
+            assert leaves == counts[d], f"perft({name}, {d}) = {counts[d]} expected, the reference rules give {leaves}"
+            checked += 1
+    return checked
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='selfcheck', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--games', type=int, default=100, help='number of random playouts')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--dim', type=int, default=5, help='board dimension')
+    parser.add_argument('--perft_depth', type=int, default=4, help='deepest EXPECTED_PERFT count checked')
+    args = parser.parse_args()
+    checked = check_make_unmake(args.games, args.seed, args.dim)
+    print(f"make/unmake: {checked} moves checked, OK")
+    checked = check_perft(args.perft_depth)
+    print(f"perft: {checked} counts checked, OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,413 @@
+from __future__ import annotations
+import argparse
+import dataclasses
+import itertools
+import json
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic, perf_counter
+from typing import Iterable
+from broker import move_from_data, move_to_data
+from game import Game, Options, OPTION_TYPES, option_value
+from gameType import GameType
+from telemetry import TurnRecord
+import algorithms
+
+# Engine service: many games hosted by one process, played over a local HTTP API instead of one
+# `python __main__.py` process per game. Searches go to a bounded process pool (positions are shipped as
+# Game.to_state(), as in book.py); when every worker is busy and the queue is full, requests are refused
+# with 503 and Retry-After rather than queued without bound. Responses use the broker's envelope
+# {"success": bool, "data": ..., "error": ...} and its move format (see broker.py).
+#
+#   POST   /games                 {"options": {...}}              new game (Options overrides)
+#   GET    /games/<id>                                            position and winner
+#   POST   /games/<id>/moves      {"from": ..., "to": ...}        play a move
+#   POST   /games/<id>/suggest    {"max_time": s, "play": bool}   search the position (and play the move)
+#   DELETE /games/<id>                                            end the session
+#   GET    /stats                                                 latency percentiles, per session and overall
+
+# Options a session may not override (they belong to the service)
+SERVICE_OPTIONS = ("game_type", "dim", "tt_size", "book", "tablebase", "broker", "broker_long_poll", "ponder", "trace",
+                   "record", "telemetry", "workers")
+# latency samples kept per kind of request, per session and overall
+LATENCY_WINDOW = 4096
+# seconds a search may overrun its max_time (pickling, process start-up) before the request times out
+TIME_MARGIN = 1.0
+# deepest search a session may ask for by default
+MAX_DEPTH = 8
+
+
+def percentiles(samples: Iterable[float]) -> dict:
+    """Count, median, 90th and 99th percentile and maximum of latencies in seconds, reported in ms."""
+    ordered = sorted(samples)
+    if len(ordered) == 0:
+        return {"count": 0}
+    def rank(fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+    return {"count": len(ordered), "p50_ms": rank(0.5), "p90_ms": rank(0.9), "p99_ms": rank(0.99),
+            "max_ms": ordered[-1] * 1000}
+
+
+class Latencies:
+    """Recent request latencies by kind of request ("new", "move", "suggest", ...)."""
+
+    def __init__(self):
+        self._samples : dict[str, deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, seconds: float):
+        with self._lock:
+            if kind not in self._samples:
+                self._samples[kind] = deque(maxlen=LATENCY_WINDOW)
+            self._samples[kind].append(seconds)
+
+    def summary(self) -> dict:
+        with self._lock:
+            samples = {kind: list(values) for (kind, values) in self._samples.items()}
+        return {kind: percentiles(values) for (kind, values) in sorted(samples.items())}
+
+
+class Session:
+    """One hosted game. The lock serializes the moves played on it."""
+
+    def __init__(self, id: int, game: Game):
+        self.id = id
+        self.game = game
+        self.lock = threading.Lock()
+        self.latencies = Latencies()
+
+    def to_data(self) -> dict:
+        game = self.game
+        winner = game.has_winner()
+        return {"game": self.id, "turn": game.turns_played, "next_player": game.next_player.name,
+                "winner": None if winner is None else winner.name, "board": game.board_to_string()}
+
+
+class ServiceError(Exception):
+    """A request the service refuses, with the HTTP status to answer."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def session_options(overrides: dict, max_time: float, max_depth: int = MAX_DEPTH) -> Options:
+    """Options of a new session from the JSON overrides of a new-game request (max_time and depths capped)."""
+    values = {}
+    for (name, value) in overrides.items():
+        if name not in OPTION_TYPES or name in SERVICE_OPTIONS:
+            raise ServiceError(400, f"unknown or reserved option {name}")
+        try:
+            values[name] = option_value(name, value)
+        except ValueError as error:
+            raise ServiceError(400, str(error)) from error
+    options = Options(**values)
+    if options.heuristic not in algorithms.HEURISTICS:
+        raise ServiceError(400, f"unknown heuristic {options.heuristic}")
+    options.game_type = GameType.CompVsComp
+    options.trace = "null"
+    options.telemetry = False
+    options.max_time = max_time if options.max_time is None else min(options.max_time, max_time)
+    options.max_depth = max_depth if options.max_depth is None else min(options.max_depth, max_depth)
+    if options.min_depth is not None:
+        options.min_depth = min(options.min_depth, options.max_depth)
+    return options
+
+
+def _search_position(state: tuple, options: Options, deadline: float | None = None) -> TurnRecord | None:
+    """Worker task: search a position (opening book, tablebase and all) and return the turn's record.
+
+    The search is stopped after options.max_time or at deadline (time.monotonic(), the same clock in every
+    process), whichever comes first, even within options.min_depth: a request given up on does not keep
+    its worker busy. None if the deadline had passed before the task started.
+    """
+    game = Game.from_state(state, options)
+    if deadline is None:
+        return game.search_move()[1]
+    if options.max_time is not None:
+        deadline = min(deadline, monotonic() + options.max_time)
+    remaining = deadline - monotonic()
+    if remaining <= 0:
+        return None
+    stop = threading.Event()
+    timer = threading.Timer(remaining, stop.set)
+    timer.start()
+    try:
+        return game.search_move(stop=stop)[1]
+    finally:
+        timer.cancel()
+
+
+class EngineService(ThreadingHTTPServer):
+    """The service; start() serves it from a background thread.
+
+    Up to workers searches run at once and up to queue_size more wait for a worker; beyond that, suggest
+    requests get 503. Every search is limited to max_time seconds (less if its session or request asks).
+    """
+    daemon_threads = True
+    # listen backlog: clients connecting all at once must not wait for SYN retries
+    request_queue_size = 128
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, workers: int = 4, queue_size: int = 8,
+                 max_time: float = 5.0, max_sessions: int = 1024, max_depth: int = MAX_DEPTH):
+        super().__init__((host, port), ServiceHandler)
+        self.workers = workers
+        self.max_time = max_time
+        self.max_depth = max_depth
+        self.max_sessions = max_sessions
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.sessions : dict[int, Session] = {}
+        # also guards the rejected and timeouts counters
+        self.sessions_lock = threading.Lock()
+        self.latencies = Latencies()
+        self.rejected = 0
+        self.timeouts = 0
+        self._ids = itertools.count(1)
+        self._thread : threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        (host, port) = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> EngineService:
+        self.warm_up()
+        self._thread = threading.Thread(target=self.serve_forever, name="engine-service", daemon=True)
+        self._thread.start()
+        return self
+
+    def warm_up(self):
+        """Start every worker process (and its imports) now rather than on the first searches."""
+        options = Options(max_depth=1, min_depth=1, max_time=None, trace="null", telemetry=False)
+        state = Game(options=options).to_state()
+        for future in [self.executor.submit(_search_position, state, options) for _ in range(self.workers)]:
+            future.result()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.executor.shutdown(cancel_futures=True)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def new_session(self, overrides: dict) -> Session:
+        try:
+            game = Game(options=session_options(overrides, self.max_time, self.max_depth))
+        except (TypeError, ValueError) as error:
+            raise ServiceError(400, str(error)) from error
+        with self.sessions_lock:
+            if len(self.sessions) >= self.max_sessions:
+                raise ServiceError(503, "too many sessions")
+            session = Session(next(self._ids), game)
+            self.sessions[session.id] = session
+        return session
+
+    def session(self, id: int) -> Session:
+        session = self.sessions.get(id)
+        if session is None:
+            raise ServiceError(404, f"no game {id}")
+        return session
+
+    def end_session(self, id: int) -> Session:
+        with self.sessions_lock:
+            session = self.sessions.pop(id, None)
+        if session is None:
+            raise ServiceError(404, f"no game {id}")
+        return session
+
+    def play(self, session: Session, data: dict) -> dict:
+        """Play a move given in the broker format; returns the action's description and the new position."""
+        try:
+            move = move_from_data(data, session.game.options.dim)
+        except (KeyError, TypeError, ValueError) as error:
+            raise ServiceError(400, f"invalid move {data}") from error
+        with session.lock:
+            game = session.game
+            if game.has_winner() is not None:
+                raise ServiceError(409, "the game is over")
+            (success, result) = game.perform_move(move)
+            if not success:
+                raise ServiceError(400, result)
+            game.next_turn()
+            return dict(session.to_data(), result=result)
+
+    def suggest(self, session: Session, max_time: float | None, play: bool) -> dict:
+        """Search the session's position in the pool (refused with 503 when the pool is saturated)."""
+        with session.lock:
+            game = session.game
+            if game.has_winner() is not None:
+                raise ServiceError(409, "the game is over")
+            state = game.to_state()
+            turn = game.turns_played
+        options = session.game.options
+        if max_time is not None:
+            options = dataclasses.replace(options, max_time=min(max_time, self.max_time))
+        if not self.slots.acquire(blocking=False):
+            with self.sessions_lock:
+                self.rejected += 1
+            raise ServiceError(503, "all workers are busy")
+        # the worker stops the search by this time, and the request gives up on it then
+        deadline = monotonic() + options.max_time + TIME_MARGIN
+        try:
+            future : Future = self.executor.submit(_search_position, state, options, deadline)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        try:
+            record = future.result(timeout=deadline - monotonic())
+        except TimeoutError:
+            # a search still queued is dropped; one already running stops at the deadline and frees its slot
+            future.cancel()
+            record = None
+        if record is None:
+            with self.sessions_lock:
+                self.timeouts += 1
+            raise ServiceError(504, "the search did not finish in time")
+        if record.move is None:
+            raise ServiceError(409, "no move")
+        mv = game.move_pair(record.move)
+        data = {"move": move_to_data(mv, turn + 1), "score": record.score, "depth": record.depth,
+                "nodes": record.nodes, "seconds": record.seconds, "book": record.book}
+        if play:
+            with session.lock:
+                if game.turns_played != turn:
+                    raise ServiceError(409, "the position changed during the search")
+                (success, result) = game.perform_move(mv)
+                if not success:
+                    raise ServiceError(409, result)
+                game.next_turn()
+                data.update(session.to_data(), result=result)
+        return data
+
+    def stats(self) -> dict:
+        with self.sessions_lock:
+            sessions = list(self.sessions.values())
+        return {"sessions": len(sessions), "workers": self.workers, "rejected": self.rejected,
+                "timeouts": self.timeouts, "latency": self.latencies.summary(),
+                "session_latency": {session.id: session.latencies.summary() for session in sessions}}
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # buffer the response so headers and body leave in one segment (avoids delayed-ACK stalls on keep-alive)
+    wbufsize = 1 << 16
+    server : EngineService
+
+    def _reply(self, status: int, response: dict):
+        body = json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if status == 503:
+            self.send_header('Retry-After', '1')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self) -> dict:
+        try:
+            data = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b"{}")
+        except ValueError as error:
+            raise ServiceError(400, "invalid JSON") from error
+        if not isinstance(data, dict):
+            raise ServiceError(400, "expected a JSON object")
+        return data
+
+    def _handle(self, method: str):
+        """Route a request, reply, and record its latency under its kind (per session and overall)."""
+        start = perf_counter()
+        server = self.server
+        parts = [part for part in self.path.split("?")[0].split("/") if part != ""]
+        (kind, session) = ("invalid", None)
+        try:
+            if method == "GET" and parts == ["stats"]:
+                kind = "stats"
+                data = server.stats()
+            elif method == "POST" and parts == ["games"]:
+                kind = "new"
+                options = self._body().get("options", {})
+                if not isinstance(options, dict):
+                    raise ServiceError(400, "options must be an object")
+                session = server.new_session(options)
+                data = session.to_data()
+            elif len(parts) >= 2 and parts[0] == "games":
+                try:
+                    id = int(parts[1])
+                except ValueError as error:
+                    raise ServiceError(404, f"no game {parts[1]}") from error
+                if method == "GET" and len(parts) == 2:
+                    kind = "get"
+                    session = server.session(id)
+                    data = session.to_data()
+                elif method == "DELETE" and len(parts) == 2:
+                    kind = "end"
+                    session = server.end_session(id)
+                    data = session.to_data()
+                elif method == "POST" and parts[2:] == ["moves"]:
+                    kind = "move"
+                    session = server.session(id)
+                    data = server.play(session, self._body())
+                elif method == "POST" and parts[2:] == ["suggest"]:
+                    kind = "suggest"
+                    session = server.session(id)
+                    body = self._body()
+                    max_time = body.get("max_time")
+                    if max_time is not None and not isinstance(max_time, (int, float)):
+                        raise ServiceError(400, "max_time must be a number")
+                    data = server.suggest(session, max_time, bool(body.get("play", False)))
+                else:
+                    raise ServiceError(404, f"no route {method} {self.path}")
+            else:
+                raise ServiceError(404, f"no route {method} {self.path}")
+            self._reply(200, {'success': True, 'data': data})
+        except ServiceError as error:
+            self._reply(error.status, {'success': False, 'error': str(error)})
+        except Exception as error:
+            self._reply(500, {'success': False, 'error': f"{type(error).__name__}: {error}"})
+        seconds = perf_counter() - start
+        if kind != "stats":
+            server.latencies.add(kind, seconds)
+            if session is not None:
+                session.latencies.add(kind, seconds)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='service', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--host', type=str, default="127.0.0.1", help='address to listen on')
+    parser.add_argument('--port', type=int, default=8002, help='port to listen on')
+    parser.add_argument('--workers', type=int, default=4, help='search worker processes')
+    parser.add_argument('--queue', type=int, default=8, help='searches that may wait for a worker before requests are refused')
+    parser.add_argument('--max_time', type=float, default=5.0, help='longest search time a request may ask for')
+    parser.add_argument('--max_sessions', type=int, default=1024, help='most games hosted at once')
+    parser.add_argument('--max_depth', type=int, default=MAX_DEPTH, help='deepest search a game may ask for')
+    args = parser.parse_args()
+    server = EngineService(args.host, args.port, args.workers, args.queue, args.max_time, args.max_sessions,
+                           args.max_depth)
+    server.warm_up()
+    print(f"Engine service listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    server.executor.shutdown(cancel_futures=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+from __future__ import annotations
+import argparse
+import itertools
+import os
+import struct
+from array import array
+from collections import OrderedDict
+from time import perf_counter
+from bitboard import BitBoard, iter_bits
+from game import Game, Options, PLAYERS, UNIT_CODE_ATTACKER_AI, UNIT_CODE_DEFENDER_AI
+from logger import UNIT_LABELS
+
+# Endgame tablebases: for a material set (the BitBoard.units codes of the units on the board, both AIs
+# included) every placement and health of the units is solved by retrograde analysis, ignoring the turn
+# limit. An entry is the distance in plies to the end of the game with best play: positive if the side to
+# move wins, negative if it loses, 0 if neither side can force a win (or the entry is not a position).
+#
+# Entries are indexed by ((cells * 9^k + healths) * 2 + side), where cells and healths are the units'
+# cells and health-1 as base dim*dim and base 9 numbers, taking the units in material order (units with
+# the same code by ascending cell), and side is the Player value of the side to move.
+# Each file holds one material set for one dim: a header then the entries as little-endian int16.
+
+HEADER = struct.Struct("<8sHH8sQ")
+MAGIC = b"AIWTB001"
+# most units a material set may have (the header stores one code byte per unit)
+MAX_UNITS = 8
+ENTRY = struct.Struct("<h")
+# page size and default page count of the Tablebase LRU cache
+PAGE_SIZE = 4096
+CACHE_PAGES = 1024
+
+
+def material_of(board: BitBoard) -> tuple[int, ...]:
+    """Material set (sorted unit codes) of a board."""
+    units = board.units
+    return tuple(sorted(units[cell] for cell in iter_bits(board.occupied())))
+
+def material_name(material: tuple[int, ...]) -> str:
+    return "-".join(UNIT_LABELS[code] for code in material)
+
+def parse_material(spec: str) -> tuple[int, ...]:
+    """Material set from unit labels, e.g. "aA,dA,dT"."""
+    return tuple(sorted(UNIT_LABELS.index(label) for label in spec.split(",")))
+
+def table_path(directory: str, dim: int, material: tuple[int, ...]) -> str:
+    return os.path.join(directory, f"{dim}-{material_name(material)}.tb")
+
+
+class MaterialIndex:
+    """Entry index of the positions of one material set."""
+
+    def __init__(self, dim: int, material: tuple[int, ...]):
+        self.dim = dim
+        self.material = material
+        self.cells = dim * dim
+        self.health_size = 9 ** len(material)
+        self.size = self.cells ** len(material) * self.health_size * 2
+
+    def index(self, board: BitBoard, side: int) -> int:
+        """Entry of the board (which must hold exactly this material) with side to move."""
+        (units, health) = (board.units, board.health)
+        (cell_index, health_index) = (0, 0)
+        for (_, cell) in sorted((units[cell], cell) for cell in iter_bits(board.occupied())):
+            cell_index = cell_index * self.cells + cell
+            health_index = health_index * 9 + health[cell] - 1
+        return (cell_index * self.health_size + health_index) * 2 + side
+
+
+class Tablebase:
+    """Read access to the tablebase files of one board dimension, through an LRU cache of file pages."""
+
+    def __init__(self, directory: str, dim: int, cache_pages: int = CACHE_PAGES):
+        self.directory = directory
+        self.dim = dim
+        self.cache_pages = cache_pages
+        # material -> (index, open file), or None if there is no table for it
+        self._tables : dict[tuple[int, ...], tuple[MaterialIndex, object] | None] = {}
+        self._pages : OrderedDict[tuple[tuple[int, ...], int], bytes] = OrderedDict()
+        self.page_reads = 0
+        # largest material set available (positions with more units are not probed at all)
+        self.max_units = 0
+        prefix = f"{dim}-"
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.startswith(prefix) and name.endswith(".tb"):
+                    self.max_units = max(self.max_units, name.count("-"))
+
+    def _table(self, material: tuple[int, ...]) -> tuple[MaterialIndex, object] | None:
+        if material not in self._tables:
+            path = table_path(self.directory, self.dim, material)
+            table = None
+            if os.path.exists(path):
+                table_file = open(path, "rb")
+                (magic, dim, count, _, size) = HEADER.unpack(table_file.read(HEADER.size))
+                index = MaterialIndex(self.dim, material)
+                if magic != MAGIC or dim != self.dim or count != len(material) or size != index.size:
+                    table_file.close()
+                    raise ValueError(f"{path} is not a tablebase for {material_name(material)} on dim {self.dim}")
+                table = (index, table_file)
+            self._tables[material] = table
+        return self._tables[material]
+
+    def _entry(self, material: tuple[int, ...], table_file, entry: int) -> int:
+        offset = entry * ENTRY.size
+        key = (material, offset // PAGE_SIZE)
+        page = self._pages.get(key)
+        if page is None:
+            table_file.seek(HEADER.size + key[1] * PAGE_SIZE)
+            page = table_file.read(PAGE_SIZE)
+            self.page_reads += 1
+            self._pages[key] = page
+            if len(self._pages) > self.cache_pages:
+                self._pages.popitem(last=False)
+        else:
+            self._pages.move_to_end(key)
+        return ENTRY.unpack_from(page, offset % PAGE_SIZE)[0]
+
+    def probe_board(self, board: BitBoard, side: int) -> int | None:
+        """Entry of a position (both AIs on the board), or None if there is no table for its material."""
+        if board.occupied().bit_count() > self.max_units:
+            return None
+        material = material_of(board)
+        table = self._table(material)
+        if table is None:
+            return None
+        (index, table_file) = table
+        return self._entry(material, table_file, index.index(board, side))
+
+    def probe(self, game: Game) -> int | None:
+        """Plies to the end with best play (positive: the side to move wins, 0: no forced win), or None."""
+        if not (game._attacker_has_ai and game._defender_has_ai):
+            return None
+        return self.probe_board(game.board, game.next_player.value)
+
+    def close(self):
+        for table in self._tables.values():
+            if table is not None:
+                table[1].close()
+        self._tables.clear()
+        self._pages.clear()
+
+
+# open tablebases by (directory, dim), one per process
+_tablebases : dict[tuple[str, int], Tablebase] = {}
+
+def open_tablebase(directory: str, dim: int) -> Tablebase:
+    key = (directory, dim)
+    if key not in _tablebases:
+        _tablebases[key] = Tablebase(directory, dim)
+    return _tablebases[key]
+
+
+def generate(directory: str, dim: int, material: tuple[int, ...], log=print) -> str:
+    """Solve a material set (and, first, any smaller set a capture can lead to) and write its table file."""
+    material = tuple(sorted(material))
+    if material.count(UNIT_CODE_ATTACKER_AI) != 1 or material.count(UNIT_CODE_DEFENDER_AI) != 1:
+        raise ValueError("a material set has exactly one AI per player")
+    if len(material) > MAX_UNITS:
+        raise ValueError(f"a material set has at most {MAX_UNITS} units")
+    os.makedirs(directory, exist_ok=True)
+    for (position, code) in enumerate(material):
+        if code in (UNIT_CODE_ATTACKER_AI, UNIT_CODE_DEFENDER_AI):
+            continue
+        smaller = material[:position] + material[position + 1:]
+        if not os.path.exists(table_path(directory, dim, smaller)):
+            generate(directory, dim, smaller, log)
+    subtables = Tablebase(directory, dim)
+    index = MaterialIndex(dim, material)
+    start = perf_counter()
+
+    # 1. every position with its moves: the children in this table are graph edges, the others
+    #    (finished games and captures into a smaller table) are already solved
+    game = Game(options=Options(dim=dim, max_turns=None, trace="null", telemetry=False))
+    board = game.board
+    for cell in range(index.cells):
+        board.clear(cell)
+    count = len(material)
+    valid = bytearray(index.size)
+    edges_from = array('I')
+    edges_to = array('I')
+    # per position: edges left to resolve, longest solved child win, shortest solved child loss + 1, solved draw child
+    remaining = array('H', bytes(2 * index.size))
+    child_win_max = array('H', bytes(2 * index.size))
+    win_by = array('H', bytes(2 * index.size))
+    has_draw = bytearray(index.size)
+    for cells in itertools.product(range(index.cells), repeat=count):
+        if len(set(cells)) < count:
+            continue
+        # units with the same code only in ascending cell order (the other orders are the same positions)
+        if any(material[unit] == material[unit + 1] and cells[unit] > cells[unit + 1] for unit in range(count - 1)):
+            continue
+        for (code, cell) in zip(material, cells):
+            board.place(cell, (code - 1) // 5, (code - 1) % 5, 9)
+        for healths in itertools.product(range(1, 10), repeat=count):
+            for (cell, health) in zip(cells, healths):
+                board.set_health(cell, health)
+            for side in (0, 1):
+                game.next_player = PLAYERS[side]
+                entry = index.index(board, side)
+                valid[entry] = 1
+                for move in game.move_candidates():
+                    if not game.make_move(move):
+                        continue
+                    child_side = game.next_player.value
+                    winner = game.has_winner()
+                    # solved children as (result for the side to move of the child, plies to the end)
+                    if winner is not None:
+                        outcome = (1 if winner.value == child_side else -1, 0)
+                    elif board.occupied().bit_count() == count:
+                        edges_from.append(entry)
+                        edges_to.append(index.index(board, child_side))
+                        remaining[entry] += 1
+                        outcome = None
+                    else:
+                        value = subtables.probe_board(board, child_side)
+                        outcome = ((value > 0) - (value < 0), abs(value))
+                    game.unmake_move()
+                    if outcome is None:
+                        continue
+                    (result, plies) = outcome
+                    if result < 0:
+                        if win_by[entry] == 0 or plies + 1 < win_by[entry]:
+                            win_by[entry] = plies + 1
+                    elif result > 0:
+                        child_win_max[entry] = max(child_win_max[entry], plies)
+                    else:
+                        has_draw[entry] = 1
+        for cell in cells:
+            board.clear(cell)
+    subtables.close()
+    log(f"{material_name(material)}: {sum(valid)} positions, {len(edges_from)} moves within the table "
+        f"({perf_counter() - start:0.1f}s)")
+
+    # 2. parents of every position (edges grouped by child)
+    parent_start = array('I', bytes(4 * (index.size + 1)))
+    for child in edges_to:
+        parent_start[child + 1] += 1
+    for entry in range(index.size):
+        parent_start[entry + 1] += parent_start[entry]
+    fill = array('I', parent_start)
+    parents = array('I', bytes(4 * len(edges_to)))
+    for (parent, child) in zip(edges_from, edges_to):
+        parents[fill[child]] = parent
+        fill[child] += 1
+    del edges_from, edges_to, fill
+
+    # 3. retrograde analysis, one distance at a time: a position wins in d if a child loses in d-1, and
+    #    loses in d once every child is solved as a win (the longest one in d-1)
+    values = array('h', bytes(2 * index.size))
+    solved = bytearray(index.size)
+    pending = {}
+    for entry in range(index.size):
+        if not valid[entry]:
+            continue
+        if win_by[entry] > 0:
+            pending.setdefault(win_by[entry], []).append((entry, win_by[entry]))
+        elif remaining[entry] == 0 and not has_draw[entry]:
+            pending.setdefault(child_win_max[entry] + 1, []).append((entry, -(child_win_max[entry] + 1)))
+    distance = 0
+    while len(pending) > 0:
+        distance += 1
+        for (entry, value) in pending.pop(distance, []):
+            if solved[entry]:
+                continue
+            solved[entry] = 1
+            values[entry] = value
+            for parent in parents[parent_start[entry]:parent_start[entry + 1]]:
+                if solved[parent]:
+                    continue
+                if value < 0:
+                    if win_by[parent] == 0 or distance + 1 < win_by[parent]:
+                        win_by[parent] = distance + 1
+                        pending.setdefault(distance + 1, []).append((parent, distance + 1))
+                else:
+                    remaining[parent] -= 1
+                    child_win_max[parent] = max(child_win_max[parent], distance)
+                    if remaining[parent] == 0 and win_by[parent] == 0 and not has_draw[parent]:
+                        pending.setdefault(child_win_max[parent] + 1, []).append((parent, -(child_win_max[parent] + 1)))
+    log(f"{material_name(material)}: {sum(solved)} positions won or lost, longest {distance} plies "
+        f"({perf_counter() - start:0.1f}s)")
+
+    path = table_path(directory, dim, material)
+    with open(path + ".tmp", "wb") as table_file:
+        table_file.write(HEADER.pack(MAGIC, dim, count, bytes(material).ljust(MAX_UNITS, b"\0"), index.size))
+        values.tofile(table_file)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='tablebase', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('directory', type=str, help='tablebase directory')
+    parser.add_argument('--dim', type=int, default=5, help='board dimension')
+    parser.add_argument('--material', type=str, nargs='+', default=["aA,dA"],
+                        help='material sets to solve, as unit labels (e.g. aA,dA,dT)')
+    args = parser.parse_args()
+    for spec in args.material:
+        generate(args.directory, args.dim, parse_material(spec))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+from __future__ import annotations
+import json
+from dataclasses import dataclass, field, asdict
+from typing import TextIO, TYPE_CHECKING
+if TYPE_CHECKING:
+    from game import Game, Stats
+
+# Per-turn search telemetry. The search only bumps the cumulative counters in Stats (and times move
+# generation/evaluation when Options.telemetry is on); a turn record is the difference between the
+# counters before and after the search, so there is no per-node telemetry cost.
+
+# Stats counters a turn record is computed from
+COUNTERS = ("nodes", "cutoffs", "first_move_cutoffs", "tt_probes", "tt_hits", "tablebase_hits", "movegen_seconds",
+            "eval_seconds")
+
+
+@dataclass()
+class TurnRecord:
+    """Machine-readable summary of one computer turn."""
+    turn : int = 0
+    player : str = ""
+    # src * cells + dst, as in Game.move_candidates
+    move : int | None = None
+    score : int = 0
+    seconds : float = 0.0
+    depth : int = 0
+    nodes : int = 0
+    evals : int = 0
+    evaluations_per_depth : dict[int,int] = field(default_factory=dict)
+    cutoffs : int = 0
+    first_move_cutoffs : int = 0
+    branching_factor : float = 0.0
+    avg_depth : float = 0.0
+    tt_probes : int = 0
+    tt_hits : int = 0
+    tablebase_hits : int = 0
+    movegen_seconds : float = 0.0
+    eval_seconds : float = 0.0
+    # the move came from the opening book (no search)
+    book : bool = False
+    # pondering before this turn: "hit", "miss" or "all" (see ponder.py), and the seconds of it this turn reused
+    ponder : str = ""
+    ponder_seconds : float = 0.0
+
+    def to_json(self) -> str:
+        """One JSON line."""
+        return json.dumps(asdict(self))
+
+
+class Telemetry:
+    """Builds a TurnRecord per computer turn and appends it as JSONL to path (if any)."""
+
+    def __init__(self, path: str | None = None, enabled: bool = True):
+        self.path = path
+        self.enabled = enabled
+        self.records : list[TurnRecord] = []
+        self._file : TextIO | None = None
+        self._before : dict = {}
+
+    def begin_turn(self, stats: Stats):
+        """Remember the cumulative counters before a search."""
+        self._before = {name: getattr(stats, name) for name in COUNTERS}
+        self._before["evaluations_per_depth"] = dict(stats.evaluations_per_depth)
+
+    def end_turn(self, game: Game, move: int | None, score: int, avg_depth: float, seconds: float, book: bool = False,
+                 ponder: str = "", ponder_seconds: float = 0.0) -> TurnRecord:
+        """Build (and write, if enabled) the record of the search that just finished."""
+        stats = game.stats
+        before = self._before
+        evaluations = {depth: count - before["evaluations_per_depth"].get(depth, 0)
+                       for (depth, count) in sorted(stats.evaluations_per_depth.items())
+                       if count != before["evaluations_per_depth"].get(depth, 0)}
+        completed = [iteration for iteration in stats.iterations if iteration.completed]
+        depth = completed[-1].depth if len(completed) > 0 else 0
+        record = TurnRecord(
+            turn=game.turns_played + 1,
+            player=game.next_player.name,
+            move=move,
+            score=score,
+            seconds=seconds,
+            depth=depth,
+            evals=sum(evaluations.values()),
+            evaluations_per_depth=evaluations,
+            branching_factor=completed[-1].nodes ** (1 / depth) if depth > 0 else 0.0,
+            avg_depth=avg_depth,
+            book=book,
+            ponder=ponder,
+            ponder_seconds=ponder_seconds,
+            **{name: getattr(stats, name) - before[name] for name in COUNTERS},
+        )
+        self.records.append(record)
+        if self.enabled and self.path is not None:
+            if self._file is None:
+                self._file = open(self.path, "w")
+            self._file.write(record.to_json() + "\n")
+            self._file.flush()
+        return record
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def format_turn(record: TurnRecord, stats: Stats) -> list[str]:
+    """Human-readable lines for a turn (this turn's search plus the cumulative figures of the game)."""
+    lines = [
+        f"Time for this action: {record.seconds:0.1f} sec",
+        f"Heuristic score: {record.score}",
+    ]
+    if record.book:
+        lines.append("Opening book move")
+    else:
+        lines.append(f"Search depth: {record.depth} ({record.nodes} nodes, effective branching factor {record.branching_factor:0.1f})")
+        lines.append(f"Average recursive depth: {record.avg_depth:0.1f}")
+    if record.cutoffs > 0:
+        lines.append(f"First-move cutoff rate: {100*record.first_move_cutoffs/record.cutoffs:0.1f}%")
+    if record.tt_probes > 0:
+        lines.append(f"Transposition table hits: {100*record.tt_hits/record.tt_probes:0.1f}%")
+    if record.ponder != "":
+        lines.append(f"Pondering: {record.ponder}, {record.ponder_seconds:0.1f}s of search time saved")
+    if record.tablebase_hits > 0:
+        lines.append(f"Tablebase hits: {record.tablebase_hits}")
+    if record.movegen_seconds > 0 or record.eval_seconds > 0:
+        lines.append(f"Move generation: {record.movegen_seconds:0.2f}s, evaluation: {record.eval_seconds:0.2f}s")
+    total_evals = sum(stats.evaluations_per_depth.values())
+    lines.append(f"Cumulative evals: {_kilo(total_evals)}")
+    lines.append("Cumulative evals by depth: " + " ".join(
+        f"{depth}={_kilo(count)}" for (depth, count) in sorted(stats.evaluations_per_depth.items())))
+    if total_evals > 0:
+        lines.append("Cumulative % evals by depth: " + " ".join(
+            f"{depth}={100*count/total_evals:0.1f}%" for (depth, count) in sorted(stats.evaluations_per_depth.items())))
+    interior = stats.nodes - total_evals
+    if interior > 0:
+        lines.append(f"Average branching factor: {(stats.nodes - 1) / interior:0.1f}")
+    if stats.total_seconds > 0:
+        lines.append(f"Eval perf.: {total_evals/stats.total_seconds/1000:0.1f}k/s")
+    return lines
+
+
+def _kilo(count: int) -> str:
+    """Short count: 950, 2.3k, 18.0M."""
+    if count >= 1000000:
+        return f"{count/1000000:0.1f}M"
+    if count >= 1000:
+        return f"{count/1000:0.1f}k"
+    return str(count)
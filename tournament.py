@@ -0,0 +1,150 @@
+from __future__ import annotations
+import argparse
+import dataclasses
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+from game import Game, Options, OPTION_TYPES, option_value
+from gameType import GameType
+from player import Player
+import algorithms
+
+# Headless self-play: every ordered pair of engines plays a number of CompVsComp games across a process
+# pool, without console output or trace files, and one JSON row per game is streamed as games finish.
+# Games are reproducible: game i of a tournament searches with Options.seed = seed + i. With a records
+# directory, game i is also saved there as the binary record game-<i>.rec (see record.py).
+
+# Options an engine spec may not override (they belong to the tournament, not to an engine)
+GAME_OPTIONS = ("dim", "game_type", "max_turns", "seed", "broker", "trace", "record", "workers")
+
+
+def parse_engine(spec: str) -> tuple[str, dict]:
+    """Engine from "name" (a heuristic name) or "name:option=value,option=value" (Options overrides)."""
+    (name, _, overrides) = spec.partition(":")
+    values = {} if overrides else {"heuristic": name}
+    for assignment in overrides.split(",") if overrides else []:
+        (key, _, text) = assignment.partition("=")
+        if key not in OPTION_TYPES or key in GAME_OPTIONS:
+            raise ValueError(f"engine {name}: unknown or reserved option {key}")
+        values[key] = option_value(key, text)
+    if "heuristic" in values and values["heuristic"] not in algorithms.HEURISTICS:
+        raise ValueError(f"engine {name}: unknown heuristic {values['heuristic']}")
+    return (name, values)
+
+
+def play_game(index: int, attacker: tuple[str, dict], defender: tuple[str, dict], seed: int, base: Options,
+              records: str | None = None) -> dict:
+    """Play one headless game and return its result row."""
+    engines = (attacker, defender)
+    record = None if records is None else os.path.join(records, f"game-{index}.rec")
+    options = [dataclasses.replace(base, game_type=GameType.CompVsComp, trace="null", telemetry=False,
+                                   workers=1, seed=seed, record=record, **overrides) for (_, overrides) in engines]
+    game = Game(options=options[Player.Attacker.value])
+    game.open_record(options)
+    # each side searches with its own options and keeps its own transposition table
+    tables = [None, None]
+    nodes = [0, 0]
+    seconds = [0.0, 0.0]
+    moves = [0, 0]
+    start = perf_counter()
+    winner = game.has_winner()
+    while winner is None:
+        side = game.next_player.value
+        game.options = options[side]
+        game.transposition_table = tables[side]
+        nodes_before = game.stats.nodes
+        move_start = perf_counter()
+        (move, _) = game.search_move()
+        seconds[side] += perf_counter() - move_start
+        nodes[side] += game.stats.nodes - nodes_before
+        moves[side] += 1
+        tables[side] = game.transposition_table
+        if move is None or not game.perform_move(game.move_pair(move))[0]:
+            # the side to move has no move: it loses
+            winner = game.next_player.next()
+            break
+        game.next_turn()
+        winner = game.has_winner()
+    if game.recorder is not None:
+        game.recorder.close()
+    return {
+        "game": index,
+        "seed": seed,
+        "attacker": attacker[0],
+        "defender": defender[0],
+        "winner": winner.name,
+        "winning_engine": engines[winner.value][0],
+        "turns": game.turns_played,
+        "attacker_nodes": nodes[0],
+        "defender_nodes": nodes[1],
+        "attacker_seconds_per_move": seconds[0] / moves[0] if moves[0] else 0.0,
+        "defender_seconds_per_move": seconds[1] / moves[1] if moves[1] else 0.0,
+        "seconds": perf_counter() - start,
+    }
+
+
+def schedule(engines: list[tuple[str, dict]], games: int) -> list[tuple[tuple[str, dict], tuple[str, dict]]]:
+    """games games for every ordered (attacker, defender) pair of distinct engines (or self-play of a single one)."""
+    if len(engines) == 1:
+        pairs = [(engines[0], engines[0])]
+    else:
+        pairs = [(a, d) for a in engines for d in engines if a is not d]
+    return [pair for pair in pairs for _ in range(games)]
+
+
+def run(engines: list[tuple[str, dict]], games: int, base: Options, seed: int, processes: int, output,
+        records: str | None = None) -> dict:
+    """Play the tournament, writing one JSON row per game to output as games finish; returns the summary."""
+    pairings = schedule(engines, games)
+    if records is not None:
+        os.makedirs(records, exist_ok=True)
+    wins = {name: 0 for (name, _) in engines}
+    start = perf_counter()
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(play_game, index, attacker, defender, seed + index, base, records)
+                   for (index, (attacker, defender)) in enumerate(pairings)]
+        for future in as_completed(futures):
+            row = future.result()
+            wins[row["winning_engine"]] += 1
+            output.write(json.dumps(row) + "\n")
+            output.flush()
+    seconds = perf_counter() - start
+    return {"games": len(pairings), "seconds": seconds, "games_per_s": len(pairings) / seconds, "wins": wins}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='tournament', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--engines', type=str, nargs='+', default=["e0", "e1", "e2"],
+                        help='engines: heuristic names or name:option=value,... (Options overrides)')
+    parser.add_argument('--games', type=int, default=10, help='games per (attacker, defender) pairing')
+    parser.add_argument('--processes', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game')
+    parser.add_argument('--max_depth', type=int, default=3, help='maximum search depth')
+    parser.add_argument('--max_nodes', type=int, default=None, help='node budget per move')
+    parser.add_argument('--max_time', type=float, default=None, help='maximum search time')
+    parser.add_argument('--max_turns', type=int, default=100, help='maximum number of turns of a game')
+    parser.add_argument('--output', type=str, help='write the result rows to this file instead of stdout')
+    parser.add_argument('--records', type=str, help='save every game as a binary record in this directory')
+    args = parser.parse_args()
+
+    try:
+        engines = [parse_engine(spec) for spec in args.engines]
+    except ValueError as error:
+        parser.error(str(error))
+    base = Options(max_depth=args.max_depth, max_nodes=args.max_nodes, max_time=args.max_time, max_turns=args.max_turns)
+    output = open(args.output, "w") if args.output is not None else sys.stdout
+    try:
+        summary = run(engines, args.games, base, args.seed, args.processes, output, args.records)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"{summary['games']} games in {summary['seconds']:0.1f}s ({summary['games_per_s']:0.2f} games/s)",
+          file=sys.stderr)
+    for (name, count) in summary["wins"].items():
+        print(f"{name}: {count} wins", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+from __future__ import annotations
+from typing import Tuple
+from game import Stats, MAX_HEURISTIC_SCORE, MIN_HEURISTIC_SCORE
+
+# bound types of a stored score
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# scores this close to the extremes are wins/losses whose value depends on the distance from the root
+MATE_MARGIN = 1000
+
+
+def score_to_tt(score: int, depth: int) -> int:
+    """Make a terminal score relative to the node at depth before storing it."""
+    if score >= MAX_HEURISTIC_SCORE - MATE_MARGIN:
+        return score + depth
+    if score <= MIN_HEURISTIC_SCORE + MATE_MARGIN:
+        return score - depth
+    return score
+
+
+def score_from_tt(score: int, depth: int) -> int:
+    """Inverse of score_to_tt for a node at depth."""
+    if score >= MAX_HEURISTIC_SCORE - MATE_MARGIN:
+        return score - depth
+    if score <= MIN_HEURISTIC_SCORE + MATE_MARGIN:
+        return score + depth
+    return score
+
+
+class TranspositionTable:
+    """Fixed-size transposition table keyed by Zobrist hash.
+
+    Each bucket has two slots: the first is depth-preferred (only replaced by a search at least
+    as deep), the second is always replaced. Entries are (key, depth, score, bound, move) tuples
+    (move an int, see Game.move_candidates) in a flat list, so the table never grows past 2*size entries.
+    """
+
+    def __init__(self, size: int, stats: Stats):
+        self.size = size
+        self.stats = stats
+        self.entries : list[Tuple[int,int,int,int,int | None] | None] = [None] * (2 * size)
+
+    def clear(self):
+        """Drop every entry."""
+        self.entries = [None] * (2 * self.size)
+
+    def probe(self, key: int) -> Tuple[int,int,int,int,int | None] | None:
+        """Look up a position; returns its entry or None."""
+        stats = self.stats
+        stats.tt_probes += 1
+        slot = (key % self.size) * 2
+        entries = self.entries
+        for entry in (entries[slot], entries[slot + 1]):
+            if entry is not None:
+                if entry[0] == key:
+                    stats.tt_hits += 1
+                    return entry
+                stats.tt_collisions += 1
+        return None
+
+    def store(self, key: int, depth: int, score: int, bound: int, move: int | None):
+        """Record a search result for a position (depth is the remaining search depth)."""
+        self.stats.tt_stores += 1
+        slot = (key % self.size) * 2
+        entries = self.entries
+        preferred = entries[slot]
+        entry = (key, depth, score, bound, move)
+        if preferred is None or preferred[0] == key or depth >= preferred[1]:
+            entries[slot] = entry
+        else:
+            entries[slot + 1] = entry
@@ -12,7 +12,7 @@ class UnitType(Enum):
     Program = 3
     Firewall = 4
 
-@dataclass()
+@dataclass(slots=True)
 class Unit:
     player: Player = Player.Attacker
     type: UnitType = UnitType.Program